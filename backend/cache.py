@@ -0,0 +1,180 @@
+"""
+Byte caches for computed results
+In-memory LRU tier with a byte budget plus an optional on-disk tier (files under data/cache/).
+Keys are hex digests (content addressed), values are raw bytes.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Default location of the on-disk tier
+CACHE_DIR = Path(__file__).parent.parent / "data" / "cache"
+
+class LRUByteCache:
+    """Thread-safe LRU cache evicting by total size of stored values"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            # Larger than the whole budget - caching it would only flush everything else
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+class DiskCache:
+    """
+    File-per-entry cache: <directory>/<key[:2]>/<key>
+    Writes are atomic (temp file + rename), so concurrent workers never read partial entries.
+    
+    With max_bytes the directory is pruned least recently used first (by mtime - reads
+    touch their entry) down to PRUNE_TARGET of the budget once it grows past it.
+    """
+
+    # Pruning stops at this fraction of max_bytes, so it doesn't run on every write
+    PRUNE_TARGET = 0.9
+
+    def __init__(self, directory: Path, max_bytes: Optional[int] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None  # bytes on disk, scanned on the first write
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(mtime, size, path) of every stored entry"""
+        entries = []
+        try:
+            shards = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return entries
+        for shard in shards:
+            try:
+                with os.scandir(shard) as files:
+                    for entry in files:
+                        if entry.name.endswith(".tmp"):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue  # removed by another process meanwhile
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return entries
+
+    def _prune(self) -> None:
+        """Removes least recently used entries until the directory fits PRUNE_TARGET of the budget"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.PRUNE_TARGET
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+        self._size = total
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+        except OSError:
+            return None
+        if self.max_bytes is not None:
+            try:
+                os.utime(path)  # mtime marks the last use for pruning
+            except OSError:
+                pass
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(value)
+            tmp_path.replace(path)
+        except OSError as e:
+            print(f"⚠️  Cache write failed ({path}): {e}")
+            return
+        if self.max_bytes is None:
+            return
+        with self._lock:
+            # Other processes write to the same directory - the counter is an estimate
+            # and every prune re-scans the real size
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(value)
+            if self._size > self.max_bytes:
+                self._prune()
+
+class TieredCache:
+    """Memory tier in front of an optional disk tier; disk hits are promoted to memory"""
+
+    def __init__(self, memory: LRUByteCache, disk: Optional[DiskCache] = None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+def create_cache(namespace: str, default_memory_mb: int = 64, default_disk_mb: int = 1024) -> TieredCache:
+    """
+    Builds a cache configured from the environment:
+    <NAMESPACE>_CACHE_MEMORY_MB - memory budget, <NAMESPACE>_CACHE_DISK=1 - enable data/cache/<namespace>,
+    <NAMESPACE>_CACHE_DISK_MB - disk budget
+    """
+    prefix = namespace.upper()
+    memory_mb = float(os.getenv(f"{prefix}_CACHE_MEMORY_MB", str(default_memory_mb)))
+    disk = None
+    if os.getenv(f"{prefix}_CACHE_DISK", "0").lower() in ("1", "true", "yes"):
+        disk_mb = float(os.getenv(f"{prefix}_CACHE_DISK_MB", str(default_disk_mb)))
+        disk = DiskCache(Path(os.getenv("CACHE_DIR", str(CACHE_DIR))) / namespace,
+                         max_bytes=int(disk_mb * 1024 * 1024))
+    return TieredCache(LRUByteCache(int(memory_mb * 1024 * 1024)), disk)
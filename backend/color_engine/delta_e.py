@@ -3,9 +3,13 @@ Color Matching Engine
 Wykorzystuje przestrzeń barw CIELAB (Delta E) do precyzyjnego dopasowania kolorów nici
 """
 import math
+import numpy as np
 from typing import Tuple, Dict, List, Optional
 from dataclasses import dataclass
 
+from .metrics import DEFAULT_METRIC, get_metric
+from .thread_index import ThreadIndex
+
 @dataclass
 class Thread:
     """Reprezentacja nici hafciarskiej"""
@@ -16,69 +20,203 @@ class Thread:
     rgb: Tuple[int, int, int]
     lab: Tuple[float, float, float]  # L*, a*, b*
     
-def rgb_to_lab(rgb: Tuple[int, int, int]) -> Tuple[float, float, float]:
+# Stałe konwersji sRGB ↔ XYZ (D65, observer 2°)
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+
+# Reference white D65
+_WHITE_D65 = np.array([0.95047, 1.00000, 1.08883])
+
+# Mnożnik Delta E dla nici z inwentarza użytkownika (20% redukcja)
+INVENTORY_BONUS = 0.8
+# Domyślnie bonus działa bez limitu odległości od najbliższej nici
+INVENTORY_MAX_EXTRA_DELTA_E: Optional[float] = None
+
+_DELTA = 6 / 29
+
+def _srgb_to_linear(c: np.ndarray) -> np.ndarray:
+    """Gamma correction sRGB (0-1) → liniowe RGB"""
+    return np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+
+def _linear_to_srgb(c: np.ndarray) -> np.ndarray:
+    """Odwrotna gamma correction: liniowe RGB → sRGB (0-1)"""
+    c = np.clip(c, 0.0, None)
+    return np.where(c > 0.0031308, 1.055 * c ** (1 / 2.4) - 0.055, c * 12.92)
+
+# Tablica linearyzacji dla wejścia uint8 (256 wartości zamiast potęgowania każdego piksela)
+_SRGB_TO_LINEAR_U8 = _srgb_to_linear(np.arange(256) / 255.0)
+
+def rgb_to_lab_array(rgb: np.ndarray) -> np.ndarray:
     """
-    Konwersja RGB (0-255) do CIELAB
+    Wektorowa konwersja RGB (0-255) do CIELAB
     Standard illuminant D65, observer 2°
+    
+    Args:
+        rgb: Tablica o kształcie (..., 3) - pojedynczy kolor, paleta (N, 3)
+             lub cały obraz (H, W, 3)
+    
+    Returns:
+        Tablica float64 o tym samym kształcie z wartościami (L*, a*, b*)
     """
-    # Normalizacja RGB do 0-1
-    r, g, b = [x / 255.0 for x in rgb]
+    rgb = np.asarray(rgb)
+    if rgb.shape[-1] != 3:
+        raise ValueError(f"Expected array of shape (..., 3), got {rgb.shape}")
+    
+    # Gamma correction (dla uint8 przez tablicę lookup)
+    if rgb.dtype == np.uint8:
+        linear = _SRGB_TO_LINEAR_U8[rgb]
+    else:
+        linear = _srgb_to_linear(rgb.astype(np.float64) / 255.0)
+    
+    # RGB → XYZ, od razu znormalizowane względem bieli D65
+    xyz = linear @ (_RGB_TO_XYZ.T / _WHITE_D65)
     
-    # Gamma correction
-    def gamma_correct(c):
-        if c > 0.04045:
-            return ((c + 0.055) / 1.055) ** 2.4
-        else:
-            return c / 12.92
+    # XYZ → LAB
+    f = np.where(xyz > _DELTA ** 3,
+                 np.cbrt(xyz),
+                 xyz / (3 * _DELTA ** 2) + 4 / 29)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
     
-    r = gamma_correct(r)
-    g = gamma_correct(g)
-    b = gamma_correct(b)
+    lab = np.empty(f.shape, dtype=np.float64)
+    lab[..., 0] = 116 * fy - 16
+    lab[..., 1] = 500 * (fx - fy)
+    lab[..., 2] = 200 * (fy - fz)
+    return lab
+
+def lab_to_rgb_array(lab: np.ndarray) -> np.ndarray:
+    """
+    Wektorowa konwersja CIELAB do RGB (0-255)
+    Kolory spoza gamutu sRGB są przycinane
     
-    # RGB to XYZ (sRGB with D65)
-    x = r * 0.4124564 + g * 0.3575761 + b * 0.1804375
-    y = r * 0.2126729 + g * 0.7151522 + b * 0.0721750
-    z = r * 0.0193339 + g * 0.1191920 + b * 0.9503041
+    Args:
+        lab: Tablica o kształcie (..., 3) z wartościami (L*, a*, b*)
     
-    # XYZ to LAB
-    # Reference white D65
-    xn, yn, zn = 0.95047, 1.00000, 1.08883
+    Returns:
+        Tablica uint8 o tym samym kształcie
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    if lab.shape[-1] != 3:
+        raise ValueError(f"Expected array of shape (..., 3), got {lab.shape}")
     
-    def f(t):
-        delta = 6/29
-        if t > delta**3:
-            return t**(1/3)
-        else:
-            return t/(3 * delta**2) + 4/29
+    fy = (lab[..., 0] + 16) / 116
+    fx = fy + lab[..., 1] / 500
+    fz = fy - lab[..., 2] / 200
+    f = np.stack([fx, fy, fz], axis=-1)
     
-    fx = f(x / xn)
-    fy = f(y / yn)
-    fz = f(z / zn)
+    # LAB → XYZ (względem bieli D65)
+    xyz = np.where(f > _DELTA, f ** 3, 3 * _DELTA ** 2 * (f - 4 / 29))
     
-    L = 116 * fy - 16
-    a = 500 * (fx - fy)
-    b_val = 200 * (fy - fz)
+    # XYZ → liniowe RGB → sRGB
+    linear = (xyz * _WHITE_D65) @ _XYZ_TO_RGB.T
+    srgb = _linear_to_srgb(linear)
     
-    return (L, a, b_val)
+    return np.clip(np.rint(srgb * 255.0), 0, 255).astype(np.uint8)
+
+def rgb_to_lab(rgb: Tuple[int, int, int]) -> Tuple[float, float, float]:
+    """
+    Konwersja RGB (0-255) do CIELAB
+    Standard illuminant D65, observer 2°
+    """
+    L, a, b = rgb_to_lab_array(np.asarray(rgb, dtype=np.float64))
+    return (float(L), float(a), float(b))
+
+def lab_to_rgb(lab: Tuple[float, float, float]) -> Tuple[int, int, int]:
+    """
+    Konwersja CIELAB do RGB (0-255)
+    """
+    r, g, b = lab_to_rgb_array(np.asarray(lab, dtype=np.float64))
+    return (int(r), int(g), int(b))
 
 def delta_e(lab1: Tuple[float, float, float], 
-            lab2: Tuple[float, float, float]) -> float:
+            lab2: Tuple[float, float, float],
+            metric: str = DEFAULT_METRIC) -> float:
     """
-    Oblicza Delta E (CIE76) - percepcyjną różnicę kolorów
+    Oblicza Delta E - percepcyjną różnicę kolorów
     Wartość < 1.0 = różnica niewidoczna dla oka
     Wartość < 2.0 = różnica zauważalna tylko przy porównaniu
     Wartość < 5.0 = akceptowalna w większości zastosowań
+    
+    Args:
+        metric: "cie76" (domyślnie), "cie94" lub "ciede2000"
+    """
+    if metric == "cie76":
+        L1, a1, b1 = lab1
+        L2, a2, b2 = lab2
+        return math.sqrt((L2 - L1)**2 + (a2 - a1)**2 + (b2 - b1)**2)
+    
+    return float(get_metric(metric)(np.asarray(lab1), np.asarray(lab2)))
+
+def find_closest_threads(
+    target_rgbs,
+    thread_database: List[Thread],
+    brand_filter: Optional[str] = None,
+    user_inventory: Optional[set] = None,
+    index: Optional[ThreadIndex] = None,
+    metric: str = DEFAULT_METRIC,
+    inventory_bonus: float = INVENTORY_BONUS,
+    max_extra_delta_e: Optional[float] = INVENTORY_MAX_EXTRA_DELTA_E
+) -> List[Dict]:
     """
-    L1, a1, b1 = lab1
-    L2, a2, b2 = lab2
+    Wsadowo znajduje najbliższe nici dla wielu kolorów jednym zapytaniem do indeksu
     
-    return math.sqrt((L2 - L1)**2 + (a2 - a1)**2 + (b2 - b1)**2)
+    Args:
+        target_rgbs: Kolory docelowe, tablica/lista (N, 3) wartości RGB
+        thread_database: Lista dostępnych nici
+        brand_filter: Opcjonalny filtr marki ("DMC", "Anchor", etc.)
+        user_inventory: Set thread_id które użytkownik posiada (priorytetyzacja)
+        index: Gotowy ThreadIndex (np. per marka); gdy podany, zastępuje
+               thread_database i brand_filter
+        metric: Metryka Delta E - "cie76", "cie94" lub "ciede2000"
+        inventory_bonus: Mnożnik Delta E nici z inwentarza (0-1]
+        max_extra_delta_e: O ile nić z inwentarza może być dalej niż najbliższa (None - bez limitu)
+    
+    Returns:
+        Lista dictów z najlepszym dopasowaniem i metrykami (jak find_closest_thread)
+    """
+    if index is None:
+        # Filtrowanie po marce
+        candidates = thread_database
+        if brand_filter:
+            candidates = [t for t in candidates if t.brand == brand_filter]
+        index = ThreadIndex.from_threads(candidates)
+    
+    target_lab = rgb_to_lab_array(np.asarray(target_rgbs, dtype=np.float64).reshape(-1, 3))
+    
+    if user_inventory:
+        # Wektor wag nad indeksem: nici z inwentarza mają Delta E pomnożone przez bonus
+        weights = index.preference_weights(user_inventory, inventory_bonus)
+        best_deltas, best_indices = index.query_weighted(
+            target_lab, weights, max_extra_delta_e=max_extra_delta_e, metric=metric
+        )
+    else:
+        distances, indices = index.query(target_lab, k=1, metric=metric)
+        best_deltas, best_indices = distances[:, 0], indices[:, 0]
+    
+    results = []
+    for best_delta, thread_idx in zip(best_deltas.tolist(), best_indices.tolist()):
+        best_match = index.threads[thread_idx]
+        results.append({
+            "thread": best_match,
+            "delta_e": best_delta,
+            "quality": "excellent" if best_delta < 2.0 else 
+                       "good" if best_delta < 5.0 else "acceptable",
+            "from_inventory": best_match.thread_id in (user_inventory or set())
+        })
+    return results
 
 def find_closest_thread(
     target_rgb: Tuple[int, int, int],
     thread_database: List[Thread],
     brand_filter: Optional[str] = None,
-    user_inventory: Optional[set] = None
+    user_inventory: Optional[set] = None,
+    index: Optional[ThreadIndex] = None,
+    metric: str = DEFAULT_METRIC,
+    inventory_bonus: float = INVENTORY_BONUS,
+    max_extra_delta_e: Optional[float] = INVENTORY_MAX_EXTRA_DELTA_E
 ) -> Dict:
     """
     Znajduje najbliższą nić dla danego koloru
@@ -88,47 +226,30 @@ def find_closest_thread(
         thread_database: Lista dostępnych nici
         brand_filter: Opcjonalny filtr marki ("DMC", "Anchor", etc.)
         user_inventory: Set thread_id które użytkownik posiada (priorytetyzacja)
+        index: Opcjonalny gotowy ThreadIndex (zastępuje thread_database i brand_filter)
+        metric: Metryka Delta E - "cie76", "cie94" lub "ciede2000"
+        inventory_bonus, max_extra_delta_e: Jak w find_closest_threads
     
     Returns:
         Dict z najlepszym dopasowaniem i metrykami
     """
-    target_lab = rgb_to_lab(target_rgb)
-    
-    # Filtrowanie po marce
-    candidates = thread_database
-    if brand_filter:
-        candidates = [t for t in candidates if t.brand == brand_filter]
-    
-    best_match = None
-    best_delta = float('inf')
-    
-    for thread in candidates:
-        de = delta_e(target_lab, thread.lab)
-        
-        # Bonus dla nici z inwentarza użytkownika (20% redukcja Delta E)
-        if user_inventory and thread.thread_id in user_inventory:
-            de *= 0.8
-        
-        if de < best_delta:
-            best_delta = de
-            best_match = thread
-    
-    if not best_match:
-        raise ValueError("No matching thread found")
-    
-    return {
-        "thread": best_match,
-        "delta_e": best_delta,
-        "quality": "excellent" if best_delta < 2.0 else 
-                   "good" if best_delta < 5.0 else "acceptable",
-        "from_inventory": best_match.thread_id in (user_inventory or set())
-    }
+    return find_closest_threads(
+        [target_rgb],
+        thread_database,
+        brand_filter=brand_filter,
+        user_inventory=user_inventory,
+        index=index,
+        metric=metric,
+        inventory_bonus=inventory_bonus,
+        max_extra_delta_e=max_extra_delta_e
+    )[0]
 
 def convert_brand(
     thread_code: str,
     from_brand: str,
     to_brand: str,
-    thread_database: List[Thread]
+    thread_database: List[Thread],
+    metric: str = DEFAULT_METRIC
 ) -> Optional[Thread]:
     """
     Konwertuje kod nici między markami (np. DMC → Anchor)
@@ -148,7 +269,8 @@ def convert_brand(
     result = find_closest_thread(
         source_thread.rgb,
         thread_database,
-        brand_filter=to_brand
+        brand_filter=to_brand,
+        metric=metric
     )
     
     return result["thread"]
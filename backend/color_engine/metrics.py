@@ -0,0 +1,133 @@
+"""
+Metryki różnicy kolorów (Delta E) w wersji wektorowej
+CIE76, CIE94 (graphic arts) i CIEDE2000 - liczone na tablicach NumPy z broadcastingiem,
+tak aby macierz odległości (N kolorów × M nici) powstawała w jednym wywołaniu
+"""
+from typing import Callable, Dict
+
+import numpy as np
+
+DEFAULT_METRIC = "cie76"
+
+def _split(lab: np.ndarray):
+    lab = np.asarray(lab, dtype=np.float64)
+    if lab.shape[-1] != 3:
+        raise ValueError(f"Expected array of shape (..., 3), got {lab.shape}")
+    return lab[..., 0], lab[..., 1], lab[..., 2]
+
+def delta_e_cie76(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """Delta E CIE76 - odległość euklidesowa w Lab"""
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+    return np.sqrt((L2 - L1) ** 2 + (a2 - a1) ** 2 + (b2 - b1) ** 2)
+
+def delta_e_cie94(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    Delta E CIE94 (graphic arts: kL=1, K1=0.045, K2=0.015)
+    Metryka asymetryczna - lab1 to kolor referencyjny (np. piksel), lab2 to próbka (nić)
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    dL = L1 - L2
+    dC = C1 - C2
+    dH_sq = np.maximum((a1 - a2) ** 2 + (b1 - b2) ** 2 - dC ** 2, 0.0)
+
+    SC = 1.0 + 0.045 * C1
+    SH = 1.0 + 0.015 * C1
+
+    return np.sqrt(dL ** 2 + (dC / SC) ** 2 + dH_sq / SH ** 2)
+
+def delta_e_ciede2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    Delta E CIEDE2000 (kL = kC = kH = 1)
+    Implementacja wg Sharma, Wu, Dalal (2005)
+    """
+    L1, a1, b1 = _split(lab1)
+    L2, a2, b2 = _split(lab2)
+
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    C_mean7 = ((C1 + C2) / 2.0) ** 7
+    G = 0.5 * (1.0 - np.sqrt(C_mean7 / (C_mean7 + 25.0 ** 7)))
+
+    a1p = (1.0 + G) * a1
+    a2p = (1.0 + G) * a2
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360.0
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360.0
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+
+    chroma_zero = (C1p * C2p) == 0
+    dh = h2p - h1p
+    dh = np.where(dh > 180.0, dh - 360.0, dh)
+    dh = np.where(dh < -180.0, dh + 360.0, dh)
+    dh = np.where(chroma_zero, 0.0, dh)
+    dHp = 2.0 * np.sqrt(C1p * C2p) * np.sin(np.radians(dh) / 2.0)
+
+    Lp_mean = (L1 + L2) / 2.0
+    Cp_mean = (C1p + C2p) / 2.0
+
+    h_sum = h1p + h2p
+    h_diff = np.abs(h1p - h2p)
+    hp_mean = np.where(h_diff <= 180.0, h_sum / 2.0,
+                       np.where(h_sum < 360.0, (h_sum + 360.0) / 2.0, (h_sum - 360.0) / 2.0))
+    hp_mean = np.where(chroma_zero, h_sum, hp_mean)
+
+    T = (1.0
+         - 0.17 * np.cos(np.radians(hp_mean - 30.0))
+         + 0.24 * np.cos(np.radians(2.0 * hp_mean))
+         + 0.32 * np.cos(np.radians(3.0 * hp_mean + 6.0))
+         - 0.20 * np.cos(np.radians(4.0 * hp_mean - 63.0)))
+
+    d_theta = 30.0 * np.exp(-(((hp_mean - 275.0) / 25.0) ** 2))
+    Cp_mean7 = Cp_mean ** 7
+    RC = 2.0 * np.sqrt(Cp_mean7 / (Cp_mean7 + 25.0 ** 7))
+    Lp_offset = (Lp_mean - 50.0) ** 2
+    SL = 1.0 + 0.015 * Lp_offset / np.sqrt(20.0 + Lp_offset)
+    SC = 1.0 + 0.045 * Cp_mean
+    SH = 1.0 + 0.015 * Cp_mean * T
+    RT = -np.sin(np.radians(2.0 * d_theta)) * RC
+
+    tL = dLp / SL
+    tC = dCp / SC
+    tH = dHp / SH
+    return np.sqrt(np.maximum(tL ** 2 + tC ** 2 + tH ** 2 + RT * tC * tH, 0.0))
+
+METRICS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "cie76": delta_e_cie76,
+    "cie94": delta_e_cie94,
+    "ciede2000": delta_e_ciede2000,
+}
+
+def get_metric(metric: str) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    """Zwraca funkcję metryki po nazwie"""
+    try:
+        return METRICS[metric.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown Delta E metric: {metric} (available: {', '.join(METRICS)})")
+
+def delta_e_matrix(lab1: np.ndarray,
+                   lab2: np.ndarray,
+                   metric: str = DEFAULT_METRIC,
+                   max_chunk_elements: int = 1 << 21) -> np.ndarray:
+    """
+    Macierz odległości (N × M) między kolorami lab1 (N, 3) a lab2 (M, 3)
+
+    Liczona w blokach wierszy, żeby pamięć pośrednia nie rosła z N × M.
+    """
+    kernel = get_metric(metric)
+    lab1 = np.asarray(lab1, dtype=np.float64).reshape(-1, 3)
+    lab2 = np.asarray(lab2, dtype=np.float64).reshape(-1, 3)
+
+    result = np.empty((len(lab1), len(lab2)), dtype=np.float64)
+    rows = max(1, max_chunk_elements // max(len(lab2), 1))
+    for start in range(0, len(lab1), rows):
+        block = lab1[start:start + rows]
+        result[start:start + len(block)] = kernel(block[:, None, :], lab2[None, :, :])
+    return result
@@ -0,0 +1,173 @@
+"""
+Indeks przestrzenny nici
+KD-tree nad współrzędnymi CIELAB - wsadowe wyszukiwanie najbliższych nici
+zamiast liniowego przeglądania katalogu dla każdego koloru
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from .metrics import DEFAULT_METRIC, delta_e_matrix
+
+# Ile kolorów naraz w zapytaniu z wagami (macierz kolory × preferowane nici)
+WEIGHTED_QUERY_CHUNK = 1 << 14
+
+if TYPE_CHECKING:
+    from .delta_e import Thread
+
+class ThreadIndex:
+    """
+    Indeks najbliższych sąsiadów w przestrzeni Lab
+
+    Odległość euklidesowa w Lab to Delta E (CIE76), więc zapytanie k=1
+    zwraca dokładnie tę samą nić co liniowy skan po delta_e().
+    Indeksy zwracane przez query() odnoszą się do kolejności `lab` / `threads`.
+    """
+
+    def __init__(self,
+                 lab: np.ndarray,
+                 threads: Optional[Sequence["Thread"]] = None,
+                 leaf_size: int = 16):
+        self.lab = np.ascontiguousarray(lab, dtype=np.float64).reshape(-1, 3)
+        # Sekwencje (np. leniwe wiersze katalogu) są trzymane bez kopiowania
+        self.threads = threads if threads is None or isinstance(threads, Sequence) else list(threads)
+        if self.threads is not None and len(self.threads) != len(self.lab):
+            raise ValueError("threads and lab must have the same length")
+        self._tree = KDTree(self.lab, leaf_size=leaf_size) if len(self.lab) else None
+        self._positions: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_threads(cls, threads: Sequence["Thread"]) -> "ThreadIndex":
+        """Buduje indeks z listy obiektów Thread"""
+        lab = np.array([t.lab for t in threads], dtype=np.float64).reshape(-1, 3)
+        return cls(lab, threads)
+
+    def __len__(self) -> int:
+        return len(self.lab)
+
+    def _prepare(self, lab: np.ndarray) -> Tuple[np.ndarray, Tuple[int, ...]]:
+        lab = np.asarray(lab, dtype=np.float64)
+        if lab.shape[-1] != 3:
+            raise ValueError(f"Expected array of shape (..., 3), got {lab.shape}")
+        if self._tree is None:
+            raise ValueError("No matching thread found")
+        return lab.reshape(-1, 3), lab.shape[:-1]
+
+    def query(self,
+              lab: np.ndarray,
+              k: int = 1,
+              metric: str = DEFAULT_METRIC) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Wyszukuje k najbliższych nici dla każdego koloru
+
+        Args:
+            lab: Kolory w Lab, kształt (..., 3)
+            k: Liczba sąsiadów (przycinana do rozmiaru katalogu)
+            metric: "cie76" korzysta z KD-tree, "cie94"/"ciede2000" z macierzy odległości
+
+        Returns:
+            (distances, indices) - obie o kształcie (..., k), posortowane rosnąco
+        """
+        flat, shape = self._prepare(lab)
+        k = max(1, min(int(k), len(self)))
+        if metric == "cie76":
+            distances, indices = self._tree.query(flat, k=k, return_distance=True)
+        else:
+            matrix = self.distance_matrix(flat, metric=metric)
+            if k < len(self):
+                indices = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+            else:
+                indices = np.broadcast_to(np.arange(len(self)), matrix.shape).copy()
+            distances = np.take_along_axis(matrix, indices, axis=1)
+            order = np.argsort(distances, axis=1, kind="stable")
+            indices = np.take_along_axis(indices, order, axis=1)
+            distances = np.take_along_axis(distances, order, axis=1)
+        return distances.reshape(shape + (k,)), indices.reshape(shape + (k,))
+
+    def distance_matrix(self, lab: np.ndarray, metric: str = DEFAULT_METRIC) -> np.ndarray:
+        """Macierz Delta E (N kolorów × M nici) w wybranej metryce"""
+        flat, _ = self._prepare(lab)
+        return delta_e_matrix(flat, self.lab, metric=metric)
+
+    def preference_weights(self, thread_ids: Iterable[str], bonus: float) -> np.ndarray:
+        """
+        Wektor wag (M,) dla zapytań z preferencją: `bonus` dla podanych nici, 1.0 dla reszty
+
+        Koszt jest proporcjonalny do liczby podanych nici, nie do rozmiaru katalogu.
+        Nici spoza indeksu są pomijane.
+        """
+        if not 0 < bonus <= 1:
+            raise ValueError(f"bonus must be in (0, 1], got {bonus}")
+        if self.threads is None:
+            raise ValueError("Index has no threads to match thread_id against")
+        if self._positions is None:
+            self._positions = {t.thread_id: i for i, t in enumerate(self.threads)}
+        weights = np.ones(len(self), dtype=np.float64)
+        owned = [self._positions[t] for t in thread_ids if t in self._positions]
+        weights[owned] = bonus
+        return weights
+
+    def query_weighted(self,
+                       lab: np.ndarray,
+                       weights: np.ndarray,
+                       max_extra_delta_e: Optional[float] = None,
+                       metric: str = DEFAULT_METRIC) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Najbliższa nić z preferencją: wygrywa najmniejsze Delta E × waga
+
+        Waga < 1 działa tylko wtedy, gdy nić leży najwyżej `max_extra_delta_e` dalej
+        niż najbliższa nić w ogóle (None - bez limitu). Najpierw zwykłe zapytanie k=1,
+        potem jedna macierz (kolory × nici z wagą < 1), liczona porcjami.
+
+        Returns:
+            (distances, indices) o kształcie (...) - distances to prawdziwe Delta E
+            wybranej nici (bez wagi)
+        """
+        flat, shape = self._prepare(lab)
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (len(self),):
+            raise ValueError(f"Expected weights of shape ({len(self)},), got {weights.shape}")
+
+        distances, indices = self.query(flat, k=1, metric=metric)
+        distances, indices = distances[:, 0].copy(), indices[:, 0].copy()
+        preferred = np.flatnonzero(weights < 1.0)
+        if len(preferred):
+            preferred_lab, preferred_weights = self.lab[preferred], weights[preferred]
+            tolerance = np.inf if max_extra_delta_e is None else float(max_extra_delta_e)
+            for start in range(0, len(flat), WEIGHTED_QUERY_CHUNK):
+                rows = slice(start, start + WEIGHTED_QUERY_CHUNK)
+                matrix = delta_e_matrix(flat[rows], preferred_lab, metric=metric)
+                within = matrix <= (distances[rows] + tolerance)[:, None]
+                scores = np.where(within, matrix * preferred_weights, np.inf)
+                best = np.argmin(scores, axis=1)
+                best_scores = scores[np.arange(len(best)), best]
+                # Nić bez wagi ma wynik równy swojemu Delta E
+                better = best_scores < distances[rows]
+                chunk_distances, chunk_indices = distances[rows], indices[rows]
+                chunk_distances[better] = matrix[np.arange(len(best)), best][better]
+                chunk_indices[better] = preferred[best[better]]
+        return distances.reshape(shape), indices.reshape(shape)
+
+    def query_radius(self, lab: np.ndarray, r) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Wyszukuje wszystkie nici w promieniu r (Delta E CIE76) od każdego koloru
+
+        Args:
+            lab: Kolory w Lab, kształt (N, 3)
+            r: Promień - liczba lub tablica (N,) z promieniem dla każdego koloru
+
+        Returns:
+            Lista (distances, indices) dla każdego koloru
+        """
+        flat, _ = self._prepare(lab)
+        r = np.broadcast_to(np.asarray(r, dtype=np.float64), (len(flat),))
+        indices, distances = self._tree.query_radius(flat, r, return_distance=True)
+        return list(zip(distances, indices))
+
+def build_brand_indexes(threads: Sequence["Thread"]) -> Dict[str, ThreadIndex]:
+    """Buduje osobny indeks dla każdej marki w katalogu"""
+    by_brand: Dict[str, List["Thread"]] = {}
+    for thread in threads:
+        by_brand.setdefault(thread.brand, []).append(thread)
+    return {brand: ThreadIndex.from_threads(items) for brand, items in by_brand.items()}
@@ -0,0 +1,248 @@
+"""
+Tablica lookup RGB → nić
+Prekomputowane mapowanie skwantyzowanego RGB (domyślnie 5 bitów na kanał) do indeksu
+najbliższej nici danej marki. Mapowanie całego obrazu to jedno fancy-indexing,
+a piksele z komórek granicznych są doprecyzowywane dokładnym zapytaniem do indeksu.
+"""
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .delta_e import INVENTORY_BONUS, INVENTORY_MAX_EXTRA_DELTA_E, rgb_to_lab_array
+from .metrics import DEFAULT_METRIC
+from .thread_index import ThreadIndex
+
+# Katalog z tablicami (obok data/threads.db)
+LUT_DIR = Path(__file__).parent.parent.parent / "data" / "lut"
+
+DEFAULT_BITS = 5
+
+# Najwyższy bit wpisu oznacza komórkę graniczną (narożniki mają różne najbliższe nici)
+_AMBIGUOUS_FLAG = np.uint16(0x8000)
+_INDEX_MASK = np.uint16(0x7FFF)
+
+# Tablice załadowane w tym procesie: (brand, bits, metric, fingerprint) → ThreadLUT
+_LUT_CACHE: Dict[Tuple[str, int, str, str], "ThreadLUT"] = {}
+
+def catalog_fingerprint(index: ThreadIndex) -> str:
+    """Skrót współrzędnych Lab katalogu - zmiana katalogu unieważnia tablice"""
+    return hashlib.sha1(np.ascontiguousarray(index.lab).tobytes()).hexdigest()[:12]
+
+def _nearest_on_grid(index: ThreadIndex,
+                     axis: np.ndarray,
+                     metric: str = DEFAULT_METRIC,
+                     chunk: int = 1 << 18) -> np.ndarray:
+    """Indeks najbliższej nici dla każdego punktu siatki axis × axis × axis"""
+    n = len(axis)
+    result = np.empty((n, n, n), dtype=np.uint16)
+    gg, bb = np.meshgrid(axis, axis, indexing="ij")
+    plane = np.stack([gg.ravel(), bb.ravel()], axis=1)
+    rows_per_chunk = max(1, chunk // len(plane))
+
+    for start in range(0, n, rows_per_chunk):
+        r_values = axis[start:start + rows_per_chunk]
+        points = np.empty((len(r_values), len(plane), 3), dtype=np.float64)
+        points[..., 0] = r_values[:, None]
+        points[..., 1:] = plane[None, :, :]
+        _, nearest = index.query(rgb_to_lab_array(points.reshape(-1, 3)), k=1, metric=metric)
+        result[start:start + len(r_values)] = nearest.reshape(len(r_values), n, n)
+
+    return result
+
+class ThreadLUT:
+    """Tablica lookup RGB → indeks nici w ThreadIndex jednej marki"""
+
+    def __init__(self, table: np.ndarray, index: ThreadIndex, metric: str = DEFAULT_METRIC):
+        if table.ndim != 3 or len(set(table.shape)) != 1:
+            raise ValueError(f"Expected cubic table, got shape {table.shape}")
+        self.table = table
+        self.index = index
+        self.metric = metric
+        self.bits = int(np.log2(table.shape[0]))
+        self._shift = 8 - self.bits
+
+    @classmethod
+    def build(cls,
+              index: ThreadIndex,
+              bits: int = DEFAULT_BITS,
+              metric: str = DEFAULT_METRIC) -> "ThreadLUT":
+        """
+        Buduje tablicę dla danego indeksu
+
+        Komórka dostaje nić najbliższą jej środkowi; jeśli którykolwiek z 8 narożników
+        komórki ma inną najbliższą nić, komórka jest oznaczana jako graniczna.
+        """
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits must be between 1 and 8, got {bits}")
+        if len(index) > int(_INDEX_MASK):
+            raise ValueError(f"Catalog too large for LUT: {len(index)} threads")
+
+        step = 1 << (8 - bits)
+        lower = np.arange(1 << bits) * step
+        upper = lower + step - 1
+
+        if step == 1:
+            # Pełna tablica 24-bit - każda komórka to dokładnie jeden kolor
+            return cls(_nearest_on_grid(index, lower.astype(np.float64), metric), index, metric)
+
+        center = _nearest_on_grid(index, (lower + upper) / 2.0, metric)
+        axis = np.concatenate([lower, upper])
+        order = np.argsort(axis)
+        corners = _nearest_on_grid(index, axis[order].astype(np.float64), metric)
+
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        lo, hi = position[:len(lower)], position[len(lower):]
+
+        ambiguous = np.zeros(center.shape, dtype=bool)
+        for r in (lo, hi):
+            for g in (lo, hi):
+                for b in (lo, hi):
+                    ambiguous |= corners[np.ix_(r, g, b)] != center
+
+        table = center | (ambiguous.astype(np.uint16) * _AMBIGUOUS_FLAG)
+        return cls(table, index, metric)
+
+    def save(self, path: Path) -> None:
+        """Zapisuje tablicę jako .npy (atomowo, przez plik tymczasowy)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.table))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, index: ThreadIndex, metric: str = DEFAULT_METRIC) -> "ThreadLUT":
+        """Ładuje tablicę jako memory-map (strony współdzielone przez procesy)"""
+        return cls(np.load(path, mmap_mode="r"), index, metric)
+
+    def lookup(self, rgb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sam odczyt tablicy dla pikseli uint8 (..., 3), bez doprecyzowania
+
+        Returns:
+            (indeksy nici int64, maska pikseli z komórek granicznych)
+        """
+        cells = rgb >> self._shift
+        entries = self.table[cells[..., 0], cells[..., 1], cells[..., 2]]
+        return (entries & _INDEX_MASK).astype(np.int64), (entries & _AMBIGUOUS_FLAG) != 0
+
+    def map_image(self, rgb: np.ndarray, refine: bool = True) -> np.ndarray:
+        """
+        Mapuje obraz/paletę RGB (..., 3) na indeksy nici (...)
+
+        Args:
+            rgb: Tablica uint8 (lub wartości 0-255) o kształcie (..., 3)
+            refine: Doprecyzowanie pikseli z komórek granicznych dokładnym zapytaniem
+
+        Returns:
+            Tablica int64 z indeksami nici w self.index
+        """
+        rgb = np.asarray(rgb)
+        if rgb.dtype != np.uint8:
+            rgb = np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+        result, border = self.lookup(rgb)
+
+        if refine:
+            if border.any():
+                # Dokładne dopasowanie tylko dla unikalnych kolorów z komórek granicznych
+                colors = rgb[border]
+                packed = (colors[:, 0].astype(np.uint32) << 16) | (colors[:, 1].astype(np.uint32) << 8) | colors[:, 2]
+                unique, inverse = np.unique(packed, return_inverse=True)
+                unique_rgb = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=1)
+                _, nearest = self.index.query(rgb_to_lab_array(unique_rgb.astype(np.uint8)), k=1,
+                                              metric=self.metric)
+                result[border] = nearest[:, 0][inverse.ravel()]
+
+        return result
+
+def get_brand_lut(brand: str,
+                  index: ThreadIndex,
+                  bits: int = DEFAULT_BITS,
+                  lut_dir: Optional[Path] = None,
+                  metric: str = DEFAULT_METRIC) -> ThreadLUT:
+    """
+    Zwraca tablicę dla marki - z pamięci procesu, z dysku lub budując ją od zera
+
+    Nazwa pliku zawiera odcisk katalogu, więc po zmianie nici tablica jest budowana ponownie.
+    """
+    fingerprint = catalog_fingerprint(index)
+    key = (brand, bits, metric, fingerprint)
+    lut = _LUT_CACHE.get(key)
+    if lut is not None:
+        return lut
+
+    path = Path(lut_dir or LUT_DIR) / f"{brand.lower()}_{bits}bit_{metric}_{fingerprint}.npy"
+    if path.exists():
+        lut = ThreadLUT.load(path, index, metric)
+    else:
+        lut = ThreadLUT.build(index, bits=bits, metric=metric)
+        try:
+            lut.save(path)
+        except OSError:
+            # Brak zapisu (np. read-only filesystem) - tablica zostaje tylko w pamięci
+            pass
+
+    _LUT_CACHE[key] = lut
+    return lut
+
+def map_image_weighted(rgb: np.ndarray,
+                       index: ThreadIndex,
+                       weights: np.ndarray,
+                       max_extra_delta_e: Optional[float] = None,
+                       metric: str = DEFAULT_METRIC) -> np.ndarray:
+    """
+    Mapuje obraz na nici z wektorem wag (ThreadIndex.query_weighted)
+
+    Tablica nie zna wag zapytania, więc dopasowanie idzie po unikalnych kolorach obrazu.
+    """
+    rgb = np.clip(np.rint(np.asarray(rgb)), 0, 255).astype(np.uint8)
+    flat = rgb.reshape(-1, 3)
+    packed = (flat[:, 0].astype(np.uint32) << 16) | (flat[:, 1].astype(np.uint32) << 8) | flat[:, 2]
+    unique, inverse = np.unique(packed, return_inverse=True)
+    unique_rgb = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=1)
+    _, nearest = index.query_weighted(rgb_to_lab_array(unique_rgb.astype(np.uint8)), weights,
+                                      max_extra_delta_e, metric=metric)
+    return nearest[inverse.ravel()].reshape(rgb.shape[:-1])
+
+def quantize_to_threads(rgb: np.ndarray,
+                        lut: ThreadLUT,
+                        max_colors: int,
+                        user_inventory: Optional[Iterable[str]] = None,
+                        inventory_bonus: float = INVENTORY_BONUS,
+                        max_extra_delta_e: Optional[float] = INVENTORY_MAX_EXTRA_DELTA_E
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bezpośrednia kwantyzacja obrazu do nici (bez klasteryzacji)
+
+    Każdy piksel dostaje najbliższą nić z tablicy; jeśli użytych nici jest więcej
+    niż max_colors, zostają najczęstsze, a pozostałe są mapowane na najbliższą z nich.
+    Z user_inventory piksele są dopasowywane z preferencją nici z inwentarza
+    (jak find_closest_threads) zamiast przez tablicę.
+
+    Returns:
+        (labels, thread_indices) - labels (H, W) indeksują thread_indices,
+        a thread_indices to pozycje nici w lut.index
+    """
+    if user_inventory:
+        weights = lut.index.preference_weights(user_inventory, inventory_bonus)
+        thread_ids = map_image_weighted(rgb, lut.index, weights, max_extra_delta_e, lut.metric)
+    else:
+        thread_ids = lut.map_image(rgb)
+    used, inverse, counts = np.unique(thread_ids, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(thread_ids.shape)
+
+    if len(used) <= max_colors:
+        return inverse, used
+
+    # Najczęstsze nici zostają, rzadkie trafiają do najbliższej z pozostawionych
+    keep = np.sort(np.argsort(-counts, kind="stable")[:max_colors])
+    kept_index = ThreadIndex(lut.index.lab[used[keep]])
+    _, nearest = kept_index.query(lut.index.lab[used], k=1, metric=lut.metric)
+    remap = nearest[:, 0]
+
+    return remap[inverse], used[keep]
@@ -2,19 +2,26 @@
 API service configuration
 """
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import auth, credentials, firestore, storage
 import os
+import threading
 from dotenv import load_dotenv, find_dotenv
 
 # Load .env from project root if running from subfolder
 load_dotenv(find_dotenv())
 
 # Firebase Admin SDK initialization
-def initialize_firebase():
-    """Initialize Firebase Admin SDK"""
+_app_lock = threading.Lock()
+
+def initialize_firebase_app():
+    """Initialize the Firebase Admin SDK app (once per process, safe across threads)"""
+    with _app_lock:
+        return _initialize_firebase_app()
+
+def _initialize_firebase_app():
     try:
         # Check if already initialized
-        firebase_admin.get_app()
+        return firebase_admin.get_app()
     except ValueError:
         # Initialize with environment variables or service account
         if os.getenv("FIREBASE_PRIVATE_KEY"):
@@ -24,15 +31,27 @@ def initialize_firebase():
                 "private_key": os.getenv("FIREBASE_PRIVATE_KEY").replace('\\n', '\n'),
                 "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
             })
-            firebase_admin.initialize_app(cred, {
+            return firebase_admin.initialize_app(cred, {
                 'storageBucket': os.getenv("GOOGLE_CLOUD_STORAGE_BUCKET")
             })
-        else:
-            # Use default credentials (for Cloud Run)
-            firebase_admin.initialize_app()
-    
+        # Use default credentials (for Cloud Run)
+        return firebase_admin.initialize_app()
+
+def initialize_firebase():
+    """Initialize Firebase Admin SDK"""
+    initialize_firebase_app()
     return firestore.client(), storage.bucket()
 
+def verify_id_token(id_token: str) -> str:
+    """
+    Verify a Firebase ID token (signature, expiry, project) and return the user's uid
+
+    Raises:
+        ValueError / firebase_admin.auth errors for missing, invalid, expired or revoked tokens
+    """
+    initialize_firebase_app()
+    return auth.verify_id_token(id_token)["uid"]
+
 # Global instances
 db = None
 bucket = None
@@ -0,0 +1,177 @@
+"""
+Image → pattern conversion pipeline
+CPU-bound part of /api/v1/convert, kept free of FastAPI so it can run in worker processes
+"""
+import hashlib
+import json
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from color_engine.delta_e import Thread, find_closest_threads, rgb_to_lab_array
+from color_engine.metrics import get_metric
+from color_engine.thread_index import ThreadIndex
+from color_engine.thread_lut import get_brand_lut, quantize_to_threads
+from database.catalog import get_catalog
+from grid_codec import grid_dtype
+from image_processor.dithering import dither
+from image_processor.loader import load_rgb
+from image_processor.quantizers import get_quantizer, quantization_error, quantize_to_thread_palette
+
+# Longest side of the image used for conversion (one pixel = one stitch)
+MAX_IMAGE_SIZE = 600
+
+# Quantizers that pick threads directly (besides the color backends in QUANTIZERS)
+THREAD_QUANTIZERS = ("direct", "thread_palette")
+
+def load_thread_database(brand: str) -> Tuple[Sequence[Thread], ThreadIndex]:
+    """
+    Returns the brand's threads and their prebuilt spatial index
+    from the process-wide catalog snapshot
+    """
+    view = get_catalog().brand(brand)
+    if view is None:
+        raise ValueError(f"Unknown thread brand: {brand}")
+    return view.threads, view.index
+
+def preload() -> None:
+    """
+    Warms a worker process: loads the catalog snapshot with all brand indexes
+    (sklearn/OpenCV are already imported at module level)
+    """
+    get_catalog()
+
+def conversion_cache_key(image_data: bytes, request, catalog_fingerprint: str = "") -> str:
+    """
+    Content address of a conversion: SHA-256 of the image bytes plus the
+    normalized request parameters (the URL and the response encoding do not affect the result;
+    a stored inventory is already resolved into user_inventory)
+    and the thread catalog version
+    """
+    params = request.model_dump(exclude={"image_url", "grid_encoding"})
+    digest = hashlib.sha256(image_data)
+    digest.update(catalog_fingerprint.encode())
+    digest.update(json.dumps(params, sort_keys=True, separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+def convert_pattern(image_data: bytes,
+                    request,
+                    progress: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    Converts raw image bytes into pattern data
+    
+    Args:
+        image_data: Encoded image (JPEG/PNG/...)
+        request: ConversionRequest with conversion settings
+        progress: Optional callback called with the name of each stage as it starts
+                  (resize, quantize, match, grid)
+    
+    Returns:
+        Dict with grid_data, color_palette, dimensions, estimated_time_minutes and
+        quantization_error (mean squared RGB error of the quantized image);
+        grid_data["grid"] is a uint8/uint16 ndarray (see grid_codec for encodings)
+    """
+    report = progress or (lambda stage: None)
+    thread_database, thread_index = load_thread_database(request.thread_brand)
+    
+    # Decode straight at working size (JPEG draft mode: full resolution never hits memory)
+    report("resize")
+    img_array = load_rgb(image_data, max_size=MAX_IMAGE_SIZE)
+    
+    n_colors = min(request.max_colors, 30)
+    grid_height, grid_width = img_array.shape[:2]
+    color_palette = []
+    
+    report("quantize")
+    inventory = set(request.user_inventory) if request.use_inventory else None
+    preference = {"inventory_bonus": request.inventory_bonus, "max_extra_delta_e": request.max_extra_delta_e}
+    if request.quantizer in THREAD_QUANTIZERS:
+        if request.quantizer == "direct":
+            # Direct thread quantization: every pixel → nearest thread via brand LUT
+            # (with an inventory: weighted query over the unique colors instead)
+            lut = get_brand_lut(request.thread_brand, thread_index, metric=request.metric)
+            grid, used_threads = quantize_to_threads(img_array, lut, n_colors, user_inventory=inventory,
+                                                     **preference)
+        else:
+            # Palette-constrained clustering: best subset of distinct brand threads
+            grid, used_threads, _ = quantize_to_thread_palette(
+                img_array, n_colors, thread_index, metric=request.metric, user_inventory=inventory,
+                **preference
+            )
+        colors = np.array([thread_database[i].rgb for i in used_threads], dtype=int)
+        
+        # Mean Delta E of the pixels assigned to each thread (no re-matching needed)
+        report("match")
+        pixel_delta = get_metric(request.metric)(
+            rgb_to_lab_array(img_array), thread_index.lab[used_threads][grid]
+        )
+        delta_sums = np.bincount(grid.ravel(), weights=pixel_delta.ravel(), minlength=len(used_threads))
+        pixel_counts = np.bincount(grid.ravel(), minlength=len(used_threads))
+        thread_matches = [
+            {"thread": thread_database[i], "delta_e": delta_sums[j] / max(pixel_counts[j], 1)}
+            for j, i in enumerate(used_threads)
+        ]
+        quant_error = quantization_error(img_array.reshape(-1, 3), colors, grid)
+    else:
+        # Color quantization with the selected backend (kmeans, minibatch, median_cut, octree, wu, wu_kmeans)
+        quantized = get_quantizer(request.quantizer)(img_array, n_colors)
+        colors = np.rint(quantized.palette).astype(int)
+        grid = quantized.labels
+        quant_error = quantized.error
+        
+        # Map colors to threads (one batched index query for all centroids)
+        report("match")
+        thread_matches = find_closest_threads(
+            colors, thread_database, user_inventory=inventory, index=thread_index, metric=request.metric,
+            **preference
+        )
+    
+    for idx, (rgb, thread_match) in enumerate(zip(colors, thread_matches)):
+        color_palette.append({
+            "rgb": [int(x) for x in rgb],  # Ensure standard int
+            "thread_code": thread_match["thread"].color_code,
+            "thread_brand": thread_match["thread"].brand,
+            "thread_name": thread_match["thread"].color_name,
+            "symbol": chr(65 + idx) if idx < 26 else chr(97 + idx - 26),  # A-Z, then a-z
+            "delta_e": round(float(thread_match["delta_e"]), 2)
+        })
+    
+    # Generate pattern based on type
+    report("grid")
+    if request.enable_dithering:
+        # Error diffusion / ordered dithering against the colors that get stitched
+        thread_colors = np.array([entry["thread"].rgb for entry in thread_matches])
+        grid = dither(img_array, thread_colors, request.dither_method)
+    
+    grid_data = {
+        "grid": grid.astype(grid_dtype(len(color_palette) - 1)),  # Row-major palette indices
+        "type": request.pattern_type,
+        "width": int(grid_width),
+        "height": int(grid_height)
+    }
+    
+    # Calculate dimensions
+    width_stitches = int(grid_width)
+    height_stitches = int(grid_height)
+    
+    # Physical dimensions (cm) based on Aida count
+    cm_per_stitch = 2.54 / request.aida_count  # Aida count = stitches per inch
+    width_cm = width_stitches * cm_per_stitch
+    height_cm = height_stitches * cm_per_stitch
+    
+    # Estimated time (rough: 1 stitch = 0.5 minute for beginners)
+    total_stitches = width_stitches * height_stitches
+    estimated_time = int(total_stitches * 0.5)
+    
+    return {
+        "grid_data": grid_data,
+        "color_palette": color_palette,
+        "dimensions": {
+            "width_stitches": width_stitches,
+            "height_stitches": height_stitches,
+            "width_cm": round(width_cm, 1),
+            "height_cm": round(height_cm, 1)
+        },
+        "estimated_time_minutes": estimated_time,
+        "quantization_error": round(quant_error, 2)
+    }
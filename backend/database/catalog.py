@@ -0,0 +1,365 @@
+"""
+Snapshot katalogu nici w pamięci
+Ładowany raz na proces (kolumnowe tablice NumPy + widoki per marka) i odświeżany
+tylko, gdy zmieni się mtime pliku bazy lub PRAGMA user_version.
+Tablice rgb/lab i napisy pochodzą z mapowanego pliku threads.columns, więc workery dzielą
+jedną kopię; obiekty Thread, JSON odpowiedzi i słowniki kodów powstają dopiero przy użyciu.
+Prywatne w każdym procesie zostają drzewa KD (ThreadIndex) marek.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from color_engine.delta_e import Thread
+from color_engine.metrics import get_metric
+from color_engine.thread_index import ThreadIndex
+from database.equivalence import EquivalenceTable, build_equivalence, load_equivalence
+from database.threads import (DB_PATH, STRING_COLUMNS, ThreadColumns, open_thread_columns,
+                              write_thread_columns)
+
+# Co ile sekund (najwyżej) sprawdzać PRAGMA user_version
+CATALOG_CHECK_INTERVAL = 2.0
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    array.setflags(write=False)
+    return array
+
+def _thread_info_json(threads: Sequence[Thread], hex_colors: Sequence[str]) -> bytes:
+    """Gotowa odpowiedź /api/v1/threads (lista ThreadInfo)"""
+    return json.dumps([
+        {
+            "thread_id": t.thread_id,
+            "brand": t.brand,
+            "color_code": t.color_code,
+            "color_name": t.color_name,
+            "rgb": list(t.rgb),
+            "hex_color": hex_color,
+        }
+        for t, hex_color in zip(threads, hex_colors)
+    ], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _fingerprint(thread_ids: Sequence[str], lab: np.ndarray) -> str:
+    digest = hashlib.sha1("\n".join(thread_ids).encode())
+    digest.update(lab.tobytes())
+    return digest.hexdigest()[:16]
+
+class ThreadRows(Sequence):
+    """
+    Nici katalogu jako sekwencja nad kolumnami - Thread jest tworzony przy odczycie,
+    więc proces nie trzyma obiektu na każdy wiersz. Wycinek z krokiem 1 to znów ThreadRows.
+    """
+
+    def __init__(self, strings: Dict[str, Sequence[str]], rgb: np.ndarray, lab: np.ndarray,
+                 start: int = 0, stop: Optional[int] = None):
+        self._strings = strings
+        self._rgb = rgb
+        self._lab = lab
+        self.start = start
+        self.stop = len(rgb) if stop is None else stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return ThreadRows(self._strings, self._rgb, self._lab,
+                                  self.start + start, self.start + max(start, stop))
+            return [self[j] for j in range(start, stop, step)]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("thread index out of range")
+        row = self.start + i
+        return Thread(
+            thread_id=self._strings["thread_id"][row],
+            brand=self._strings["brand"][row],
+            color_code=self._strings["color_code"][row],
+            color_name=self._strings["color_name"][row],
+            rgb=tuple(self._rgb[row].tolist()),
+            lab=tuple(self._lab[row].tolist())
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+@dataclass(frozen=True)
+class BrandView:
+    """Nici jednej marki - widoki (bez kopiowania) na tablice i kolumny katalogu"""
+    brand: str
+    start: int
+    stop: int
+    threads: Sequence[Thread]
+    rgb: np.ndarray
+    lab: np.ndarray
+    index: ThreadIndex
+    color_codes: Sequence[str]
+    hex_colors: Sequence[str]
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @cached_property
+    def thread_info_json(self) -> bytes:
+        return _thread_info_json(self.threads, self.hex_colors)
+
+    @cached_property
+    def code_index(self) -> Dict[str, int]:
+        """color_code → indeks w obrębie marki"""
+        return {code: j for j, code in enumerate(self.color_codes)}
+
+@dataclass(frozen=True)
+class ThreadCatalog:
+    """Niezmienny snapshot całej tabeli threads (posortowanej po brand, color_code)"""
+    version: Tuple[int, int]  # (mtime_ns pliku bazy, PRAGMA user_version)
+    fingerprint: str
+    thread_ids: Sequence[str]  # krotki albo kolumny pliku (StringColumn)
+    brand_names: Sequence[str]
+    color_codes: Sequence[str]
+    color_names: Sequence[str]
+    hex_colors: Sequence[str]
+    rgb: np.ndarray  # (N, 3) uint8
+    lab: np.ndarray  # (N, 3) float64
+    threads: Sequence[Thread]
+    brands: Dict[str, BrandView]
+    equivalence: Optional[EquivalenceTable] = None
+
+    def __len__(self) -> int:
+        return len(self.thread_ids)
+
+    @cached_property
+    def thread_info_json(self) -> bytes:
+        return _thread_info_json(self.threads, self.hex_colors)
+
+    def brand(self, name: str) -> Optional[BrandView]:
+        """Widok marki albo None, jeśli marki nie ma w katalogu"""
+        return self.brands.get(name)
+
+    def conversion_pair(self, from_brand: str, to_brand: str,
+                        metric: str = "cie76") -> Tuple[BrandView, BrandView, str]:
+        """
+        Sprawdza parę marek i metrykę konwersji
+
+        Returns:
+            (widok marki źródłowej, widok marki docelowej, nazwa metryki małymi literami)
+
+        Raises:
+            ValueError: nieznana marka lub metryka
+        """
+        source, target = self.brands.get(from_brand), self.brands.get(to_brand)
+        if source is None or target is None:
+            raise ValueError(f"Unknown brand: {from_brand if source is None else to_brand}")
+        get_metric(metric)
+        return source, target, metric.lower()
+
+    def equivalents(self,
+                    from_brand: str,
+                    to_brand: str,
+                    color_code: str,
+                    metric: str = "cie76",
+                    top_k: int = 1) -> Optional[List[Tuple[Thread, float]]]:
+        """
+        Najbliższe odpowiedniki nici w innej marce - odczyt z tabeli odpowiedników
+
+        Returns:
+            Lista (nić, Delta E) rosnąco po Delta E (najwyżej top_k) albo None,
+            jeśli kodu nie ma w marce źródłowej
+
+        Raises:
+            ValueError: nieznana marka lub metryka (wielkość liter metryki bez znaczenia)
+        """
+        source, target, metric = self.conversion_pair(from_brand, to_brand, metric)
+        position = source.code_index.get(color_code)
+        if position is None:
+            return None
+        if from_brand == to_brand:
+            # Ta sama marka: sama nić (Delta E 0), potem jej najbliżsi sąsiedzi w marce
+            distances, indices = source.index.query(source.lab[position], k=top_k, metric=metric)
+            return [(source.threads[i], float(d)) for i, d in zip(indices.tolist(), distances.tolist())]
+
+        # Snapshoty spoza load_catalog (bez pliku bazy) liczą tabelę na żądanie
+        table = self.equivalence or build_equivalence(self.brands)
+        indices, distances = table.matches(from_brand, to_brand, metric, position)
+        return [(target.threads[i], float(d)) for i, d in zip(indices[:top_k], distances[:top_k])]
+
+    @classmethod
+    def from_rows(cls, rows: List[sqlite3.Row], version: Tuple[int, int]) -> "ThreadCatalog":
+        """Buduje snapshot z wierszy posortowanych po (brand, color_code)"""
+        rgb = np.array([(row["r"], row["g"], row["b"]) for row in rows], dtype=np.uint8).reshape(-1, 3)
+        lab = _readonly(np.array([(row["l_star"], row["a_star"], row["b_star"]) for row in rows],
+                                 dtype=np.float64).reshape(-1, 3))
+        strings = {name: tuple(row[name] for row in rows) for name in STRING_COLUMNS}
+
+        # Wiersze jednej marki są ciągłe
+        brand_names = strings["brand"]
+        bounds, start = [], 0
+        for i in range(1, len(brand_names) + 1):
+            if i == len(brand_names) or brand_names[i] != brand_names[start]:
+                bounds.append((brand_names[start], start, i))
+                start = i
+        return cls._build(strings, _readonly(rgb), lab, version, bounds,
+                          _fingerprint(strings["thread_id"], lab))
+
+    @classmethod
+    def from_columns(cls, columns: ThreadColumns) -> "ThreadCatalog":
+        """
+        Buduje snapshot z pliku kolumnowego - rgb/lab i napisy zostają widokami na zmapowany
+        plik (wspólne strony dla wszystkich procesów); nic nie jest dekodowane z góry
+        """
+        bounds = [(name, start, stop) for name, (start, stop) in columns.brands.items()]
+        fingerprint = columns.fingerprint or _fingerprint(columns.strings["thread_id"].tolist(), columns.lab)
+        return cls._build(columns.strings, columns.rgb, columns.lab, columns.source, bounds, fingerprint)
+
+    @classmethod
+    def _build(cls,
+               strings: Dict[str, Sequence[str]],
+               rgb: np.ndarray,
+               lab: np.ndarray,
+               version: Tuple[int, int],
+               brand_bounds: List[Tuple[str, int, int]],
+               fingerprint: str) -> "ThreadCatalog":
+        threads = ThreadRows(strings, rgb, lab)
+        brands: Dict[str, BrandView] = {}
+        for brand, start, stop in brand_bounds:
+            view_threads = threads[start:stop]
+            brands[brand] = BrandView(
+                brand=brand,
+                start=start,
+                stop=stop,
+                threads=view_threads,
+                rgb=rgb[start:stop],
+                lab=lab[start:stop],
+                index=ThreadIndex(lab[start:stop], view_threads),
+                color_codes=strings["color_code"][start:stop],
+                hex_colors=strings["hex_color"][start:stop]
+            )
+
+        return cls(
+            version=version,
+            fingerprint=fingerprint,
+            thread_ids=strings["thread_id"],
+            brand_names=strings["brand"],
+            color_codes=strings["color_code"],
+            color_names=strings["color_name"],
+            hex_colors=strings["hex_color"],
+            rgb=rgb,
+            lab=lab,
+            threads=threads,
+            brands=brands
+        )
+
+def _read_user_version(db_path: Path) -> int:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def _open_columns(path: Path, version: Tuple[int, int]) -> Optional[ThreadColumns]:
+    """Plik kolumnowy, jeśli istnieje i powstał z tej samej wersji bazy"""
+    try:
+        columns = open_thread_columns(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Thread columns file unreadable ({path}): {e}")
+        return None
+    return columns if columns.source == version else None
+
+def _write_columns(path: Path, catalog: ThreadCatalog) -> None:
+    strings = {
+        "thread_id": catalog.thread_ids,
+        "brand": catalog.brand_names,
+        "color_code": catalog.color_codes,
+        "color_name": catalog.color_names,
+        "hex_color": catalog.hex_colors,
+    }
+    try:
+        write_thread_columns(path, catalog.version, strings, catalog.rgb, catalog.lab, catalog.fingerprint)
+    except OSError:
+        # Brak zapisu (np. read-only filesystem) - kolejne procesy przeczytają bazę
+        pass
+
+def load_catalog(db_path: Path = DB_PATH) -> ThreadCatalog:
+    """
+    Wczytuje pełny snapshot - z pliku kolumnowego obok bazy (mmap, bez parsowania),
+    a gdy go brak lub jest nieaktualny, z SQLite (i zapisuje plik dla kolejnych procesów)
+    """
+    db_path = Path(db_path)
+    columns_path = db_path.with_suffix(".columns")
+    mtime_ns = db_path.stat().st_mtime_ns
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        columns = _open_columns(columns_path, (mtime_ns, user_version))
+        if columns is not None:
+            catalog = ThreadCatalog.from_columns(columns)
+            return replace(catalog, equivalence=load_equivalence(catalog.brands, db_path, catalog.fingerprint))
+        rows = conn.execute("""
+            SELECT thread_id, brand, color_code, color_name,
+                   r, g, b, l_star, a_star, b_star, hex_color
+            FROM threads
+            ORDER BY brand, color_code
+        """).fetchall()
+    finally:
+        conn.close()
+    catalog = ThreadCatalog.from_rows(rows, (mtime_ns, user_version))
+    _write_columns(columns_path, catalog)
+    # Tabela odpowiedników między markami - z pliku obok bazy albo liczona teraz
+    return replace(catalog, equivalence=load_equivalence(catalog.brands, db_path, catalog.fingerprint))
+
+class CatalogHolder:
+    """
+    Trzyma aktualny snapshot dla procesu
+
+    mtime pliku jest sprawdzany przy każdym dostępie (jeden stat), a PRAGMA user_version
+    najwyżej co CATALOG_CHECK_INTERVAL sekund (zmiany w trybie WAL nie zmieniają mtime).
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.db_path = Path(db_path)
+        self.check_interval = check_interval
+        self._catalog: Optional[ThreadCatalog] = None
+        self._user_version_checked = 0.0
+        self._lock = threading.Lock()
+
+    def _is_current(self, catalog: ThreadCatalog) -> bool:
+        mtime_ns, user_version = catalog.version
+        if self.db_path.stat().st_mtime_ns != mtime_ns:
+            return False
+        now = time.monotonic()
+        if now - self._user_version_checked >= self.check_interval:
+            self._user_version_checked = now
+            return _read_user_version(self.db_path) == user_version
+        return True
+
+    def get(self) -> ThreadCatalog:
+        catalog = self._catalog
+        if catalog is not None and self._is_current(catalog):
+            return catalog
+        with self._lock:
+            # Inny wątek mógł już odświeżyć snapshot
+            if self._catalog is catalog:
+                self._catalog = load_catalog(self.db_path)
+                self._user_version_checked = time.monotonic()
+            return self._catalog
+
+_holder = CatalogHolder()
+
+def get_catalog() -> ThreadCatalog:
+    """Aktualny snapshot katalogu nici (wspólny dla całego procesu)"""
+    return _holder.get()
@@ -0,0 +1,118 @@
+"""
+Tabela odpowiedników nici między markami
+Dla każdej pary marek (źródło → cel) i każdej metryki Delta E: top-k najbliższych nici
+marki docelowej dla każdej nici źródłowej. Liczona raz przy ładowaniu katalogu
+i zapisywana obok threads.db (.npz z odciskiem katalogu w nazwie), więc konwersja
+kodu między markami to odczyt wiersza zamiast skanu całej bazy.
+"""
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from color_engine.metrics import METRICS, delta_e_matrix
+
+if TYPE_CHECKING:
+    from database.catalog import BrandView
+
+# Ile najbliższych odpowiedników przechowywać dla każdej nici
+EQUIVALENCE_TOP_K = 5
+
+PairKey = Tuple[str, str, str]  # (marka źródłowa, marka docelowa, metryka)
+
+@dataclass(frozen=True)
+class EquivalenceTable:
+    """
+    Odpowiedniki nici dla wszystkich par marek i metryk
+
+    indices[key][i] to indeksy (w obrębie marki docelowej) k najbliższych nici dla
+    i-tej nici marki źródłowej, posortowane rosnąco po distances[key][i].
+    """
+    top_k: int
+    indices: Dict[PairKey, np.ndarray]  # (N_źródło, k) int32
+    distances: Dict[PairKey, np.ndarray]  # (N_źródło, k) float32
+
+    def matches(self, from_brand: str, to_brand: str, metric: str, source: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(indeksy nici docelowych, Delta E) dla nici źródłowej o indeksie `source`"""
+        key = (from_brand, to_brand, metric)
+        return self.indices[key][source], self.distances[key][source]
+
+def build_equivalence(brands: Mapping[str, "BrandView"], top_k: int = EQUIVALENCE_TOP_K) -> EquivalenceTable:
+    """Liczy top-k odpowiedników dla każdej uporządkowanej pary marek i każdej metryki"""
+    indices: Dict[PairKey, np.ndarray] = {}
+    distances: Dict[PairKey, np.ndarray] = {}
+    for source in brands.values():
+        for target in brands.values():
+            if source.brand == target.brand or len(target) == 0:
+                continue
+            k = min(top_k, len(target))
+            for metric in METRICS:
+                matrix = delta_e_matrix(source.lab, target.lab, metric)
+                nearest = np.argpartition(matrix, k - 1, axis=1)[:, :k]
+                nearest_distances = np.take_along_axis(matrix, nearest, axis=1)
+                order = np.argsort(nearest_distances, axis=1, kind="stable")
+                key = (source.brand, target.brand, metric)
+                indices[key] = np.take_along_axis(nearest, order, axis=1).astype(np.int32)
+                distances[key] = np.take_along_axis(nearest_distances, order, axis=1).astype(np.float32)
+    return EquivalenceTable(top_k=top_k, indices=indices, distances=distances)
+
+def equivalence_path(db_path: Path, fingerprint: str, top_k: int = EQUIVALENCE_TOP_K) -> Path:
+    """Plik tabeli obok bazy, np. data/threads.equivalence_5_<odcisk>.npz"""
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}.equivalence_{top_k}_{fingerprint}.npz")
+
+def save_equivalence(table: EquivalenceTable, path: Path) -> None:
+    """Zapisuje tabelę atomowo i usuwa tabele poprzednich wersji katalogu"""
+    arrays = {}
+    for key in table.indices:
+        name = "|".join(key)
+        arrays[f"{name}|indices"] = table.indices[key]
+        arrays[f"{name}|distances"] = table.distances[key]
+    # Własny plik tymczasowy każdego procesu - workery ładujące katalog naraz nie piszą do jednego pliku
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.chmod(tmp_name, 0o644)  # mkstemp tworzy plik 0600
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    for stale in path.parent.glob(f"{path.name.rsplit('_', 1)[0]}_*.npz"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+
+def load_equivalence_file(path: Path, top_k: int = EQUIVALENCE_TOP_K) -> EquivalenceTable:
+    indices: Dict[PairKey, np.ndarray] = {}
+    distances: Dict[PairKey, np.ndarray] = {}
+    with np.load(path, allow_pickle=False) as data:
+        for name in data.files:
+            from_brand, to_brand, metric, kind = name.split("|")
+            target = indices if kind == "indices" else distances
+            target[(from_brand, to_brand, metric)] = data[name]
+    return EquivalenceTable(top_k=top_k, indices=indices, distances=distances)
+
+def load_equivalence(brands: Mapping[str, "BrandView"],
+                     db_path: Path,
+                     fingerprint: str,
+                     top_k: int = EQUIVALENCE_TOP_K) -> EquivalenceTable:
+    """Tabela z pliku obok bazy albo zbudowana od zera (i zapisana, jeśli się da)"""
+    path = equivalence_path(db_path, fingerprint, top_k)
+    if path.exists():
+        try:
+            return load_equivalence_file(path, top_k)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            # Uszkodzony plik (np. ucięty) jest budowany od nowa i nadpisywany
+            print(f"⚠️  Equivalence table unreadable ({path}): {e}")
+
+    table = build_equivalence(brands, top_k)
+    try:
+        save_equivalence(table, path)
+    except OSError:
+        # Brak zapisu (np. read-only filesystem) - tabela zostaje tylko w pamięci
+        pass
+    return table
@@ -0,0 +1,214 @@
+"""
+Import katalogu nici z plików CSV
+Wszystkie pliki *_colors.csv są parsowane naraz, Lab liczony wektorowo dla całej marki,
+a zapis idzie przez executemany w jednej transakcji (WAL - czytelnicy API nie są blokowani).
+Suma kontrolna treści marki jest zapisywana w bazie, więc ponowny import niezmienionej
+marki nic nie robi. Po imporcie można od razu zbudować artefakty pochodne
+(tabela odpowiedników, tablice LUT).
+"""
+import csv
+import hashlib
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from color_engine.delta_e import rgb_to_lab_array
+from color_engine.thread_lut import get_brand_lut
+from database.catalog import load_catalog
+from database.threads import DB_PATH
+
+# Katalog z plikami <marka>_colors.csv
+CSV_DIR = DB_PATH.parent / "threads"
+
+CSV_COLUMNS = ("thread_id", "brand", "color_code", "color_name", "r", "g", "b")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS threads (
+        thread_id TEXT PRIMARY KEY,
+        brand TEXT NOT NULL,
+        color_code TEXT NOT NULL,
+        color_name TEXT NOT NULL,
+        r INTEGER NOT NULL,
+        g INTEGER NOT NULL,
+        b INTEGER NOT NULL,
+        l_star REAL NOT NULL,
+        a_star REAL NOT NULL,
+        b_star REAL NOT NULL,
+        hex_color TEXT NOT NULL,
+        UNIQUE(brand, color_code)
+    );
+    CREATE INDEX IF NOT EXISTS idx_brand ON threads(brand);
+    CREATE INDEX IF NOT EXISTS idx_color_code ON threads(color_code);
+    CREATE TABLE IF NOT EXISTS catalog_imports (
+        brand TEXT PRIMARY KEY,
+        checksum TEXT NOT NULL,
+        thread_count INTEGER NOT NULL,
+        imported_at REAL NOT NULL
+    );
+"""
+
+@dataclass
+class BrandRows:
+    """Wiersze jednej marki z CSV (kolumnowo)"""
+    brand: str
+    thread_ids: List[str] = field(default_factory=list)
+    color_codes: List[str] = field(default_factory=list)
+    color_names: List[str] = field(default_factory=list)
+    rgb: List[tuple] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.thread_ids)
+
+    @property
+    def checksum(self) -> str:
+        """Skrót treści marki niezależny od kolejności wierszy w plikach"""
+        digest = hashlib.sha256(self.brand.encode())
+        for row in sorted(zip(self.thread_ids, self.color_codes, self.color_names, self.rgb)):
+            digest.update(repr(row).encode())
+        return digest.hexdigest()
+
+@dataclass
+class ImportReport:
+    imported: Dict[str, int] = field(default_factory=dict)  # marka → liczba zapisanych nici
+    removed: Dict[str, int] = field(default_factory=dict)  # marka → nici usunięte (brak w CSV)
+    unchanged: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.imported or self.removed)
+
+def find_csv_files(csv_dir: Path = CSV_DIR) -> List[Path]:
+    """Wszystkie pliki *_colors.csv w katalogu"""
+    return sorted(Path(csv_dir).glob("*_colors.csv"))
+
+def parse_csv_files(paths: Iterable[Path], brands: Optional[Sequence[str]] = None) -> Dict[str, BrandRows]:
+    """
+    Wczytuje pliki CSV i grupuje wiersze po kolumnie brand
+
+    Args:
+        brands: Opcjonalnie tylko te marki (wielkość liter bez znaczenia)
+    """
+    wanted = {b.lower() for b in brands} if brands else None
+    result: Dict[str, BrandRows] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.DictReader(f)
+            missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"{path}: missing columns {', '.join(sorted(missing))}")
+            for row in reader:
+                brand = row["brand"].strip()
+                if wanted is not None and brand.lower() not in wanted:
+                    continue
+                rows = result.setdefault(brand, BrandRows(brand))
+                rows.thread_ids.append(row["thread_id"].strip())
+                rows.color_codes.append(row["color_code"].strip())
+                rows.color_names.append(row["color_name"].strip())
+                rows.rgb.append((int(row["r"]), int(row["g"]), int(row["b"])))
+    return result
+
+def _thread_records(rows: BrandRows) -> List[tuple]:
+    """Krotki do executemany - Lab dla całej marki jednym wywołaniem"""
+    rgb = np.array(rows.rgb, dtype=np.float64).reshape(-1, 3)
+    lab = rgb_to_lab_array(rgb).tolist()
+    return [
+        (thread_id, rows.brand, code, name, r, g, b, l_star, a_star, b_star, f"#{r:02x}{g:02x}{b:02x}")
+        for thread_id, code, name, (r, g, b), (l_star, a_star, b_star)
+        in zip(rows.thread_ids, rows.color_codes, rows.color_names, rows.rgb, lab)
+    ]
+
+def connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    """Połączenie do zapisu: WAL, schemat utworzony, transakcje sterowane ręcznie"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def import_catalog(conn: sqlite3.Connection,
+                   brand_rows: Dict[str, BrandRows],
+                   force: bool = False) -> ImportReport:
+    """
+    Upsert marek w jednej transakcji
+
+    Marka z niezmienioną sumą kontrolną jest pomijana (chyba że force). Zmienione marki
+    są nadpisywane przez INSERT ... ON CONFLICT, a nici, których nie ma już w CSV, usuwane.
+    Przy jakiejkolwiek zmianie rośnie PRAGMA user_version, po którym snapshot
+    katalogu w API wie, że ma się przeładować.
+    """
+    started = time.perf_counter()
+    report = ImportReport()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = dict(conn.execute("SELECT brand, checksum FROM catalog_imports"))
+        for brand, rows in brand_rows.items():
+            checksum = rows.checksum
+            if not force and stored.get(brand) == checksum:
+                report.unchanged.append(brand)
+                continue
+
+            # Najpierw usunięcia - zwolniony (brand, color_code) może wrócić pod nowym thread_id
+            existing = {row[0] for row in conn.execute("SELECT thread_id FROM threads WHERE brand = ?", (brand,))}
+            removed = existing - set(rows.thread_ids)
+            conn.executemany("DELETE FROM threads WHERE thread_id = ?", [(thread_id,) for thread_id in removed])
+
+            conn.executemany("""
+                INSERT INTO threads
+                (thread_id, brand, color_code, color_name, r, g, b,
+                 l_star, a_star, b_star, hex_color)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(thread_id) DO UPDATE SET
+                    brand = excluded.brand, color_code = excluded.color_code,
+                    color_name = excluded.color_name, r = excluded.r, g = excluded.g, b = excluded.b,
+                    l_star = excluded.l_star, a_star = excluded.a_star, b_star = excluded.b_star,
+                    hex_color = excluded.hex_color
+            """, _thread_records(rows))
+
+            conn.execute("""
+                INSERT INTO catalog_imports (brand, checksum, thread_count, imported_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(brand) DO UPDATE SET
+                    checksum = excluded.checksum, thread_count = excluded.thread_count,
+                    imported_at = excluded.imported_at
+            """, (brand, checksum, len(rows), time.time()))
+            report.imported[brand] = len(rows)
+            if removed:
+                report.removed[brand] = len(removed)
+
+        if report.changed:
+            user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute(f"PRAGMA user_version = {user_version + 1}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    report.seconds = time.perf_counter() - started
+    return report
+
+def build_artifacts(db_path: Path = DB_PATH,
+                    lut_metrics: Sequence[str] = ("cie76",),
+                    lut_dir: Optional[Path] = None) -> Dict[str, float]:
+    """
+    Buduje artefakty pochodne aktualnego katalogu: indeksy KD-tree i tabelę odpowiedników
+    (przy ładowaniu snapshotu) oraz tablice LUT dla każdej marki i metryki
+
+    Returns:
+        Czas (s) poszczególnych kroków
+    """
+    timings = {}
+    started = time.perf_counter()
+    catalog = load_catalog(Path(db_path))
+    timings["catalog"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for view in catalog.brands.values():
+        for metric in lut_metrics:
+            get_brand_lut(view.brand, view.index, lut_dir=lut_dir, metric=metric)
+    timings["lut"] = time.perf_counter() - started
+    return timings
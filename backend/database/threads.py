@@ -1,19 +1,134 @@
 """
 Database access layer for threads
 """
+import asyncio
+import json
+import mmap
+import os
+import queue
 import sqlite3
-from typing import List, Optional, Dict
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Iterable, Iterator, Sequence, Tuple
 from pathlib import Path
 
+import numpy as np
+
 # Path to database
 DB_PATH = Path(__file__).parent.parent.parent / "data" / "threads.db"
 
+# Kolumnowa kopia katalogu obok bazy (mapowana w pamięci, współdzielona przez procesy)
+COLUMNS_PATH = DB_PATH.with_suffix(".columns")
+COLUMNS_MAGIC = b"MULCOL01"
+COLUMNS_ALIGN = 64
+STRING_COLUMNS = ("thread_id", "brand", "color_code", "color_name", "hex_color")
+
+# Pula połączeń tylko do odczytu
+POOL_SIZE = int(os.getenv("THREAD_DB_POOL_SIZE", "4"))
+READ_MMAP_SIZE = 64 * 1024 * 1024
+READ_CACHE_KIB = 16 * 1024
+
+THREAD_COLUMNS_SQL = """
+    SELECT thread_id, brand, color_code, color_name,
+           r, g, b, l_star, a_star, b_star, hex_color
+    FROM threads
+"""
+
 def get_db_connection():
     """Get SQLite database connection"""
     conn = sqlite3.connect(str(DB_PATH))
     conn.row_factory = sqlite3.Row  # Access columns by name
     return conn
 
+class ConnectionPool:
+    """
+    Pula połączeń SQLite tylko do odczytu (mode=ro), bezpieczna dla wątków
+
+    Połączenia są tworzone leniwie (najwyżej `size`) i wielokrotnie używane, więc
+    cache stron, mmap i skompilowane zapytania (cache instrukcji sqlite3) przeżywają
+    pojedyncze wywołanie. Przy wyczerpanej puli wywołanie czeka na zwolnienie połączenia.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH, size: int = POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=64)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {READ_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{READ_CACHE_KIB}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Zamyka bezczynne połączenia (pula może być dalej używana)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Wspólna pula procesu dla DB_PATH"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
+def close_pool() -> None:
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+
+def _thread_dict(row: sqlite3.Row) -> Dict:
+    return {
+        "thread_id": row["thread_id"],
+        "brand": row["brand"],
+        "color_code": row["color_code"],
+        "color_name": row["color_name"],
+        "rgb": (row["r"], row["g"], row["b"]),
+        "lab": (row["l_star"], row["a_star"], row["b_star"]),
+        "hex_color": row["hex_color"]
+    }
+
 def get_all_threads(brand: Optional[str] = None) -> List[Dict]:
     """
     Pobiera wszystkie nici z bazy danych
@@ -24,79 +139,214 @@ def get_all_threads(brand: Optional[str] = None) -> List[Dict]:
     Returns:
         Lista słowników z danymi nici
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if brand:
-        cursor.execute("""
-            SELECT thread_id, brand, color_code, color_name, 
-                   r, g, b, l_star, a_star, b_star, hex_color
-            FROM threads
-            WHERE brand = ?
-            ORDER BY color_code
-        """, (brand,))
-    else:
-        cursor.execute("""
-            SELECT thread_id, brand, color_code, color_name,
-                   r, g, b, l_star, a_star, b_star, hex_color
-            FROM threads
-            ORDER BY brand, color_code
-        """)
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # Convert to list of dicts
-    threads = []
-    for row in rows:
-        threads.append({
-            "thread_id": row["thread_id"],
-            "brand": row["brand"],
-            "color_code": row["color_code"],
-            "color_name": row["color_name"],
-            "rgb": (row["r"], row["g"], row["b"]),
-            "lab": (row["l_star"], row["a_star"], row["b_star"]),
-            "hex_color": row["hex_color"]
-        })
-    
-    return threads
+    with get_pool().connection() as conn:
+        if brand:
+            rows = conn.execute(THREAD_COLUMNS_SQL + " WHERE brand = ? ORDER BY color_code", (brand,)).fetchall()
+        else:
+            rows = conn.execute(THREAD_COLUMNS_SQL + " ORDER BY brand, color_code").fetchall()
+    return [_thread_dict(row) for row in rows]
 
 def get_thread_by_id(thread_id: str) -> Optional[Dict]:
     """Pobiera nić po ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT thread_id, brand, color_code, color_name,
-               r, g, b, l_star, a_star, b_star, hex_color
-        FROM threads
-        WHERE thread_id = ?
-    """, (thread_id,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row:
-        return None
-    
-    return {
-        "thread_id": row["thread_id"],
-        "brand": row["brand"],
-        "color_code": row["color_code"],
-        "color_name": row["color_name"],
-        "rgb": (row["r"], row["g"], row["b"]),
-        "lab": (row["l_star"], row["a_star"], row["b_star"]),
-        "hex_color": row["hex_color"]
-    }
+    with get_pool().connection() as conn:
+        row = conn.execute(THREAD_COLUMNS_SQL + " WHERE thread_id = ?", (thread_id,)).fetchone()
+    return _thread_dict(row) if row else None
+
+def get_threads_by_ids(thread_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Pobiera wiele nici jednym zapytaniem
+
+    Identyfikatory idą jako jedna tablica JSON (json_each), więc tekst zapytania jest
+    stały niezależnie od liczby ID i sqlite3 kompiluje go tylko raz na połączenie.
+
+    Returns:
+        Słownik thread_id → dane nici (nieznane ID są pomijane)
+    """
+    ids = list(dict.fromkeys(thread_ids))
+    if not ids:
+        return {}
+    with get_pool().connection() as conn:
+        rows = conn.execute(
+            THREAD_COLUMNS_SQL + " WHERE thread_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(ids),)
+        ).fetchall()
+    return {row["thread_id"]: _thread_dict(row) for row in rows}
 
 def get_thread_count() -> int:
     """Zwraca liczbę nici w bazie"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM threads")
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    with get_pool().connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+# Wersje asynchroniczne - zapytanie w wątku, pętla zdarzeń nie jest blokowana
+async def get_all_threads_async(brand: Optional[str] = None) -> List[Dict]:
+    return await asyncio.to_thread(get_all_threads, brand)
+
+async def get_thread_by_id_async(thread_id: str) -> Optional[Dict]:
+    return await asyncio.to_thread(get_thread_by_id, thread_id)
+
+async def get_threads_by_ids_async(thread_ids: Iterable[str]) -> Dict[str, Dict]:
+    return await asyncio.to_thread(get_threads_by_ids, list(thread_ids))
+
+async def get_thread_count_async() -> int:
+    return await asyncio.to_thread(get_thread_count)
+
+class StringColumn(Sequence):
+    """
+    Kolumna napisów w pliku kolumnowym: przesunięcia (N+1) + bajty UTF-8, bez kopiowania
+
+    Napis jest dekodowany przy odczycie; wycinek z krokiem 1 to znów StringColumn
+    (widok na te same tablice).
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets  # bezwzględne przesunięcia w `data`
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return StringColumn(self.offsets[start:max(start, stop) + 1], self.data)
+            return [self[j] for j in range(start, stop, step)]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string column index out of range")
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and self.tolist() == list(other)
+
+    __hash__ = None
+
+    def tolist(self) -> List[str]:
+        """Wszystkie napisy - jedno kopiowanie bufora zamiast N odczytów"""
+        bounds = self.offsets.tolist()
+        if len(bounds) < 2:
+            return []
+        base = bounds[0]
+        blob = self.data[base:bounds[-1]].tobytes()
+        return [blob[a - base:b - base].decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+
+class ThreadColumns:
+    """
+    Katalog nici w formacie kolumnowym (struct-of-arrays), otwarty przez mmap
+
+    Tablice są widokami na zmapowany plik - nic nie jest parsowane ani kopiowane,
+    a strony pliku w page cache systemu są wspólne dla wszystkich workerów.
+    Wiersze są posortowane po (brand, color_code), więc marka to ciągły wycinek.
+    """
+
+    def __init__(self, header: Dict, arrays: Dict[str, np.ndarray]):
+        self.source: Tuple[int, int] = tuple(header["source"])
+        self.fingerprint: Optional[str] = header.get("fingerprint")
+        self.brands: Dict[str, Tuple[int, int]] = {name: (start, stop) for name, start, stop in header["brands"]}
+        self.rgb = arrays["rgb"]  # (N, 3) uint8
+        self.lab = arrays["lab"]  # (N, 3) float64
+        self.strings = {name: StringColumn(arrays[f"{name}_offsets"], arrays[f"{name}_data"])
+                        for name in STRING_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self.rgb)
+
+    def brand_slice(self, brand: str) -> Optional[slice]:
+        """Wycinek wierszy marki (do indeksowania rgb/lab bez kopii) albo None"""
+        bounds = self.brands.get(brand)
+        return slice(*bounds) if bounds is not None else None
+
+def write_thread_columns(path: Path,
+                         source: Tuple[int, int],
+                         strings: Dict[str, Sequence[str]],
+                         rgb: np.ndarray,
+                         lab: np.ndarray,
+                         fingerprint: Optional[str] = None) -> None:
+    """
+    Zapisuje katalog w formacie kolumnowym (atomowo)
+
+    Układ pliku: magic, długość nagłówka (uint32), nagłówek JSON z przesunięciami
+    tablic, potem tablice wyrównane do COLUMNS_ALIGN bajtów.
+
+    Args:
+        source: (mtime_ns, user_version) bazy, z której powstał plik
+        strings: Kolumny STRING_COLUMNS posortowane po (brand, color_code)
+        fingerprint: Odcisk katalogu (czytelnik nie musi dekodować thread_id, żeby go policzyć)
+    """
+    arrays = {
+        "rgb": np.ascontiguousarray(rgb, dtype=np.uint8).reshape(-1, 3),
+        "lab": np.ascontiguousarray(lab, dtype=np.float64).reshape(-1, 3),
+    }
+    for name in STRING_COLUMNS:
+        encoded = [value.encode("utf-8") for value in strings[name]]
+        arrays[f"{name}_offsets"] = np.concatenate(([0], np.cumsum([len(e) for e in encoded], dtype=np.int64)))
+        arrays[f"{name}_data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    brands = []
+    names = list(strings["brand"])
+    start = 0
+    for i in range(1, len(names) + 1):
+        if i == len(names) or names[i] != names[start]:
+            brands.append([names[start], start, i])
+            start = i
+
+    def aligned(n: int) -> int:
+        return -(-n // COLUMNS_ALIGN) * COLUMNS_ALIGN
+
+    # Przesunięcia liczone względem początku sekcji danych, więc nie zależą od długości nagłówka
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset = aligned(offset + array.nbytes)
+    header = json.dumps({"source": list(source), "fingerprint": fingerprint,
+                         "brands": brands, "arrays": layout}).encode("utf-8")
+    data_start = aligned(len(COLUMNS_MAGIC) + 4 + len(header))
+
+    # Własny plik tymczasowy każdego procesu - workery zapisujące plik naraz nie nadpisują
+    # sobie nawzajem danych, a os.replace publikuje tylko kompletny plik
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(COLUMNS_MAGIC + struct.pack("<I", len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.chmod(tmp_name, 0o644)  # mkstemp tworzy plik 0600
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+def open_thread_columns(path: Path = COLUMNS_PATH) -> ThreadColumns:
+    """
+    Otwiera plik kolumnowy (mmap tylko do odczytu)
+
+    Raises:
+        ValueError: plik nie jest w formacie kolumnowym
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Empty columns file: {path}")
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(COLUMNS_MAGIC)] != COLUMNS_MAGIC:
+        raise ValueError(f"Not a thread columns file: {path}")
+    (header_len,) = struct.unpack_from("<I", buffer, len(COLUMNS_MAGIC))
+    header_start = len(COLUMNS_MAGIC) + 4
+    header = json.loads(buffer[header_start:header_start + header_len])
+    data_start = -(-(header_start + header_len) // COLUMNS_ALIGN) * COLUMNS_ALIGN
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                     offset=data_start + spec["offset"]).reshape(spec["shape"])
+    return ThreadColumns(header, arrays)
 
 # Test module
 if __name__ == "__main__":
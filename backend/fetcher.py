@@ -0,0 +1,182 @@
+"""
+Async download of source images
+One pooled httpx.AsyncClient (HTTP/2 when the h2 package is installed) is shared by all
+requests. Bodies are streamed with a byte limit and sniffed from their first bytes before
+anything is decoded. Responses with an ETag are kept in a blob cache and revalidated with
+If-None-Match, so re-converting the same Firebase Storage object costs a 304.
+"""
+import hashlib
+import os
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+
+from cache import TieredCache, create_cache
+
+# Defaults, overridable with MAX_IMAGE_SIZE_MB / IMAGE_FETCH_TIMEOUT / IMAGE_FETCH_MAX_CONNECTIONS
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT_SECONDS = 30.0
+MAX_CONNECTIONS = 20
+
+# Formats the conversion pipeline can decode (Pillow), by leading bytes
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+SNIFF_BYTES = 12
+
+class FetchError(Exception):
+    """Source image could not be downloaded; status_code is the HTTP status for the API client"""
+    status_code = 400
+
+class ImageTooLargeError(FetchError):
+    status_code = 413
+
+class UnsupportedImageError(FetchError):
+    status_code = 415
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """MIME type from the leading bytes, None when the format is not supported"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    return None
+
+async def read_image_stream(chunks: AsyncIterator[bytes], max_bytes: int = MAX_IMAGE_BYTES) -> bytearray:
+    """
+    Collects an image body chunk by chunk into a single buffer
+
+    The format is checked as soon as the first bytes arrive and the size after every chunk,
+    so a wrong or oversized file is rejected without reading it to the end. The buffer is
+    returned as is (no bytes() copy) - hashing, pickling and load_rgb all take a bytearray.
+    """
+    body = bytearray()
+    sniffed = False
+    async for chunk in chunks:
+        body += chunk
+        if len(body) > max_bytes:
+            raise ImageTooLargeError(f"Image exceeds {max_bytes} bytes")
+        if not sniffed and len(body) >= SNIFF_BYTES:
+            _check_type(body)
+            sniffed = True
+    if not sniffed:
+        _check_type(body)
+    return body
+
+def _check_type(head: bytes) -> None:
+    if sniff_image_type(bytes(head[:SNIFF_BYTES])) is None:
+        raise UnsupportedImageError("File is not a supported image (JPEG, PNG, GIF, WebP, BMP, TIFF)")
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class ImageFetcher:
+    """
+    Streams images over a shared connection pool
+
+    Blob cache entries are keyed by URL and hold b"<etag>\\n" + body.
+    """
+
+    def __init__(self,
+                 cache: Optional[TieredCache] = None,
+                 max_bytes: int = MAX_IMAGE_BYTES,
+                 timeout: float = FETCH_TIMEOUT_SECONDS,
+                 max_connections: int = MAX_CONNECTIONS,
+                 http2: bool = True,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.http2 = http2 and transport is None and _http2_available()
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                follow_redirects=True,
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _cached(self, key: str) -> Tuple[Optional[str], Optional[bytes]]:
+        entry = self.cache.get(key) if self.cache is not None else None
+        if entry is None:
+            return None, None
+        etag, _, body = entry.partition(b"\n")
+        return etag.decode("latin-1"), body
+
+    async def fetch(self, url: str) -> bytes:
+        """
+        Downloads the image body
+
+        Raises:
+            ImageTooLargeError: body (declared or streamed) exceeds max_bytes
+            UnsupportedImageError: leading bytes do not match a supported format
+            FetchError: network error or non-2xx status
+        """
+        key = self._cache_key(url)
+        etag, cached_body = self._cached(key)
+        headers = {"If-None-Match": etag} if etag else {}
+
+        try:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached_body is not None:
+                    return cached_body
+                response.raise_for_status()
+                body = await self._read_body(response)
+                new_etag = response.headers.get("etag")
+        except httpx.HTTPError as e:
+            raise FetchError(str(e)) from e
+
+        if self.cache is not None and new_etag and "\n" not in new_etag:
+            self.cache.set(key, new_etag.encode("latin-1") + b"\n" + body)
+        return body
+
+    async def _read_body(self, response: httpx.Response) -> bytes:
+        declared = response.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            raise ImageTooLargeError(f"Image is {declared} bytes, limit is {self.max_bytes}")
+        return await read_image_stream(response.aiter_bytes(), self.max_bytes)
+
+def create_fetcher() -> ImageFetcher:
+    """
+    Fetcher configured from the environment; the blob cache is the "image" namespace
+    (IMAGE_CACHE_MEMORY_MB, IMAGE_CACHE_DISK=1, IMAGE_CACHE_DISK_MB). MAX_IMAGE_SIZE_MB
+    limits both downloads and uploads.
+    """
+    max_image_mb = float(os.getenv("MAX_IMAGE_SIZE_MB", str(MAX_IMAGE_BYTES / (1024 * 1024))))
+    return ImageFetcher(
+        cache=create_cache("image"),
+        max_bytes=int(max_image_mb * 1024 * 1024),
+        timeout=float(os.getenv("IMAGE_FETCH_TIMEOUT", str(FETCH_TIMEOUT_SECONDS))),
+        max_connections=int(os.getenv("IMAGE_FETCH_MAX_CONNECTIONS", str(MAX_CONNECTIONS))),
+        http2=os.getenv("IMAGE_FETCH_HTTP2", "1").lower() in ("1", "true", "yes"),
+    )
@@ -0,0 +1,160 @@
+"""
+Compact encodings of the pattern grid
+The grid (palette index per stitch) travels as a row-major uint8/uint16 buffer,
+optionally RLE- or zlib-compressed, instead of a nested JSON list of ints.
+
+Encodings:
+    json - nested list (original format, default for API responses)
+    raw  - little-endian buffer, no compression
+    rle  - runs of (count: uint16 LE, value: uint8/uint16 LE) over the row-major buffer
+    zlib - zlib stream of the raw buffer
+
+Packed grid_data: {"type", "width", "height", "encoding", "dtype", "data": base64}.
+Binary frame (application/octet-stream): b"MGRD", uint32 LE header length,
+UTF-8 JSON header (response fields, grid_data without "data"), grid payload.
+"""
+import base64
+import json
+import struct
+import zlib
+from typing import Dict, Tuple
+
+import numpy as np
+
+ENCODINGS = ("json", "raw", "rle", "zlib")
+
+# Encoding of grids kept in the result cache and the job store
+STORAGE_ENCODING = "zlib"
+
+# Encoding used for binary frames when the request asked for "json"
+DEFAULT_BINARY_ENCODING = "rle"
+
+FRAME_MAGIC = b"MGRD"
+FRAME_MEDIA_TYPE = "application/octet-stream"
+
+_MAX_RUN = 0xFFFF
+_DTYPES = {"uint8": np.dtype("<u1"), "uint16": np.dtype("<u2")}
+
+def grid_dtype(max_value: int) -> str:
+    """Smallest supported dtype able to hold palette indices up to max_value"""
+    if max_value < 1 << 8:
+        return "uint8"
+    if max_value < 1 << 16:
+        return "uint16"
+    raise ValueError(f"Palette index out of range: {max_value}")
+
+def _rle_dtype(dtype: str) -> np.dtype:
+    return np.dtype([("count", "<u2"), ("value", _DTYPES[dtype])])
+
+def _rle_encode(flat: np.ndarray) -> bytes:
+    if flat.size == 0:
+        return b""
+    starts = np.concatenate([[0], np.flatnonzero(flat[1:] != flat[:-1]) + 1])
+    lengths = np.diff(np.append(starts, flat.size))
+
+    # Runs longer than uint16 are split into several records
+    pieces = (lengths - 1) // _MAX_RUN + 1
+    run_of_piece = np.repeat(np.arange(len(starts)), pieces)
+    piece_offset = np.arange(len(run_of_piece)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+
+    records = np.empty(len(run_of_piece), dtype=_rle_dtype(flat.dtype.name))
+    records["count"] = np.minimum(lengths[run_of_piece] - piece_offset * _MAX_RUN, _MAX_RUN)
+    records["value"] = flat[starts][run_of_piece]
+    return records.tobytes()
+
+def _rle_decode(payload: bytes, dtype: str) -> np.ndarray:
+    records = np.frombuffer(payload, dtype=_rle_dtype(dtype))
+    return np.repeat(records["value"], records["count"].astype(np.int64))
+
+def encode_grid(grid: np.ndarray, encoding: str) -> Tuple[bytes, str]:
+    """
+    Encodes a (height, width) grid into a byte payload
+
+    Returns:
+        (payload, dtype name)
+    """
+    grid = np.asarray(grid)
+    dtype = grid_dtype(int(grid.max()) if grid.size else 0)
+    flat = np.ascontiguousarray(grid, dtype=_DTYPES[dtype]).ravel()
+
+    if encoding == "raw":
+        return flat.tobytes(), dtype
+    if encoding == "rle":
+        return _rle_encode(flat), dtype
+    if encoding == "zlib":
+        return zlib.compress(flat.tobytes(), 6), dtype
+    raise ValueError(f"Unknown grid encoding: {encoding}")
+
+def decode_grid(payload: bytes, encoding: str, dtype: str, width: int, height: int) -> np.ndarray:
+    """Inverse of encode_grid - returns a (height, width) array"""
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unknown grid dtype: {dtype}")
+    if encoding == "raw":
+        flat = np.frombuffer(payload, dtype=_DTYPES[dtype])
+    elif encoding == "rle":
+        flat = _rle_decode(payload, dtype)
+    elif encoding == "zlib":
+        flat = np.frombuffer(zlib.decompress(payload), dtype=_DTYPES[dtype])
+    else:
+        raise ValueError(f"Unknown grid encoding: {encoding}")
+    if flat.size != width * height:
+        raise ValueError(f"Grid payload has {flat.size} cells, expected {width}x{height}")
+    return flat.reshape(height, width)
+
+def unpack_grid(grid_data: Dict) -> np.ndarray:
+    """Grid array from grid_data in any encoding (nested list, ndarray or packed)"""
+    encoding = grid_data.get("encoding", "json")
+    if encoding == "json":
+        return np.asarray(grid_data["grid"])
+    return decode_grid(base64.b64decode(grid_data["data"]), encoding, grid_data["dtype"],
+                       grid_data["width"], grid_data["height"])
+
+def pack_grid_data(grid_data: Dict, encoding: str) -> Dict:
+    """
+    Returns grid_data in the requested encoding
+
+    Metadata fields (type, width, height) are kept; the grid is either a nested
+    list ("json") or a base64 payload with its encoding and dtype.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown grid encoding: {encoding}")
+    if grid_data.get("encoding", "json") == encoding and not isinstance(grid_data.get("grid"), np.ndarray):
+        return grid_data
+
+    grid = unpack_grid(grid_data)
+    packed = {k: v for k, v in grid_data.items() if k not in ("grid", "encoding", "dtype", "data")}
+    if encoding == "json":
+        packed["grid"] = grid.tolist()
+        return packed
+
+    payload, dtype = encode_grid(grid, encoding)
+    packed.update(encoding=encoding, dtype=dtype, data=base64.b64encode(payload).decode("ascii"))
+    return packed
+
+def encode_frame(fields: Dict, encoding: str) -> bytes:
+    """
+    Builds a binary frame from response fields (grid_data in any encoding)
+
+    The header carries every field except the grid payload itself.
+    """
+    if encoding == "json":
+        raise ValueError("Binary frames need a binary grid encoding")
+    grid = unpack_grid(fields["grid_data"])
+    payload, dtype = encode_grid(grid, encoding)
+
+    grid_meta = {k: v for k, v in fields["grid_data"].items() if k not in ("grid", "data")}
+    grid_meta.update(encoding=encoding, dtype=dtype, byte_length=len(payload))
+    header = json.dumps({**fields, "grid_data": grid_meta}, separators=(",", ":")).encode("utf-8")
+    return FRAME_MAGIC + struct.pack("<I", len(header)) + header + payload
+
+def decode_frame(frame: bytes) -> Tuple[Dict, np.ndarray]:
+    """Inverse of encode_frame - returns (header fields, grid array)"""
+    if frame[:4] != FRAME_MAGIC:
+        raise ValueError("Not a pattern grid frame")
+    (header_length,) = struct.unpack_from("<I", frame, 4)
+    header = json.loads(frame[8:8 + header_length].decode("utf-8"))
+    grid_meta = header["grid_data"]
+    payload = frame[8 + header_length:8 + header_length + grid_meta["byte_length"]]
+    grid = decode_grid(payload, grid_meta["encoding"], grid_meta["dtype"],
+                       grid_meta["width"], grid_meta["height"])
+    return header, grid
@@ -4,41 +4,72 @@ Konwersja obrazów na wzory hafciarskie
 """
 import cv2
 import numpy as np
-from PIL import Image
 from typing import Tuple, List, Optional
-from sklearn.cluster import KMeans
+
+from grid_codec import grid_dtype
+
+from .dithering import dither
+from .loader import load_rgb, open_image
+from .quantizers import get_quantizer
+from .tiles import tiled_canny, tiled_clahe
+
+# Górny limit dłuższego boku obrazu roboczego - pamięć nie rośnie z megapikselami źródła
+MAX_WORKING_SIZE = 2048
 
 class ImageProcessor:
     """Główny procesor obrazów"""
     
-    def __init__(self, image_path: str):
-        self.image = cv2.imread(image_path)
-        if self.image is None:
+    def __init__(self, image_path: str, max_size: Optional[int] = None):
+        """
+        Args:
+            image_path: Ścieżka do obrazu (czytany jest tylko nagłówek)
+            max_size: Limit dłuższego boku obrazu roboczego; zawsze najwyżej
+                      MAX_WORKING_SIZE (None = MAX_WORKING_SIZE), więc obraz roboczy,
+                      kontrast i krawędzie mają pamięć ograniczoną niezależnie od źródła
+        """
+        self.image_path = image_path
+        self.max_size = min(max_size, MAX_WORKING_SIZE) if max_size else MAX_WORKING_SIZE
+        try:
+            with open_image(image_path) as img:
+                self.size = img.size  # (szerokość, wysokość) źródła
+        except OSError:
             raise ValueError(f"Cannot load image: {image_path}")
-        self.image_rgb = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+        self._image_rgb: Optional[np.ndarray] = None
+    
+    @property
+    def image_rgb(self) -> np.ndarray:
+        """Obraz roboczy RGB (dłuższy bok <= max_size) - jedna kopia, dekodowana przy pierwszym użyciu"""
+        if self._image_rgb is None:
+            self._image_rgb = load_rgb(self.image_path, max_size=self.max_size)
+        return self._image_rgb
+    
+    @property
+    def image(self) -> np.ndarray:
+        """Obraz BGR (konwencja OpenCV) - liczony na żądanie, nie przechowywany"""
+        return cv2.cvtColor(self.image_rgb, cv2.COLOR_RGB2BGR)
     
     def preprocess(self, 
                    target_width: Optional[int] = None,
                    enhance_contrast: bool = False) -> np.ndarray:
         """
         Pre-processing obrazu przed konwersją
-        """
-        img = self.image_rgb.copy()
         
+        Z target_width obraz jest dekodowany od razu w docelowym rozmiarze
+        (pełna rozdzielczość nie trafia do pamięci, jeśli nie była już wczytana).
+        """
         # Resize jeśli określono szerokość
-        if target_width:
-            height = int(img.shape[0] * target_width / img.shape[1])
-            img = cv2.resize(img, (target_width, height), 
+        if target_width and self._image_rgb is None:
+            img = load_rgb(self.image_path, target_width=target_width)
+        elif target_width:
+            height = int(self.image_rgb.shape[0] * target_width / self.image_rgb.shape[1])
+            img = cv2.resize(self.image_rgb, (target_width, height), 
                            interpolation=cv2.INTER_AREA)
+        else:
+            img = self.image_rgb.copy()
         
-        # Poprawa kontrastu (CLAHE)
+        # Poprawa kontrastu (CLAHE na kanale L, w pasach)
         if enhance_contrast:
-            lab = cv2.cvtColor(img, cv2.COLOR_RGB2LAB)
-            l, a, b = cv2.split(lab)
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-            l = clahe.apply(l)
-            img = cv2.merge([l, a, b])
-            img = cv2.cvtColor(img, cv2.COLOR_LAB2RGB)
+            img = tiled_clahe(img, clip_limit=3.0, grid=(8, 8))
         
         return img
     
@@ -66,116 +97,91 @@ class ImageProcessor:
         height, width = img.shape[:2]
         return img
     
-    def reduce_colors(self, 
-                      img: np.ndarray,
-                      max_colors: int = 50,
-                      enable_dithering: bool = False) -> Tuple[np.ndarray, List]:
+    def quantize(self,
+                 img: np.ndarray,
+                 max_colors: int = 50,
+                 enable_dithering: bool = False,
+                 quantizer: str = "kmeans") -> Tuple[np.ndarray, np.ndarray]:
         """
-        Redukcja liczby kolorów przy użyciu K-means clustering
+        Redukcja kolorów z zachowaniem etykiet (bez odtwarzania obrazu)
+        
+        Args:
+            quantizer: kmeans, minibatch, median_cut, octree, wu lub wu_kmeans
         
         Returns:
-            (reduced_image, color_palette)
+            (labels, palette) - labels (H, W) w najmniejszym typie (uint8/uint16)
+            indeksują palette (K, 3) uint8
         """
-        # Reshape do listy pikseli
-        pixels = img.reshape(-1, 3)
-        
-        # K-means clustering
-        kmeans = KMeans(n_clusters=max_colors, 
-                       random_state=42,
-                       n_init=10)
-        kmeans.fit(pixels)
+        result = get_quantizer(quantizer)(img, max_colors)
         
         # Paleta kolorów (centroids)
-        palette = kmeans.cluster_centers_.astype(np.uint8)
-        
-        # Przypisanie każdego piksela do najbliższego koloru
-        labels = kmeans.labels_
-        reduced_pixels = palette[labels]
-        reduced_img = reduced_pixels.reshape(img.shape)
+        palette = np.clip(np.rint(result.palette), 0, 255).astype(np.uint8)
+        labels = result.labels
         
         # Opcjonalny dithering (Floyd-Steinberg)
         if enable_dithering:
-            reduced_img = self._apply_floyd_steinberg(img, palette)
+            labels = dither(img, palette, "floyd_steinberg")
         
-        return reduced_img, palette.tolist()
+        return labels.astype(grid_dtype(len(palette) - 1)), palette
+    
+    def reduce_colors(self, 
+                      img: np.ndarray,
+                      max_colors: int = 50,
+                      enable_dithering: bool = False,
+                      quantizer: str = "kmeans") -> Tuple[np.ndarray, List]:
+        """
+        Redukcja liczby kolorów wybranym kwantyzatorem (domyślnie K-means)
+        
+        Returns:
+            (reduced_image, color_palette)
+        """
+        labels, palette = self.quantize(img, max_colors, enable_dithering, quantizer)
+        
+        # Przypisanie każdego piksela do koloru palety
+        return palette[labels], palette.tolist()
     
     def _apply_floyd_steinberg(self, 
                                img: np.ndarray, 
                                palette: np.ndarray) -> np.ndarray:
         """
         Floyd-Steinberg dithering dla lepszych przejść tonalnych
+        (zwektoryzowany silnik z image_processor.dithering, dopasowanie w Lab)
         """
-        result = img.copy().astype(np.float32)
-        height, width = img.shape[:2]
-        
-        for y in range(height):
-            for x in range(width):
-                old_pixel = result[y, x]
-                
-                # Znajdź najbliższy kolor z palety
-                distances = np.sum((palette - old_pixel)**2, axis=1)
-                new_pixel = palette[np.argmin(distances)]
-                result[y, x] = new_pixel
-                
-                # Oblicz błąd kwantyzacji
-                quant_error = old_pixel - new_pixel
-                
-                # Rozproś błąd na sąsiednie piksele
-                if x + 1 < width:
-                    result[y, x + 1] += quant_error * 7/16
-                if y + 1 < height:
-                    if x > 0:
-                        result[y + 1, x - 1] += quant_error * 3/16
-                    result[y + 1, x] += quant_error * 5/16
-                    if x + 1 < width:
-                        result[y + 1, x + 1] += quant_error * 1/16
-        
-        return np.clip(result, 0, 255).astype(np.uint8)
+        labels = dither(img, palette, "floyd_steinberg")
+        return np.asarray(palette, dtype=np.uint8)[labels]
     
     def detect_edges_for_outline(self, 
                                   low_threshold: int = 50,
                                   high_threshold: int = 150) -> np.ndarray:
         """
         Wykrywanie krawędzi dla haftu konturowego (Canny edge detection)
+        na obrazie roboczym (nie w pełnej rozdzielczości źródła)
         """
-        gray = cv2.cvtColor(self.image_rgb, cv2.COLOR_RGB2GRAY)
-        
-        # Gaussian blur dla redukcji szumu
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        
-        # Canny edge detection
-        edges = cv2.Canny(blurred, low_threshold, high_threshold)
-        
-        return edges
+        # Gaussian blur + Canny w blokach (bufory pośrednie mają rozmiar bloku)
+        return tiled_canny(self.image_rgb, low_threshold, high_threshold)
     
     def generate_cross_stitch_pattern(self,
                                       aida_count: int = 14,
                                       max_colors: int = 50,
                                       target_width_cm: float = 20.0,
-                                      enable_dithering: bool = False) -> dict:
+                                      enable_dithering: bool = False,
+                                      quantizer: str = "kmeans") -> dict:
         """
         Kompletny pipeline generowania wzoru krzyżykowego
         
         Returns:
-            Dict z grid_data, palette, dimensions
+            Dict z grid (ndarray uint8/uint16, H × W), palette, dimensions
         """
         # 1. Pixelizacja
         pixelized = self.pixelize_for_cross_stitch(aida_count, target_width_cm)
         
-        # 2. Redukcja kolorów
-        reduced, palette = self.reduce_colors(pixelized, max_colors, enable_dithering)
-        
-        # 3. Konwersja do grid data (macierz indeksów kolorów)
-        height, width = reduced.shape[:2]
-        grid = np.zeros((height, width), dtype=np.uint8)
-        
-        for idx, color in enumerate(palette):
-            mask = np.all(reduced == color, axis=2)
-            grid[mask] = idx
+        # 2. Redukcja kolorów - etykiety są od razu siatką wzoru (macierz indeksów kolorów)
+        grid, palette = self.quantize(pixelized, max_colors, enable_dithering, quantizer)
+        height, width = grid.shape
         
         return {
-            "grid": grid.tolist(),
-            "palette": palette,
+            "grid": grid,
+            "palette": palette.tolist(),
             "dimensions": {
                 "width_stitches": width,
                 "height_stitches": height,
@@ -0,0 +1,195 @@
+"""
+Dithering obrazu do palety kolorów
+Dyfuzja błędu (Floyd-Steinberg, Atkinson, Jarvis-Judice-Ninke) przetwarzana frontami
+falowymi zamiast piksel po pikselu oraz w pełni zwektoryzowany dithering uporządkowany
+(macierz Bayera, blue noise). Najbliższy kolor palety jest wyszukiwany w przestrzeni Lab
+przez prekomputowaną tablicę lookup (ThreadLUT) z dokładnym doprecyzowaniem komórek granicznych.
+"""
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from color_engine.delta_e import rgb_to_lab_array
+from color_engine.thread_index import ThreadIndex
+from color_engine.thread_lut import ThreadLUT
+
+# Jądra dyfuzji: (dy, dx, waga) oraz skos frontu falowego.
+# Piksel (y, x) jest przetwarzany w kroku t = x + skew * y - skos musi być na tyle duży,
+# żeby wszystkie piksele oddające mu błąd miały mniejsze t.
+DIFFUSION_KERNELS: Dict[str, Tuple[Tuple[Tuple[int, int, float], ...], int]] = {
+    "floyd_steinberg": (
+        ((0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16)),
+        2,
+    ),
+    "atkinson": (
+        ((0, 1, 1 / 8), (0, 2, 1 / 8), (1, -1, 1 / 8), (1, 0, 1 / 8), (1, 1, 1 / 8), (2, 0, 1 / 8)),
+        2,
+    ),
+    "jarvis_judice_ninke": (
+        tuple(
+            (dy, dx, w / 48)
+            for dy, row in enumerate(((0, 0, 0, 7, 5), (3, 5, 7, 5, 3), (1, 3, 5, 3, 1)))
+            for dx, w in zip(range(-2, 3), row)
+            if w
+        ),
+        3,
+    ),
+}
+
+ORDERED_METHODS = ("bayer", "blue_noise")
+
+METHODS = tuple(DIFFUSION_KERNELS) + ORDERED_METHODS
+
+# Bitów na kanał w tablicy lookup palety (32³ komórek - budowa trwa ułamek sekundy)
+PALETTE_LUT_BITS = 5
+
+class PaletteLookup:
+    """
+    Najbliższy kolor palety (CIE76 w Lab) dla dowolnych wartości RGB
+
+    Komórki tablicy, w których wszystkie narożniki mają ten sam najbliższy kolor,
+    są rozstrzygane jednym odczytem; pozostałe - dokładnym porównaniem z paletą.
+    """
+
+    def __init__(self, palette: np.ndarray, bits: int = PALETTE_LUT_BITS):
+        self.palette = np.asarray(palette, dtype=np.float32).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("Palette is empty")
+        self.palette_lab = rgb_to_lab_array(np.clip(np.rint(self.palette), 0, 255).astype(np.uint8))
+        self.lut = ThreadLUT.build(ThreadIndex(self.palette_lab), bits=bits)
+
+    def nearest(self, rgb: np.ndarray) -> np.ndarray:
+        """Indeksy palety dla pikseli (N, 3); wartości spoza 0-255 są przycinane"""
+        rgb = np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+        if len(rgb) > 4096:
+            # Duże partie (cały obraz) - deduplikacja kolorów w map_image się opłaca
+            return self.lut.map_image(rgb)
+
+        result, border = self.lut.lookup(rgb)
+        if border.any():
+            lab = rgb_to_lab_array(rgb[border])
+            distances = np.sum((lab[:, None, :] - self.palette_lab[None, :, :]) ** 2, axis=-1)
+            result[border] = np.argmin(distances, axis=1)
+        return result
+
+def _wavefronts(height: int, width: int, skew: int):
+    """Piksele pogrupowane w fronty falowe t = x + skew * y (kolejność przetwarzania)"""
+    ys, xs = np.divmod(np.arange(height * width), width)
+    steps = xs + skew * ys
+    order = np.argsort(steps, kind="stable")
+    bounds = np.cumsum(np.bincount(steps, minlength=width + skew * (height - 1)))
+    ys, xs = ys[order], xs[order]
+    start = 0
+    for stop in bounds:
+        yield ys[start:stop], xs[start:stop]
+        start = stop
+
+def error_diffusion(image: np.ndarray, lookup: PaletteLookup, method: str = "floyd_steinberg") -> np.ndarray:
+    """
+    Dithering z dyfuzją błędu
+
+    Wszystkie piksele jednego frontu falowego są od siebie niezależne, więc każdy krok
+    to kilka operacji na wektorach zamiast pętli po pikselach.
+
+    Returns:
+        Tablica (H, W) z indeksami palety
+    """
+    kernel, skew = DIFFUSION_KERNELS[method]
+    height, width = image.shape[:2]
+    pad_x = max(abs(dx) for _, dx, _ in kernel)
+    pad_y = max(dy for dy, _, _ in kernel)
+
+    # Margines przyjmuje błąd wypływający poza obraz (odrzucany, jak w wersji klasycznej)
+    buffer = np.zeros((height + pad_y, width + 2 * pad_x, 3), dtype=np.float32)
+    buffer[:height, pad_x:pad_x + width] = image
+    labels = np.empty((height, width), dtype=np.intp)
+
+    for ys, xs in _wavefronts(height, width, skew):
+        bx = xs + pad_x
+        values = np.clip(buffer[ys, bx], 0, 255)
+        nearest = lookup.nearest(values)
+        labels[ys, xs] = nearest
+        error = values - lookup.palette[nearest]
+        # W obrębie frontu cele dla danego przesunięcia są różne - zwykłe += wystarcza
+        for dy, dx, weight in kernel:
+            buffer[ys + dy, bx + dx] += error * weight
+
+    return labels
+
+def bayer_matrix(order: int = 3) -> np.ndarray:
+    """Progi macierzy Bayera (2^order × 2^order) w przedziale [0, 1)"""
+    matrix = np.zeros((1, 1), dtype=np.int64)
+    for _ in range(order):
+        matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+    return (matrix + 0.5) / matrix.size
+
+@lru_cache(maxsize=4)
+def blue_noise_matrix(size: int = 64, sigma: float = 1.5, seed: int = 0) -> np.ndarray:
+    """
+    Progi blue noise (size × size) w przedziale [0, 1) - metoda void-and-cluster
+
+    Kolejne punkty trafiają w największą "pustkę" (minimum energii gaussowskiej
+    na torusie), a ranga punktu to jego próg. Wynik jest deterministyczny i cache'owany.
+    """
+    offsets = np.minimum(np.arange(size), size - np.arange(size))
+    kernel = np.exp(-(offsets[:, None] ** 2 + offsets[None, :] ** 2) / (2 * sigma ** 2))
+
+    rng = np.random.default_rng(seed)
+    energy = rng.random((size, size)) * 1e-6  # rozstrzyga remisy
+    ranks = np.empty((size, size), dtype=np.float64)
+    taken = np.zeros((size, size), dtype=bool)
+
+    for rank in range(size * size):
+        void = np.argmin(np.where(taken, np.inf, energy))
+        y, x = divmod(int(void), size)
+        taken[y, x] = True
+        ranks[y, x] = rank
+        energy += np.roll(kernel, (y, x), axis=(0, 1))
+
+    return (ranks + 0.5) / ranks.size
+
+def _palette_spread(palette: np.ndarray) -> float:
+    """Typowy odstęp między sąsiednimi kolorami palety (amplituda progów)"""
+    if len(palette) < 2:
+        return 0.0
+    distances = np.sqrt(np.sum((palette[:, None, :] - palette[None, :, :]) ** 2, axis=-1))
+    np.fill_diagonal(distances, np.inf)
+    return float(np.median(distances.min(axis=1))) / np.sqrt(3)
+
+def ordered_dither(image: np.ndarray,
+                   lookup: PaletteLookup,
+                   thresholds: np.ndarray,
+                   strength: float = 1.0) -> np.ndarray:
+    """
+    Dithering uporządkowany: próg z kafelkowanej macierzy przesuwa każdy piksel
+    o ułamek odstępu między kolorami palety, potem jedno mapowanie całego obrazu
+
+    Returns:
+        Tablica (H, W) z indeksami palety
+    """
+    height, width = image.shape[:2]
+    tile_h, tile_w = thresholds.shape
+    tiled = np.tile(thresholds, (-(-height // tile_h), -(-width // tile_w)))[:height, :width]
+    offset = (tiled - 0.5) * _palette_spread(lookup.palette) * strength
+    shifted = image.astype(np.float32) + offset[..., None]
+    return lookup.nearest(shifted.reshape(-1, 3)).reshape(height, width)
+
+def dither(image: np.ndarray, palette: Sequence, method: str = "floyd_steinberg") -> np.ndarray:
+    """
+    Dithering obrazu RGB (H, W, 3) do palety (K, 3)
+
+    Args:
+        method: floyd_steinberg, atkinson, jarvis_judice_ninke, bayer lub blue_noise
+
+    Returns:
+        Tablica (H, W) z indeksami palety
+    """
+    lookup = PaletteLookup(np.asarray(palette))
+    if method in DIFFUSION_KERNELS:
+        return error_diffusion(image, lookup, method)
+    if method == "bayer":
+        return ordered_dither(image, lookup, bayer_matrix())
+    if method == "blue_noise":
+        return ordered_dither(image, lookup, blue_noise_matrix())
+    raise ValueError(f"Unknown dithering method: {method}")
@@ -0,0 +1,68 @@
+"""
+Wczytywanie obrazów w zmniejszonej rozdzielczości
+JPEG jest dekodowany od razu w skali 1/2, 1/4 lub 1/8 (tryb draft PIL - skalowanie w DCT),
+więc 48 MP zdjęcie z telefonu nigdy nie trafia do pamięci w pełnym rozmiarze,
+jeśli potrzebna jest tylko rozdzielczość ściegów.
+
+Ograniczenie: formaty bez skalowania w dekoderze (PNG, WebP, ...) PIL dekoduje raz
+w pełnej rozdzielczości; obraz jest wtedy od razu zmniejszany w PIL (reduce) i zwalniany,
+zanim powstanie tablica NumPy, więc pełny rozmiar nie trafia do dalszego przetwarzania.
+"""
+from io import BytesIO
+from typing import BinaryIO, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ImageSource = Union[str, bytes, BinaryIO]
+
+def open_image(source: ImageSource) -> Image.Image:
+    """Otwiera obraz leniwie (czyta tylko nagłówek); bytes są opakowywane w BytesIO"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = BytesIO(source)
+    return Image.open(source)
+
+def target_size(size: Tuple[int, int],
+                max_size: Optional[int] = None,
+                target_width: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Docelowe (szerokość, wysokość): dopasowanie szerokości albo ograniczenie
+    dłuższego boku (obrazy mniejsze od limitu nie są powiększane)
+    """
+    width, height = size
+    if target_width:
+        return target_width, max(1, int(height * target_width / width))
+    if max_size and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+    return width, height
+
+def load_rgb(source: ImageSource,
+             max_size: Optional[int] = None,
+             target_width: Optional[int] = None) -> np.ndarray:
+    """
+    Dekoduje obraz do tablicy RGB uint8 (H, W, 3) w docelowym rozmiarze
+
+    Dekoder dostaje docelowy rozmiar z góry (draft) i zwraca najmniejszą skalę
+    nie mniejszą od docelowej; resztę robi INTER_AREA.
+
+    Args:
+        max_size: Limit dłuższego boku
+        target_width: Dokładna szerokość wyniku (ma pierwszeństwo przed max_size)
+    """
+    img = open_image(source)
+    width, height = target_size(img.size, max_size, target_width)
+    if (width, height) != img.size:
+        img.draft("RGB", (width, height))
+    # Bez draft (np. PNG): całkowite zmniejszenie w PIL, bez pełnowymiarowej kopii w NumPy
+    factor = min(img.size[0] // width, img.size[1] // height)
+    if factor > 1:
+        img = img.reduce(factor)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    array = np.asarray(img)
+    if array.shape[1] != width or array.shape[0] != height:
+        interpolation = cv2.INTER_AREA if array.shape[1] > width else cv2.INTER_LINEAR
+        array = cv2.resize(array, (width, height), interpolation=interpolation)
+    return array
@@ -0,0 +1,442 @@
+"""
+Kwantyzatory kolorów (redukcja obrazu do palety)
+Wspólny interfejs: funkcja (image, n_colors) → QuantizationResult, wybierana po nazwie.
+
+Backendy:
+    kmeans     - KMeans (n_init=10) na ważonych unikalnych kolorach (ten sam cel co na pikselach)
+    minibatch  - MiniBatchKMeans na próbce pikseli
+    median_cut - median cut (Heckbert) na histogramie 5-bit
+    octree     - drzewo ósemkowe z redukcją najmniej licznych węzłów
+    wu         - kwantyzator Wu (minimalizacja wariancji na skumulowanych momentach histogramu)
+    wu_kmeans  - k-means na ważonych kolorach, inicjalizowany paletą Wu
+
+Warianty k-means nie dostają wszystkich pikseli: compress_colors sprowadza obraz do
+unikalnych kolorów z wagami (albo do histogramu 5-bit przy dużej różnorodności),
+a etykiety wracają na piksele przez tablicę odwrotną - czas i pamięć zależą
+od liczby kolorów, nie pikseli.
+
+Osobno: quantize_to_thread_palette - wybór najlepszego podzbioru nici z katalogu marki
+(klasteryzacja ograniczona do palety nici, bez dopasowywania centroidów).
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+from color_engine.delta_e import (INVENTORY_BONUS, INVENTORY_MAX_EXTRA_DELTA_E, lab_to_rgb_array,
+                                  rgb_to_lab_array)
+from color_engine.metrics import DEFAULT_METRIC, delta_e_matrix
+from color_engine.thread_index import ThreadIndex
+
+# Bitów na kanał w histogramie (32³ komórek)
+HISTOGRAM_BITS = 5
+
+# Ilu najbliższych nici każdej komórki histogramu jest kandydatami palety nici
+THREAD_CANDIDATES_PER_CELL = 6
+
+# Ile pikseli trafia do próbki MiniBatchKMeans
+SAMPLE_SIZE = 20000
+
+# Powyżej tylu unikalnych kolorów klasteryzacja pracuje na histogramie 5-bit
+MAX_UNIQUE_COLORS = 1 << 15
+
+RANDOM_STATE = 42
+
+@dataclass
+class QuantizationResult:
+    """Paleta (K, 3), etykiety pikseli (H, W) i błąd kwantyzacji"""
+    palette: np.ndarray
+    labels: np.ndarray
+    error: float  # średni kwadrat odległości RGB piksela od koloru palety
+
+def quantization_error(pixels: np.ndarray, palette: np.ndarray, labels: np.ndarray) -> float:
+    """Średni kwadrat błędu (RGB) - wspólna miara dla wszystkich backendów"""
+    diff = pixels.astype(np.float32) - palette.astype(np.float32)[labels.ravel()]
+    return float(np.mean(np.sum(diff * diff, axis=1)))
+
+def _result(image: np.ndarray, palette: np.ndarray, labels: np.ndarray) -> QuantizationResult:
+    pixels = image.reshape(-1, 3)
+    labels = labels.reshape(image.shape[:2])
+    return QuantizationResult(palette, labels, quantization_error(pixels, palette, labels))
+
+def _sample(pixels: np.ndarray, size: int = SAMPLE_SIZE) -> np.ndarray:
+    if len(pixels) <= size:
+        return pixels
+    rng = np.random.default_rng(RANDOM_STATE)
+    return pixels[rng.choice(len(pixels), size=size, replace=False)]
+
+@dataclass
+class WeightedColors:
+    """Obraz sprowadzony do kolorów z wagami; colors[inverse] odtwarza (przybliża) piksele"""
+    colors: np.ndarray  # (M, 3) float64
+    weights: np.ndarray  # (M,) liczba pikseli
+    inverse: np.ndarray  # (N,) indeks koloru każdego piksela
+
+    def expand(self, labels: np.ndarray) -> np.ndarray:
+        """Etykiety kolorów (M,) → etykiety pikseli (N,)"""
+        return np.asarray(labels)[self.inverse]
+
+def compress_colors(pixels: np.ndarray, max_unique: int = MAX_UNIQUE_COLORS) -> WeightedColors:
+    """
+    Unikalne kolory pikseli (N, 3) z licznościami; przy więcej niż max_unique
+    kolorach - niepuste komórki histogramu 5-bit ze średnim kolorem komórki
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    packed = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+    unique, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    if len(unique) <= max_unique:
+        colors = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=1)
+        return WeightedColors(colors.astype(np.float64), counts.astype(np.float64), inverse.ravel())
+
+    cells, occupied, cell_counts, cell_colors = _histogram(pixels)
+    position = np.zeros(1 << (3 * HISTOGRAM_BITS), dtype=np.int64)
+    position[occupied] = np.arange(len(occupied))
+    return WeightedColors(cell_colors, cell_counts.astype(np.float64), position[cells])
+
+def _histogram(pixels: np.ndarray, bits: int = HISTOGRAM_BITS) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Histogram skwantyzowanych kolorów
+
+    Returns:
+        (komórka każdego piksela, niepuste komórki, ich liczności, średni kolor komórki)
+    """
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.int64)
+    cells = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    size = 1 << (3 * bits)
+    counts = np.bincount(cells, minlength=size)
+    sums = np.stack([np.bincount(cells, weights=pixels[:, c], minlength=size) for c in range(3)], axis=1)
+    occupied = np.flatnonzero(counts)
+    return cells, occupied, counts[occupied], sums[occupied] / counts[occupied, None]
+
+def _labels_from_cells(cells: np.ndarray, occupied: np.ndarray, cell_labels: np.ndarray, bits: int) -> np.ndarray:
+    lookup = np.zeros(1 << (3 * bits), dtype=np.int64)
+    lookup[occupied] = cell_labels
+    return lookup[cells]
+
+def _weighted_palette(colors: np.ndarray, weights: np.ndarray, groups: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Średnie ważone kolorów w grupach; grupy są przenumerowane na 0..K-1"""
+    _, groups = np.unique(groups, return_inverse=True)
+    total = np.bincount(groups, weights=weights)
+    palette = np.stack(
+        [np.bincount(groups, weights=weights * colors[:, c]) for c in range(3)], axis=1
+    ) / total[:, None]
+    return palette, groups
+
+def quantize_kmeans(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """KMeans na ważonych unikalnych kolorach (sample_weight zamiast powtórzonych pikseli)"""
+    compressed = compress_colors(image.reshape(-1, 3))
+    kmeans = KMeans(n_clusters=min(n_colors, len(compressed.colors)), random_state=RANDOM_STATE, n_init=10)
+    kmeans.fit(compressed.colors, sample_weight=compressed.weights)
+    return _result(image, kmeans.cluster_centers_, compressed.expand(kmeans.labels_))
+
+def quantize_minibatch(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """
+    MiniBatchKMeans uczony na próbce, potem przypisanie wszystkich pikseli
+
+    Liczba klastrów jest ograniczona liczbą unikalnych kolorów próbki (więc i jej rozmiarem),
+    a klastry, do których nie trafił żaden piksel, są usuwane z palety.
+    """
+    pixels = image.reshape(-1, 3)
+    sample = _sample(pixels)
+    n_clusters = min(n_colors, len(np.unique(sample, axis=0)))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=RANDOM_STATE, n_init=3,
+                             batch_size=2048)
+    kmeans.fit(sample.astype(np.float64))
+    used, labels = np.unique(kmeans.predict(pixels.astype(np.float64)), return_inverse=True)
+    return _result(image, kmeans.cluster_centers_[used], labels)
+
+def quantize_median_cut(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """
+    Median cut: pudełko o największej rozpiętości jest dzielone w medianie
+    (ważonej licznością) wzdłuż najdłuższej osi
+    """
+    pixels = image.reshape(-1, 3)
+    cells, occupied, counts, colors = _histogram(pixels)
+    boxes = [np.arange(len(occupied))]
+
+    while len(boxes) < n_colors:
+        extents = [np.ptp(colors[box], axis=0) if len(box) > 1 else np.zeros(3) for box in boxes]
+        target = int(np.argmax([extent.max() for extent in extents]))
+        if extents[target].max() == 0:
+            break
+        box = boxes.pop(target)
+        axis = int(np.argmax(extents[target]))
+        box = box[np.argsort(colors[box, axis], kind="stable")]
+        cumulative = np.cumsum(counts[box])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2, side="right"))
+        split = min(max(split, 1), len(box) - 1)
+        boxes.extend([box[:split], box[split:]])
+
+    groups = np.empty(len(occupied), dtype=np.int64)
+    for i, box in enumerate(boxes):
+        groups[box] = i
+    palette, groups = _weighted_palette(colors, counts, groups)
+    return _result(image, palette, _labels_from_cells(cells, occupied, groups, HISTOGRAM_BITS))
+
+def _octree_keys(colors: np.ndarray, level: int) -> np.ndarray:
+    """Identyfikator węzła drzewa ósemkowego na danym poziomie (0 = korzeń, 8 = liść)"""
+    q = colors.astype(np.int64) >> (8 - level)
+    return (q[:, 0] << 16) | (q[:, 1] << 8) | q[:, 2]
+
+def quantize_octree(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """
+    Drzewo ósemkowe: dopóki liści jest za dużo, węzły najgłębszego poziomu
+    o najmniejszej liczbie pikseli wchłaniają swoje dzieci
+    """
+    pixels = image.reshape(-1, 3)
+    cells, occupied, counts, colors = _histogram(pixels)
+    colors_u8 = np.clip(np.rint(colors), 0, 255).astype(np.uint8)
+
+    leaf_level = np.full(len(occupied), 8)
+    for level in range(7, -1, -1):
+        children = np.unique(_octree_keys(colors_u8, level + 1), return_inverse=True)[1]
+        n_leaves = int(children.max()) + 1
+        if n_leaves <= n_colors:
+            break
+        parents, parent_of = np.unique(_octree_keys(colors_u8, level), return_inverse=True)
+        # Liczba dzieci i pikseli każdego rodzica
+        child_parent = np.zeros(n_leaves, dtype=np.int64)
+        child_parent[children] = parent_of
+        n_children = np.bincount(child_parent, minlength=len(parents))
+        weight = np.bincount(parent_of, weights=counts, minlength=len(parents))
+
+        order = np.argsort(weight, kind="stable")
+        remaining = n_leaves - np.cumsum(n_children[order] - 1)
+        n_merged = int(np.searchsorted(-remaining, -n_colors)) + 1
+        merged = np.zeros(len(parents), dtype=bool)
+        merged[order[:n_merged]] = True
+
+        leaf_level = np.where(merged[parent_of], level, level + 1)
+        if not merged.all():
+            break
+
+    # Liść = (poziom, klucz węzła) - poziom w najstarszych bitach rozróżnia poziomy
+    keys = np.empty(len(occupied), dtype=np.int64)
+    for level in np.unique(leaf_level):
+        mask = leaf_level == level
+        keys[mask] = _octree_keys(colors_u8[mask], int(level))
+    groups = (leaf_level.astype(np.int64) << 24) | keys
+    palette, groups = _weighted_palette(colors, counts, groups)
+    return _result(image, palette, _labels_from_cells(cells, occupied, groups, HISTOGRAM_BITS))
+
+class _WuMoments:
+    """Skumulowane momenty histogramu 5-bit (indeksy 1..32, zero na brzegu)"""
+
+    def __init__(self, pixels: np.ndarray, bits: int = HISTOGRAM_BITS):
+        side = 1 << bits
+        q = (pixels >> (8 - bits)).astype(np.int64) + 1
+        flat = (q[:, 0] * (side + 1) + q[:, 1]) * (side + 1) + q[:, 2]
+        size = (side + 1) ** 3
+        values = pixels.astype(np.float64)
+        moments = [
+            np.bincount(flat, minlength=size),
+            *(np.bincount(flat, weights=values[:, c], minlength=size) for c in range(3)),
+            np.bincount(flat, weights=np.sum(values * values, axis=1), minlength=size),
+        ]
+        self.side = side
+        # (5, 33, 33, 33): waga, suma r, g, b, suma kwadratów
+        self.m = np.stack([m.reshape(side + 1, side + 1, side + 1) for m in moments]).astype(np.float64)
+        for axis in (1, 2, 3):
+            np.cumsum(self.m, axis=axis, out=self.m)
+
+    def volume(self, box) -> np.ndarray:
+        """Momenty pudełka (r0, r1, g0, g1, b0, b1) - dolne granice wyłączne"""
+        r0, r1, g0, g1, b0, b1 = box
+        m = self.m
+        return (m[:, r1, g1, b1] - m[:, r1, g1, b0] - m[:, r1, g0, b1] + m[:, r1, g0, b0]
+                - m[:, r0, g1, b1] + m[:, r0, g1, b0] + m[:, r0, g0, b1] - m[:, r0, g0, b0])
+
+    def variance(self, box) -> float:
+        w, r, g, b, m2 = self.volume(box)
+        return 0.0 if w == 0 else float(m2 - (r * r + g * g + b * b) / w)
+
+    def best_cut(self, box, axis: int) -> Tuple[float, int]:
+        """Najlepsze cięcie pudełka wzdłuż osi (wynik, pozycja) - wszystkie pozycje naraz"""
+        lo, hi = box[2 * axis], box[2 * axis + 1]
+        positions = np.arange(lo + 1, hi)
+        if len(positions) == 0:
+            return -1.0, -1
+        m = np.moveaxis(self.m, axis + 1, 1)
+        u0, u1, v0, v1 = [box[i] for i in range(6) if i // 2 != axis]
+        planes = m[:, :, u1, v1] - m[:, :, u1, v0] - m[:, :, u0, v1] + m[:, :, u0, v0]
+        whole = planes[:, hi] - planes[:, lo]
+        lower = planes[:, positions] - planes[:, lo][:, None]
+        upper = whole[:, None] - lower
+        valid = (lower[0] > 0) & (upper[0] > 0)
+        if not valid.any():
+            return -1.0, -1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = (np.sum(lower[1:4] ** 2, axis=0) / lower[0]
+                     + np.sum(upper[1:4] ** 2, axis=0) / upper[0])
+        score = np.where(valid, score, -1.0)
+        best = int(np.argmax(score))
+        return float(score[best]), int(positions[best])
+
+def wu_palette(pixels: np.ndarray, n_colors: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Kwantyzator Wu
+
+    Returns:
+        (paleta, komórka histogramu każdego piksela, etykiety komórek 32³)
+    """
+    moments = _WuMoments(pixels)
+    side = moments.side
+    boxes = [(0, side, 0, side, 0, side)]
+    variances = [moments.variance(boxes[0])]
+
+    while len(boxes) < n_colors:
+        candidates = [i for i, box in enumerate(boxes)
+                      if variances[i] > 0 and any(box[2 * a + 1] - box[2 * a] > 1 for a in range(3))]
+        if not candidates:
+            break
+        target = max(candidates, key=lambda i: variances[i])
+        box = boxes[target]
+        cuts = [moments.best_cut(box, axis) for axis in range(3)]
+        axis = int(np.argmax([score for score, _ in cuts]))
+        score, position = cuts[axis]
+        if position < 0:
+            variances[target] = 0.0
+            continue
+        first, second = list(box), list(box)
+        first[2 * axis + 1] = position
+        second[2 * axis] = position
+        boxes[target] = tuple(first)
+        boxes.append(tuple(second))
+        variances[target] = moments.variance(boxes[target])
+        variances.append(moments.variance(boxes[-1]))
+
+    tags = np.zeros((side, side, side), dtype=np.int64)
+    palette = []
+    for box in boxes:
+        w, r, g, b, _ = moments.volume(box)
+        if w == 0:
+            continue
+        r0, r1, g0, g1, b0, b1 = box
+        tags[r0:r1, g0:g1, b0:b1] = len(palette)
+        palette.append((r / w, g / w, b / w))
+
+    q = (pixels >> (8 - HISTOGRAM_BITS)).astype(np.int64)
+    cells = (q[:, 0] * side + q[:, 1]) * side + q[:, 2]
+    return np.array(palette), cells, tags.ravel()
+
+def quantize_wu(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """Kwantyzator Wu - czas zależy od rozmiaru histogramu, nie obrazu"""
+    pixels = image.reshape(-1, 3)
+    palette, cells, tags = wu_palette(pixels, n_colors)
+    return _result(image, palette, tags[cells])
+
+def quantize_wu_kmeans(image: np.ndarray, n_colors: int) -> QuantizationResult:
+    """K-means na ważonych kolorach startujący z palety Wu (jedna inicjalizacja zamiast dziesięciu)"""
+    pixels = image.reshape(-1, 3)
+    init, _, _ = wu_palette(pixels, n_colors)
+    compressed = compress_colors(pixels)
+    kmeans = KMeans(n_clusters=len(init), init=init, n_init=1, random_state=RANDOM_STATE)
+    kmeans.fit(compressed.colors, sample_weight=compressed.weights)
+    return _result(image, kmeans.cluster_centers_, compressed.expand(kmeans.labels_))
+
+QUANTIZERS: Dict[str, Callable[[np.ndarray, int], QuantizationResult]] = {
+    "kmeans": quantize_kmeans,
+    "minibatch": quantize_minibatch,
+    "median_cut": quantize_median_cut,
+    "octree": quantize_octree,
+    "wu": quantize_wu,
+    "wu_kmeans": quantize_wu_kmeans,
+}
+
+def get_quantizer(name: str) -> Callable[[np.ndarray, int], QuantizationResult]:
+    """Zwraca kwantyzator po nazwie"""
+    try:
+        return QUANTIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown quantizer: {name}. Available: {', '.join(QUANTIZERS)}") from None
+
+def quantize_to_thread_palette(image: np.ndarray,
+                               n_colors: int,
+                               index: ThreadIndex,
+                               metric: str = DEFAULT_METRIC,
+                               user_inventory: Optional[Set[str]] = None,
+                               max_iter: int = 10,
+                               inventory_bonus: float = INVENTORY_BONUS,
+                               max_extra_delta_e: Optional[float] = INVENTORY_MAX_EXTRA_DELTA_E
+                               ) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Kwantyzacja wprost do nici: wybiera co najwyżej n_colors różnych nici marki,
+    minimalizując sumę Delta E (Lab) pikseli do przypisanej nici
+
+    Praca na histogramie 5-bit: kandydatami są najbliższe nici każdej komórki,
+    start to zachłanny wybór nici najbardziej obniżających koszt, potem naprzemiennie
+    przypisanie komórek i wymiana nici klastra na najlepszą (medoid w katalogu).
+    Nici z user_inventory mają Delta E pomnożone przez inventory_bonus, o ile leżą
+    najwyżej max_extra_delta_e dalej niż najbliższa nić komórki.
+
+    Returns:
+        (labels (H, W), thread_indices, error) - labels indeksują thread_indices,
+        thread_indices to pozycje nici w index, error jak w QuantizationResult
+    """
+    pixels = image.reshape(-1, 3)
+    cells, occupied, counts, colors = _histogram(pixels)
+    cell_lab = rgb_to_lab_array(colors)
+    weights = counts.astype(np.float64)
+
+    k = min(THREAD_CANDIDATES_PER_CELL, len(index))
+    nearest_distances, nearest = index.query(cell_lab, k=k, metric=metric)
+    preference = None
+    if user_inventory and index.threads is not None:
+        preference = index.preference_weights(user_inventory, inventory_bonus)
+        # Najlepsza nić z inwentarza dla komórki też jest kandydatem, nawet spoza k najbliższych
+        _, preferred = index.query_weighted(cell_lab, preference, max_extra_delta_e, metric=metric)
+        nearest = np.concatenate([nearest, preferred[:, None]], axis=1)
+    candidates = np.unique(nearest)
+    cost = delta_e_matrix(cell_lab, index.lab[candidates], metric=metric)
+    if preference is not None:
+        tolerance = np.inf if max_extra_delta_e is None else max_extra_delta_e
+        within = cost <= nearest_distances[:, :1] + tolerance
+        cost = np.where(within, cost * preference[candidates], cost)
+    weighted_cost = cost * weights[:, None]
+    n_colors = min(n_colors, len(candidates))
+
+    # Zachłanny start: w każdym kroku nić o największym spadku kosztu
+    chosen = []
+    best = np.full(len(occupied), np.inf)
+    for _ in range(n_colors):
+        gain = np.sum(weights[:, None] * np.maximum(best[:, None] - cost, 0.0), axis=0) \
+            if chosen else -weighted_cost.sum(axis=0)
+        gain[chosen] = -np.inf
+        pick = int(np.argmax(gain))
+        if chosen and gain[pick] <= 0:
+            break
+        chosen.append(pick)
+        best = np.minimum(best, cost[:, pick])
+
+    chosen = np.array(chosen)
+    for _ in range(max_iter):
+        assignment = np.argmin(cost[:, chosen], axis=1)
+        # Koszt każdego klastra dla każdego kandydata: (K × N) @ (N × C)
+        one_hot = np.zeros((len(chosen), len(occupied)))
+        one_hot[assignment, np.arange(len(occupied))] = 1.0
+        cluster_cost = one_hot @ weighted_cost
+
+        # Najliczniejsze klastry wybierają pierwsze - ta sama nić nie trafia do dwóch klastrów
+        updated = chosen.copy()
+        taken = set()
+        for cluster in np.argsort(-one_hot @ weights, kind="stable"):
+            for candidate in np.argsort(cluster_cost[cluster], kind="stable"):
+                if candidate not in taken:
+                    updated[cluster] = candidate
+                    taken.add(int(candidate))
+                    break
+        if np.array_equal(updated, chosen):
+            break
+        chosen = updated
+
+    assignment = np.argmin(cost[:, chosen], axis=1)
+    used, cell_labels = np.unique(assignment, return_inverse=True)
+    thread_indices = candidates[chosen[used]]
+    labels = _labels_from_cells(cells, occupied, cell_labels, HISTOGRAM_BITS).reshape(image.shape[:2])
+    if index.threads is not None:
+        palette = np.array([index.threads[i].rgb for i in thread_indices], dtype=np.float64)
+    else:
+        palette = lab_to_rgb_array(index.lab[thread_indices]).astype(np.float64)
+    return labels, thread_indices, quantization_error(pixels, palette, labels)
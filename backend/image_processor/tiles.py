@@ -0,0 +1,96 @@
+"""
+Przetwarzanie dużych obrazów w kafelkach
+Operacje potrzebujące pełnej rozdzielczości (CLAHE, Canny) pracują na blokach z marginesem,
+więc bufory pośrednie (szarość, rozmycie, Lab) mają rozmiar bloku, a nie całego zdjęcia.
+"""
+from typing import Iterator, Tuple
+
+import cv2
+import numpy as np
+
+# Domyślny bok bloku i margines kontekstu (piksele)
+TILE_SIZE = 1024
+TILE_OVERLAP = 16
+
+Block = Tuple[slice, slice, slice, slice]
+
+def iter_tiles(height: int, width: int, tile: int = TILE_SIZE, overlap: int = TILE_OVERLAP) -> Iterator[Block]:
+    """
+    Bloki obrazu z marginesem
+
+    Yields:
+        (rows, cols, inner_rows, inner_cols) - rows/cols wycinają blok z marginesem
+        z obrazu, inner_* wycinają z wyniku bloku część bez marginesu
+    """
+    for top in range(0, height, tile):
+        bottom = min(top + tile, height)
+        y0, y1 = max(top - overlap, 0), min(bottom + overlap, height)
+        for left in range(0, width, tile):
+            right = min(left + tile, width)
+            x0, x1 = max(left - overlap, 0), min(right + overlap, width)
+            yield (slice(y0, y1), slice(x0, x1),
+                   slice(top - y0, bottom - y0), slice(left - x0, right - x0))
+
+def tiled_canny(rgb: np.ndarray,
+                low_threshold: int = 50,
+                high_threshold: int = 150,
+                tile: int = TILE_SIZE,
+                overlap: int = TILE_OVERLAP) -> np.ndarray:
+    """
+    Gaussian blur 5×5 + Canny liczony w blokach z marginesem
+
+    Margines pokrywa zasięg filtrów, więc wynik różni się od globalnego Canny
+    najwyżej tam, gdzie histereza łączy krawędzie przez granicę bloku dłuższą drogą niż margines.
+    """
+    height, width = rgb.shape[:2]
+    edges = np.empty((height, width), dtype=np.uint8)
+    for rows, cols, inner_rows, inner_cols in iter_tiles(height, width, tile, overlap):
+        gray = cv2.cvtColor(rgb[rows, cols], cv2.COLOR_RGB2GRAY)
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        edges[rows, cols][inner_rows, inner_cols] = \
+            cv2.Canny(blurred, low_threshold, high_threshold)[inner_rows, inner_cols]
+    return edges
+
+def tiled_clahe(rgb: np.ndarray,
+                clip_limit: float = 3.0,
+                grid: Tuple[int, int] = (8, 8),
+                max_tile_rows: int = 2) -> np.ndarray:
+    """
+    CLAHE na kanale L (Lab) w pasach wyrównanych do siatki CLAHE
+
+    Piksel zależy tylko od histogramów swojego kafla CLAHE i sąsiednich, więc pas
+    max_tile_rows rzędów kafli liczony z jednym rzędem kontekstu nad i pod daje
+    wynik CLAHE całego obrazu z dokładnością do zaokrągleń interpolacji (do ±3 po
+    powrocie do RGB, na ułamku procenta pikseli).
+    Gdy któryś wymiar nie dzieli się przez siatkę, OpenCV dopełnia obraz w obu osiach
+    (BORDER_REFLECT_101, o `kafle - wymiar % kafle` pikseli) - pasy robią to samo.
+
+    Args:
+        grid: (kolumny, rzędy) kafli CLAHE - jak tileGridSize w OpenCV
+    """
+    height, width = rgb.shape[:2]
+    cols, rows = grid
+    pad_y, pad_x = 0, 0
+    if height % rows or width % cols:
+        pad_y, pad_x = rows - height % rows, cols - width % cols
+    tile_height = (height + pad_y) // rows
+    result = np.empty_like(rgb)
+
+    for first in range(0, rows, max_tile_rows):
+        last = min(first + max_tile_rows, rows)
+        context_first, context_last = max(first - 1, 0), min(last + 1, rows)
+        y0, y1 = context_first * tile_height, context_last * tile_height
+        out0, out1 = first * tile_height, min(last * tile_height, height)
+        if out0 >= out1:
+            break
+
+        # Wiersze dopełnienia pod obrazem - odbicia jak w copyMakeBorder
+        band_rows = [cv2.borderInterpolate(y, height, cv2.BORDER_REFLECT_101) for y in range(y0, y1)]
+        lab = cv2.cvtColor(rgb[band_rows], cv2.COLOR_RGB2LAB)
+        lightness = cv2.copyMakeBorder(np.ascontiguousarray(lab[..., 0]), 0, 0, 0, pad_x,
+                                       cv2.BORDER_REFLECT_101)
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(cols, context_last - context_first))
+        lab[..., 0] = clahe.apply(lightness)[:, :width]
+        result[out0:out1] = cv2.cvtColor(lab[out0 - y0:out1 - y0], cv2.COLOR_LAB2RGB)
+
+    return result
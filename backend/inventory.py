@@ -0,0 +1,80 @@
+"""
+User thread inventories
+Owned thread_ids per user, persisted locally in SQLite (Firestore can implement
+the same interface) and cached in memory, because conversions with
+use_inventory read the inventory on every request.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import FrozenSet, Iterable
+
+class InventoryStore:
+    """SQLite-backed inventory store with an LRU cache of recently used users"""
+
+    def __init__(self, path: Path, cache_size: int = 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_inventory (
+                user_id TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                PRIMARY KEY (user_id, thread_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def _remember(self, user_id: str, threads: FrozenSet[str]) -> None:
+        self._cache[user_id] = threads
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, user_id: str) -> FrozenSet[str]:
+        """Thread ids owned by the user (empty for unknown users)"""
+        with self._lock:
+            threads = self._cache.get(user_id)
+            if threads is not None:
+                self._cache.move_to_end(user_id)
+                return threads
+            rows = self._conn.execute(
+                "SELECT thread_id FROM user_inventory WHERE user_id = ?", (user_id,)
+            ).fetchall()
+            threads = frozenset(row[0] for row in rows)
+            self._remember(user_id, threads)
+            return threads
+
+    def replace(self, user_id: str, thread_ids: Iterable[str]) -> FrozenSet[str]:
+        """Replaces the whole inventory of the user in one transaction"""
+        threads = frozenset(thread_ids)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM user_inventory WHERE user_id = ?", (user_id,))
+                self._conn.executemany(
+                    "INSERT INTO user_inventory (user_id, thread_id, added_at) VALUES (?, ?, ?)",
+                    [(user_id, thread_id, now) for thread_id in sorted(threads)]
+                )
+            self._remember(user_id, threads)
+        return threads
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def create_inventory_store() -> InventoryStore:
+    """Builds the store; the SQLite file location comes from INVENTORY_STORE_PATH"""
+    default_path = Path(__file__).parent.parent / "data" / "inventory.db"
+    return InventoryStore(
+        Path(os.getenv("INVENTORY_STORE_PATH", str(default_path))),
+        cache_size=int(os.getenv("INVENTORY_CACHE_SIZE", "1024"))
+    )
@@ -0,0 +1,182 @@
+"""
+Conversion job store
+Keeps status, stage progress and results of conversions submitted with async=true.
+The store is pluggable: in-memory for a single instance, SQLite for a local
+persistent stand-in (Firestore can implement the same interface).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+# Pipeline stages in execution order (used for progress reporting)
+STAGES = ("download", "resize", "quantize", "match", "grid")
+
+TERMINAL_STATUSES = ("ready", "failed")
+
+def stage_progress(stage: str) -> float:
+    """Fraction of the pipeline completed when `stage` starts"""
+    return round(STAGES.index(stage) / len(STAGES), 2)
+
+class JobStore:
+    """
+    Interface of a job store
+
+    A job is a dict: pattern_id, status (queued/processing/ready/failed), stage,
+    progress (0-1), result (PatternResponse fields), error, created_at, updated_at.
+    Implementations must be thread-safe - progress arrives from a listener thread.
+    """
+
+    def create(self, pattern_id: str) -> Dict:
+        raise NotImplementedError
+
+    def update(self, pattern_id: str, **fields) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def get(self, pattern_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def advance(self, pattern_id: str, stage: str) -> Optional[Dict]:
+        """Marks the job as processing `stage`, unless it already finished"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _new_job(pattern_id: str) -> Dict:
+        now = time.time()
+        return {
+            "pattern_id": pattern_id,
+            "status": "queued",
+            "stage": None,
+            "progress": 0.0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+class InMemoryJobStore(JobStore):
+    """Process-local store; keeps at most `max_jobs` most recently updated jobs"""
+
+    def __init__(self, max_jobs: int = 256):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, pattern_id: str) -> Dict:
+        job = self._new_job(pattern_id)
+        with self._lock:
+            self._jobs[pattern_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return dict(job)
+
+    def update(self, pattern_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(pattern_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            self._jobs.move_to_end(pattern_id)
+            return dict(job)
+
+    def get(self, pattern_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(pattern_id)
+            return dict(job) if job is not None else None
+
+    def advance(self, pattern_id: str, stage: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(pattern_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return None
+            job.update(status="processing", stage=stage,
+                       progress=stage_progress(stage), updated_at=time.time())
+            return dict(job)
+
+class SQLiteJobStore(JobStore):
+    """
+    Persistent local store (survives restarts, shared by workers on one host);
+    like InMemoryJobStore keeps at most `max_jobs` most recently updated jobs
+    """
+
+    def __init__(self, path: Path, max_jobs: int = 256):
+        self.path = Path(path)
+        self.max_jobs = max_jobs
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                pattern_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+        self._conn.commit()
+
+    def _write(self, job: Dict) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (pattern_id, data, updated_at) VALUES (?, ?, ?)",
+            (job["pattern_id"], json.dumps(job), job["updated_at"])
+        )
+        self._conn.commit()
+
+    def _read(self, pattern_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT data FROM jobs WHERE pattern_id = ?", (pattern_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create(self, pattern_id: str) -> Dict:
+        job = self._new_job(pattern_id)
+        with self._lock:
+            self._write(job)
+            self._conn.execute(
+                "DELETE FROM jobs WHERE pattern_id NOT IN "
+                "(SELECT pattern_id FROM jobs ORDER BY updated_at DESC LIMIT ?)",
+                (self.max_jobs,)
+            )
+            self._conn.commit()
+        return job
+
+    def update(self, pattern_id: str, **fields) -> Optional[Dict]:
+        with self._lock:
+            job = self._read(pattern_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+            return job
+
+    def get(self, pattern_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._read(pattern_id)
+
+    def advance(self, pattern_id: str, stage: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._read(pattern_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return None
+            job.update(status="processing", stage=stage,
+                       progress=stage_progress(stage), updated_at=time.time())
+            self._write(job)
+            return job
+
+def create_job_store() -> JobStore:
+    """
+    Builds the store selected by JOB_STORE ("memory" or "sqlite");
+    the SQLite file location comes from JOB_STORE_PATH
+    """
+    kind = os.getenv("JOB_STORE", "memory").lower()
+    if kind == "sqlite":
+        default_path = Path(__file__).parent.parent / "data" / "jobs.db"
+        return SQLiteJobStore(Path(os.getenv("JOB_STORE_PATH", str(default_path))))
+    if kind == "memory":
+        return InMemoryJobStore()
+    raise ValueError(f"Unknown JOB_STORE: {kind}")
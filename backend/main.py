@@ -1,22 +1,101 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks, Query, Response, Header
 import os
-import io
-import requests
-from io import BytesIO
+import json
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
+from typing import Callable, List, Optional, Tuple
 import uvicorn
-from pattern_generator import generate_pattern_pdf
-from database.threads import get_all_threads, get_thread_count
+from contextlib import asynccontextmanager
+from pattern_generator import PdfStats, iter_pattern_pdf, pdf_cache_key
+from database.catalog import get_catalog
+from database.equivalence import EQUIVALENCE_TOP_K
+from database.threads import close_pool, get_threads_by_ids_async
+from color_engine.delta_e import INVENTORY_BONUS
+from color_engine.metrics import METRICS
+from image_processor.dithering import METHODS as DITHER_METHODS
+from image_processor.quantizers import QUANTIZERS
+from conversion import THREAD_QUANTIZERS, convert_pattern, conversion_cache_key
+from cache import create_cache
+from fetcher import FetchError, create_fetcher, read_image_stream
+from grid_codec import (DEFAULT_BINARY_ENCODING, ENCODINGS, FRAME_MEDIA_TYPE, STORAGE_ENCODING,
+                        encode_frame, pack_grid_data)
+from worker_pool import ConversionPool, PoolSaturatedError, PoolSlot
+from jobs import TERMINAL_STATUSES, create_job_store
+from inventory import create_inventory_store
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Spawn and warm conversion workers before serving traffic
+    conversion_pool.start()
+    start_pdf_executor()
+    yield
+    conversion_pool.shutdown()
+    shutdown_pdf_executor()
+    await image_fetcher.aclose()
+    close_pool()
+
 app = FastAPI(
     title="Mulina API",
     description="API for converting images to embroidery patterns",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Multipart framing and the options field sent along with the image in an upload
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized upload bodies before the multipart parser spools them: by
+    Content-Length up front, and by counting the received body (chunked requests,
+    a wrong Content-Length) - the image limit itself is checked again on the file part
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...], limit: Callable[[], int]):
+        self.app = app
+        self.paths = paths
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        limit = self.limit()
+        detail = f"Invalid upload: Request body exceeds {limit} bytes"
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"detail": detail}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def guarded_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, guarded_receive, send)
+
+# Added before CORS so that CORS (the outer middleware) also covers the 413 responses
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    paths=("/api/v1/convert/upload",),
+    limit=lambda: image_fetcher.max_bytes + UPLOAD_FORM_OVERHEAD_BYTES,
 )
 
 # CORS Configuration
@@ -33,23 +112,98 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Conversion worker pool (CONVERT_WORKERS=0 runs conversions in a thread)
+conversion_pool = ConversionPool(
+    max_workers=int(os.getenv("CONVERT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.getenv("CONVERT_MAX_QUEUE", "8"))
+)
+
+# PDF chart pages are rendered in parallel (PDF_WORKERS=0 renders them inline)
+pdf_workers = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+pdf_executor: Optional[ProcessPoolExecutor] = None
+pdf_executor_lock = threading.Lock()
+
+def get_pdf_executor() -> Optional[ProcessPoolExecutor]:
+    """Page render pool; created on first use and again after a shutdown (new lifespan)"""
+    global pdf_executor
+    with pdf_executor_lock:
+        if pdf_executor is None and pdf_workers > 0:
+            pdf_executor = ProcessPoolExecutor(max_workers=pdf_workers)
+        return pdf_executor
+
+def start_pdf_executor() -> None:
+    """Forks the page workers at startup, not from the thread streaming the first export"""
+    executor = get_pdf_executor()
+    if executor is not None:
+        for _ in range(pdf_workers):
+            executor.submit(os.getpid)
+
+def shutdown_pdf_executor() -> None:
+    global pdf_executor
+    with pdf_executor_lock:
+        if pdf_executor is not None:
+            pdf_executor.shutdown(wait=False, cancel_futures=True)
+            pdf_executor = None
+
+# Conversion results by content hash (RESULT_CACHE_MEMORY_MB, RESULT_CACHE_DISK=1, RESULT_CACHE_DISK_MB)
+result_cache = create_cache("result")
+
+# Rendered PDF exports by content hash (PDF_CACHE_MEMORY_MB, PDF_CACHE_DISK=1, PDF_CACHE_DISK_MB)
+pdf_cache = create_cache("pdf")
+
+# Source image downloads: pooled client, size limit, ETag blob cache (MAX_IMAGE_SIZE_MB, IMAGE_CACHE_*)
+image_fetcher = create_fetcher()
+
+# Conversion jobs (JOB_STORE=memory|sqlite)
+job_store = create_job_store()
+JOB_EVENTS_POLL_SECONDS = 0.25
+
+# Owned threads per user (INVENTORY_STORE_PATH), cached in memory
+inventory_store = create_inventory_store()
+MAX_INVENTORY_THREADS = 5000
+
+def verify_firebase_token(id_token: str) -> str:
+    """Firebase ID token → uid (firebase_admin is imported on first authenticated request)"""
+    from config import verify_id_token
+    return verify_id_token(id_token)
+
+# Verifies "Authorization: Bearer <Firebase ID token>" and returns the uid
+token_verifier = verify_firebase_token
+
+# Chunk size for reading uploaded images
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
 # Models
-class ConversionRequest(BaseModel):
-    image_url: str
+class ConversionOptions(BaseModel):
     pattern_type: str  # "cross_stitch" or "outline"
-    max_colors: int = 50
-    aida_count: int = 14
+    max_colors: int = Field(50, gt=0)
+    aida_count: int = Field(14, gt=0)
     enable_dithering: bool = False
+    dither_method: str = "floyd_steinberg"  # floyd_steinberg, atkinson, jarvis_judice_ninke, bayer, blue_noise
     thread_brand: str = "DMC"
     use_inventory: bool = False
+    user_inventory: List[str] = []  # thread_id owned by the user, preferred when use_inventory is set
+    inventory_bonus: float = Field(INVENTORY_BONUS, gt=0, le=1)  # Delta E multiplier for owned threads
+    max_extra_delta_e: Optional[float] = Field(None, ge=0)  # max extra Delta E of an owned thread over the nearest one
+    quantizer: str = "kmeans"  # kmeans, minibatch, median_cut, octree, wu, wu_kmeans,
+                               # "direct" (thread LUT) or "thread_palette" (clustering in thread space)
+    metric: str = "cie76"  # Delta E metric: "cie76", "cie94" or "ciede2000"
+    grid_encoding: str = "json"  # Grid in the response: "json", "raw", "rle" or "zlib" (base64)
+
+class ConversionRequest(ConversionOptions):
+    image_url: str
 
 class PatternResponse(BaseModel):
     pattern_id: str
-    status: str
+    status: str  # "queued", "processing", "ready" or "failed"
     grid_data: Optional[dict] = None
-    color_palette: List[dict]
-    dimensions: dict
-    estimated_time_minutes: int
+    color_palette: List[dict] = []
+    dimensions: dict = {}
+    estimated_time_minutes: int = 0
+    quantization_error: Optional[float] = None  # mean squared RGB error of the color reduction
+    stage: Optional[str] = None  # download, resize, quantize, match, grid
+    progress: Optional[float] = None
+    error: Optional[str] = None
 
 class ThreadInfo(BaseModel):
     thread_id: str
@@ -59,10 +213,42 @@ class ThreadInfo(BaseModel):
     rgb: tuple[int, int, int]
     hex_color: str
 
+# Most codes accepted by one /api/v1/threads/convert request
+MAX_BULK_CODES = 1000
+
+class ThreadConversionRequest(BaseModel):
+    from_brand: str
+    to_brand: str
+    codes: List[str] = Field(..., max_length=MAX_BULK_CODES)
+    metric: str = "cie76"  # Delta E metric: "cie76", "cie94" or "ciede2000"
+    top_k: int = Field(1, ge=1, le=EQUIVALENCE_TOP_K)
+
+class ThreadMatch(BaseModel):
+    thread: ThreadInfo
+    delta_e: float
+
+class ThreadConversion(BaseModel):
+    color_code: str
+    found: bool  # False when the code does not exist in from_brand
+    matches: List[ThreadMatch] = []
+
+class ThreadConversionResponse(BaseModel):
+    from_brand: str
+    to_brand: str
+    metric: str
+    conversions: List[ThreadConversion]
+
+class InventoryUpdate(BaseModel):
+    threads: List[str] = Field(..., max_length=MAX_INVENTORY_THREADS)
+
+class InventoryResponse(BaseModel):
+    user_id: str
+    threads: List[str]
+
 # Health Check
 @app.get("/")
 async def root():
-    thread_count = get_thread_count()
+    thread_count = len(get_catalog())
     return {
         "service": "Mulina API",
         "status": "healthy",
@@ -72,199 +258,470 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "threads": get_thread_count()}
+    return {"status": "ok", "threads": len(get_catalog())}
 
-# Endpoints
-@app.post("/api/v1/convert", response_model=PatternResponse)
-async def convert_image(request: ConversionRequest):
+async def run_conversion(request: ConversionOptions,
+                         progress: Optional[Callable[[str], None]] = None,
+                         image_data: Optional[bytes] = None,
+                         slot: Optional[PoolSlot] = None) -> Tuple[dict, str, bool]:
     """
-    Konwertuje obraz na wzór hafciarski
+    Downloads the image (unless image_data was uploaded) and runs the conversion pipeline
+    in the worker pool (in `slot` when one was reserved at submit time)
+    
+    Returns:
+        (result, cache_key, cache_hit) - identical image + settings are served from the cache
+    """
+    if image_data is None:
+        if progress:
+            progress("download")
+        image_data = await image_fetcher.fetch(request.image_url)
+    
+    cache_key = conversion_cache_key(image_data, request, get_catalog().fingerprint)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return json.loads(cached), cache_key, True
+    
+    # CPU-bound pipeline runs in the worker pool
+    result = await conversion_pool.run(convert_pattern, image_data, request, progress=progress, slot=slot)
+    # Cache and job store keep the grid compressed; responses re-encode it on the way out
+    result["grid_data"] = pack_grid_data(result["grid_data"], STORAGE_ENCODING)
+    result_cache.set(cache_key, json.dumps(result, separators=(",", ":")).encode())
+    return result, cache_key, False
+
+async def process_conversion_job(pattern_id: str,
+                                 request: ConversionOptions,
+                                 image_data: Optional[bytes] = None,
+                                 slot: Optional[PoolSlot] = None):
+    """
+    Background task for async conversions - records stage progress and the result
+    
+    `slot` was reserved at submit time; it is given back if the job ends before
+    reaching the pool (download error, cache hit)
     """
     try:
-        # Relative imports within backend module
-        import sys
-        import os
-        import numpy as np
-        from PIL import Image as PILImage
-        sys.path.insert(0, os.path.dirname(__file__))
-        
-        from image_processor.converter import ImageProcessor
-        from color_engine.delta_e import find_closest_thread, Thread
-        from database.threads import get_all_threads
-        
-        # Download image
-        response = requests.get(request.image_url, timeout=30)
-        response.raise_for_status()
-        image_data = BytesIO(response.content)
-        
-        # Get thread database
-        threads_data = get_all_threads(brand=request.thread_brand)
-        thread_database = [
-            Thread(
-                thread_id=t["thread_id"],
-                brand=t["brand"],
-                color_code=t["color_code"],
-                color_name=t.get("color_name", ""),
-                rgb=tuple(t["rgb"]),
-                lab=tuple(t.get("lab", [0, 0, 0]))  # Will be calculated if missing
-            )
-            for t in threads_data
-        ]
-        
-        # Load image with PIL
-        pil_img = PILImage.open(image_data)
-        if pil_img.mode != 'RGB':
-            pil_img = pil_img.convert('RGB')
-        
-        # Convert to numpy array for OpenCV
-        img_array = np.array(pil_img)
-        
-        # Create processor with modified approach - we'll use methods directly
-        # For now, simplified version without full ImageProcessor class
-        
-        # Resize if too large
-        max_size = 600
-        height, width = img_array.shape[:2]
-        if max(height, width) > max_size:
-            scale = max_size / max(height, width)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            import cv2
-            img_array = cv2.resize(img_array, (new_width, new_height), interpolation=cv2.INTER_AREA)
-        
-        # Simple color quantization using k-means
-        from sklearn.cluster import KMeans
-        pixels = img_array.reshape(-1, 3)
-        kmeans = KMeans(n_clusters=min(request.max_colors, 30), random_state=42, n_init=10)
-        kmeans.fit(pixels)
-        
-        # Get dominant colors
-        colors = kmeans.cluster_centers_.astype(int)
-        labels = kmeans.labels_
-        
-        # Create grid based on labels
-        grid_height, grid_width = img_array.shape[:2]
-        grid = labels.reshape(grid_height, grid_width)
-        
-        # Map colors to threads
-        color_palette = []
-        thread_map = {}
-        
-        for idx, rgb in enumerate(colors):
-            rgb_tuple = tuple([int(x) for x in rgb])  # Convert numpy int64 to Python int
-            thread_match = find_closest_thread(
-                rgb_tuple, 
-                thread_database,
-                brand_filter=request.thread_brand
-            )
-            color_palette.append({
-                "rgb": [int(x) for x in rgb],  # Ensure standard int
-                "thread_code": thread_match["thread"].color_code,
-                "thread_brand": thread_match["thread"].brand,
-                "thread_name": thread_match["thread"].color_name,
-                "symbol": chr(65 + idx) if idx < 26 else chr(97 + idx - 26),  # A-Z, then a-z
-                "delta_e": round(float(thread_match["delta_e"]), 2)
-            })
-            thread_map[idx] = len(color_palette) - 1
-        
-        # Generate pattern based on type
-        grid_data = {
-            "grid": [[int(cell) for cell in row] for row in grid.tolist()],  # Convert all to int
-            "type": request.pattern_type,
-            "width": int(grid_width),
-            "height": int(grid_height)
-        }
-        
-        # Calculate dimensions
-        width_stitches = int(grid_width)
-        height_stitches = int(grid_height)
+        result, _, _ = await run_conversion(
+            request, progress=lambda stage: job_store.advance(pattern_id, stage), image_data=image_data,
+            slot=slot
+        )
+        job_store.update(pattern_id, status="ready", stage=None, progress=1.0, result=result)
+    except FetchError as e:
+        job_store.update(pattern_id, status="failed", error=f"Failed to download image: {str(e)}")
+    except Exception as e:
+        job_store.update(pattern_id, status="failed", error=f"Conversion error: {str(e)}")
+    finally:
+        if slot is not None:
+            slot.close()
+
+def job_to_response(job: dict) -> PatternResponse:
+    """Builds PatternResponse from a stored job (result fields only once ready)"""
+    return PatternResponse(
+        pattern_id=job["pattern_id"],
+        status=job["status"],
+        stage=job["stage"],
+        progress=job["progress"],
+        error=job["error"],
+        **(job["result"] or {})
+    )
+
+def render_pattern(pattern: PatternResponse,
+                   grid_encoding: str = "json",
+                   accept: Optional[str] = None,
+                   headers: Optional[dict] = None) -> Response:
+    """
+    Serializes a pattern with the grid in the requested encoding
+    
+    With "Accept: application/octet-stream" a ready pattern is sent as a binary frame
+    (JSON metadata header + grid buffer, see grid_codec); otherwise as JSON with
+    grid_data packed according to grid_encoding.
+    """
+    fields = pattern.model_dump()
+    headers = {**(headers or {}), "Vary": "Accept"}
+    if fields["grid_data"] is not None:
+        if accept and FRAME_MEDIA_TYPE in accept:
+            encoding = DEFAULT_BINARY_ENCODING if grid_encoding == "json" else grid_encoding
+            return Response(content=encode_frame(fields, encoding), media_type=FRAME_MEDIA_TYPE,
+                            headers=headers)
+        fields["grid_data"] = pack_grid_data(fields["grid_data"], grid_encoding)
+    return JSONResponse(content=fields, headers=headers)
+
+def check_grid_encoding(grid_encoding: str) -> None:
+    if grid_encoding not in ENCODINGS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown grid encoding: {grid_encoding} (expected one of {', '.join(ENCODINGS)})")
+
+def check_conversion_options(request: ConversionOptions) -> ConversionOptions:
+    """
+    Rejects unknown option values with 400 before anything is converted or queued;
+    returns the request with the metric name normalized (as get_metric does)
+    """
+    check_grid_encoding(request.grid_encoding)
+    metric = request.metric.lower()
+    choices = {
+        "quantizer": (request.quantizer, tuple(QUANTIZERS) + THREAD_QUANTIZERS),
+        "dither method": (request.dither_method, DITHER_METHODS),
+        "Delta E metric": (metric, tuple(METRICS)),
+        "thread brand": (request.thread_brand, tuple(get_catalog().brands)),
+    }
+    for name, (value, allowed) in choices.items():
+        if value not in allowed:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown {name}: {value} (expected one of {', '.join(allowed)})")
+    return request.model_copy(update={"metric": metric}) if metric != request.metric else request
+
+def unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+async def current_user_id(authorization: Optional[str] = Header(None)) -> str:
+    """uid of the caller from a verified Firebase ID token; 401 when missing or invalid"""
+    scheme, _, id_token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not id_token.strip():
+        raise unauthorized("Missing bearer token")
+    try:
+        # Verification may fetch Google's public keys - keep it off the event loop
+        return await run_in_threadpool(token_verifier, id_token.strip())
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Authentication is not configured")
+    except Exception:
+        raise unauthorized("Invalid authentication token")
+
+async def optional_user_id(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """Like current_user_id, but anonymous requests (no Authorization header) get None"""
+    if authorization is None:
+        return None
+    return await current_user_id(authorization)
+
+async def start_conversion(request: ConversionOptions,
+                           background_tasks: BackgroundTasks,
+                           response: Response,
+                           async_mode: bool,
+                           accept: Optional[str],
+                           image_data: Optional[bytes] = None,
+                           user_id: Optional[str] = None):
+    """Shared body of the convert endpoints: queues an async job or converts in place"""
+    request = check_conversion_options(request)
+    
+    if request.use_inventory and user_id and not request.user_inventory:
+        # Inventory of the authenticated caller (never of a client-chosen user)
+        inventory = await run_in_threadpool(inventory_store.get, user_id)
+        request = request.model_copy(update={"user_inventory": sorted(inventory)})
+    
+    if async_mode:
+        # Reserved now, so a burst of submits beyond the capacity gets 503 instead of failed jobs
+        try:
+            slot = conversion_pool.reserve()
+        except PoolSaturatedError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
         
-        # Physical dimensions (cm) based on Aida count
-        cm_per_stitch = 2.54 / request.aida_count  # Aida count = stitches per inch
-        width_cm = width_stitches * cm_per_stitch
-        height_cm = height_stitches * cm_per_stitch
+        pattern_id = f"pattern_{uuid.uuid4().hex}"
+        try:
+            job = job_store.create(pattern_id)
+        except Exception:
+            slot.close()
+            raise
+        background_tasks.add_task(process_conversion_job, pattern_id, request, image_data, slot)
+        response.status_code = 202
+        return job_to_response(job)
+    
+    try:
+        result, cache_key, cache_hit = await run_conversion(request, image_data=image_data)
         
-        # Estimated time (rough: 1 stitch = 0.5 minute for beginners)
-        total_stitches = width_stitches * height_stitches
-        estimated_time = int(total_stitches * 0.5)
+        # Content-addressed id: stable across processes and restarts
+        pattern_id = f"pattern_{cache_key[:16]}"
+        job_store.create(pattern_id)
+        job_store.update(pattern_id, status="ready", progress=1.0, result=result)
         
-        return PatternResponse(
-            pattern_id=f"pattern_{hash(request.image_url) % 10000}",
-            status="ready",
-            grid_data=grid_data,
-            color_palette=color_palette,
-            dimensions={
-                "width_stitches": width_stitches,
-                "height_stitches": height_stitches,
-                "width_cm": round(width_cm, 1),
-                "height_cm": round(height_cm, 1)
-            },
-            estimated_time_minutes=estimated_time
+        return render_pattern(
+            PatternResponse(pattern_id=pattern_id, status="ready", **result),
+            request.grid_encoding,
+            accept,
+            headers={"X-Cache": "HIT" if cache_hit else "MISS"}
         )
         
-    except requests.RequestException as e:
-        raise HTTPException(status_code=400, detail=f"Failed to download image: {str(e)}")
+    except PoolSaturatedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except FetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Failed to download image: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Conversion error: {str(e)}")
 
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single "bytes=" range as (start, stop) with stop exclusive; None means the whole body
+    (no header, a multi-range or another unit - all allowed to be ignored by RFC 9110)
+    
+    Raises:
+        HTTPException 416: range outside the body
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            stop = min(int(last) + 1, size) if last else size
+        else:
+            start, stop = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    if start >= size or stop <= start:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, stop
+
+def bytes_response(data: bytes,
+                   media_type: str,
+                   headers: dict,
+                   range_header: Optional[str] = None) -> Response:
+    """Full body (200) or the requested byte range (206) with Accept-Ranges/Content-Range"""
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    byte_range = parse_byte_range(range_header, len(data))
+    if byte_range is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+    start, stop = byte_range
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{len(data)}"
+    return Response(content=data[start:stop], status_code=206, media_type=media_type, headers=headers)
+
+# Endpoints
+@app.post("/api/v1/convert", response_model=PatternResponse,
+          responses={200: {"content": {FRAME_MEDIA_TYPE: {}}}})
+async def convert_image(
+    request: ConversionRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    async_mode: bool = Query(False, alias="async"),
+    accept: Optional[str] = Header(None),
+    user_id: Optional[str] = Depends(optional_user_id)
+):
+    """
+    Konwertuje obraz na wzór hafciarski
+    
+    Z ?async=true zwraca od razu pattern_id (status "queued"); postęp i wynik
+    są dostępne przez /api/v1/patterns/{pattern_id} oraz /events (SSE).
+    Siatka: grid_encoding w żądaniu lub "Accept: application/octet-stream" (ramka binarna).
+    Z use_inventory i tokenem Firebase (Authorization: Bearer) używa inwentarza zalogowanego użytkownika.
+    """
+    return await start_conversion(request, background_tasks, response, async_mode, accept,
+                                  user_id=user_id)
+
+@app.post("/api/v1/convert/upload", response_model=PatternResponse,
+          responses={200: {"content": {FRAME_MEDIA_TYPE: {}}}})
+async def convert_upload(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    image: UploadFile = File(...),
+    options: str = Form("{}"),
+    async_mode: bool = Query(False, alias="async"),
+    accept: Optional[str] = Header(None),
+    user_id: Optional[str] = Depends(optional_user_id)
+):
+    """
+    Konwertuje przesłany obraz (multipart/form-data) bez pobierania go z image_url
+    
+    Pola: image - plik obrazu, options - JSON z ustawieniami jak w /api/v1/convert
+    (bez image_url). Odpowiedź i tryb ?async=true jak w /api/v1/convert.
+    Żądanie większe niż MAX_IMAGE_SIZE_MB (+ narzut formularza) dostaje 413, zanim
+    formularz zostanie sparsowany.
+    """
+    try:
+        request = ConversionOptions.model_validate_json(options)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    
+    async def chunks():
+        while chunk := await image.read(UPLOAD_CHUNK_BYTES):
+            yield chunk
+    
+    try:
+        image_data = await read_image_stream(chunks(), image_fetcher.max_bytes)
+    except FetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Invalid upload: {str(e)}")
+    finally:
+        await image.close()
+    
+    return await start_conversion(request, background_tasks, response, async_mode, accept, image_data,
+                                  user_id=user_id)
+
 @app.get("/api/v1/threads", response_model=List[ThreadInfo])
 async def get_threads(brand: Optional[str] = None):
     """
-    Pobiera listę dostępnych nici
+    Pobiera listę dostępnych nici (gotowy JSON ze snapshotu katalogu)
     """
     try:
-        threads_data = get_all_threads(brand=brand)
-        
-        # Konwersja do ThreadInfo model
-        threads = []
-        for t in threads_data:
-            threads.append(ThreadInfo(
-                thread_id=t["thread_id"],
-                brand=t["brand"],
-                color_code=t["color_code"],
-                color_name=t["color_name"],
-                rgb=t["rgb"],
-                hex_color=t["hex_color"]
-            ))
-        
-        return threads
+        catalog = get_catalog()
+        if brand is None:
+            content = catalog.thread_info_json
+        else:
+            view = catalog.brand(brand)
+            content = view.thread_info_json if view is not None else b"[]"
+        return Response(content=content, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load threads: {str(e)}")
 
-@app.get("/api/v1/patterns/{pattern_id}")
-async def get_pattern(pattern_id: str):
+@app.post("/api/v1/threads/convert", response_model=ThreadConversionResponse)
+async def convert_threads(request: ThreadConversionRequest):
     """
-    Pobiera szczegóły wzoru
+    Zamienia kody nici jednej marki na najbliższe odpowiedniki w innej (np. Anchor → DMC)
+    
+    Do MAX_BULK_CODES kodów w jednym żądaniu; każdy to odczyt z prekomputowanej
+    tabeli odpowiedników katalogu, bez skanowania bazy.
     """
-    # TODO: Pobieranie z Firestore
-    raise HTTPException(status_code=404, detail="Pattern not found")
+    catalog = get_catalog()
+    try:
+        # Marki i metryka sprawdzane od razu - także przy pustej liście kodów
+        _, target, metric = catalog.conversion_pair(request.from_brand, request.to_brand, request.metric)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    conversions = []
+    for code in request.codes:
+        matches = catalog.equivalents(request.from_brand, request.to_brand, code,
+                                      metric=metric, top_k=request.top_k)
+        conversions.append(ThreadConversion(
+            color_code=code,
+            found=matches is not None,
+            matches=[
+                ThreadMatch(
+                    thread=ThreadInfo(
+                        thread_id=thread.thread_id,
+                        brand=thread.brand,
+                        color_code=thread.color_code,
+                        color_name=thread.color_name,
+                        rgb=thread.rgb,
+                        hex_color=catalog.hex_colors[target.start + target.code_index[thread.color_code]]
+                    ),
+                    delta_e=round(delta_e, 2)
+                )
+                for thread, delta_e in matches or []
+            ]
+        ))
+    
+    return ThreadConversionResponse(from_brand=request.from_brand, to_brand=request.to_brand,
+                                    metric=metric, conversions=conversions)
+
+@app.get("/api/v1/patterns/{pattern_id}", response_model=PatternResponse,
+         responses={200: {"content": {FRAME_MEDIA_TYPE: {}}}})
+async def get_pattern(pattern_id: str,
+                      grid_encoding: str = "json",
+                      accept: Optional[str] = Header(None)):
+    """
+    Pobiera szczegóły wzoru (status, etap i postęp konwersji, wynik gdy gotowy)
+    """
+    check_grid_encoding(grid_encoding)
+    job = job_store.get(pattern_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    return render_pattern(job_to_response(job), grid_encoding, accept)
 
-@app.post("/api/v1/patterns/{pattern_id}/export-pdf")
-async def export_pdf(pattern_id: str):
+@app.get("/api/v1/patterns/{pattern_id}/events")
+async def pattern_events(pattern_id: str):
+    """
+    Strumień postępu konwersji (Server-Sent Events)
+    Wysyła zdarzenie "progress" przy każdej zmianie etapu i kończy na ready/failed
+    """
+    if job_store.get(pattern_id) is None:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    
+    async def event_stream():
+        last_state = None
+        while True:
+            job = job_store.get(pattern_id)
+            if job is None:
+                return
+            state = (job["status"], job["stage"])
+            if state != last_state:
+                last_state = state
+                event = {k: job[k] for k in ("pattern_id", "status", "stage", "progress", "error")}
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+def log_pdf_stats(pattern_id: str, stats: PdfStats) -> None:
+    logger.info("PDF %s rendered: %d pages, %d bytes, %.1f ms/page",
+                pattern_id, stats.pages, stats.bytes, stats.mean_page_ms)
+
+@app.api_route("/api/v1/patterns/{pattern_id}/export-pdf", methods=["GET", "POST"])
+async def export_pdf(pattern_id: str,
+                     range_header: Optional[str] = Header(None, alias="Range"),
+                     if_range: Optional[str] = Header(None),
+                     if_none_match: Optional[str] = Header(None)):
     """
     Generuje PDF wzoru (wymaga tokenów)
+    
+    Gotowe PDF-y są cache'owane po hashu treści (siatka, paleta, układ), ETag to ten hash.
+    Z cache obsługiwane są If-None-Match (304) i Range (206 - wznawianie pobierania).
+    Przy pierwszym renderowaniu strony są wysyłane po kolei (StreamingResponse).
     """
-    # TODO: Pobierz pattern z bazy (na razie demo)
-    # Demo pattern (do podmiany na realne pobieranie)
-    pattern = {
-        "name": f"Wzór {pattern_id}",
-        "dimensions": {"width_stitches": 100, "height_stitches": 80},
-        "color_palette": [
-            {"rgb": [255,0,0], "thread_brand": "DMC", "thread_code": "321", "thread_name": "Red", "symbol": "A"},
-            {"rgb": [0,255,0], "thread_brand": "DMC", "thread_code": "702", "thread_name": "Green", "symbol": "B"},
-            {"rgb": [0,0,255], "thread_brand": "DMC", "thread_code": "797", "thread_name": "Blue", "symbol": "C"},
-        ],
-    }
-    pdf_bytes = generate_pattern_pdf(pattern)
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=pattern_{pattern_id}.pdf"})
+    job = job_store.get(pattern_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    if job["status"] != "ready":
+        raise HTTPException(status_code=409, detail=f"Pattern is {job['status']}")
+    
+    pattern = {"name": f"Wzór {pattern_id}", **job["result"]}
+    cache_key = pdf_cache_key(pattern)
+    etag = f'"{cache_key[:32]}"'
+    headers = {"ETag": etag, "Content-Disposition": f"attachment; filename=pattern_{pattern_id}.pdf"}
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    if if_range and if_range.strip() != etag:
+        range_header = None  # the client's partial copy is stale - send everything
+    
+    cached = pdf_cache.get(cache_key)
+    if cached is not None:
+        return bytes_response(cached, "application/pdf", {**headers, "X-Cache": "HIT"}, range_header)
+    
+    stats = PdfStats()
+    executor = get_pdf_executor()
+    if range_header:
+        # A range needs the total length up front - render the whole document first
+        document = await run_in_threadpool(
+            lambda: b"".join(iter_pattern_pdf(pattern, stats, executor=executor))
+        )
+        pdf_cache.set(cache_key, document)
+        log_pdf_stats(pattern_id, stats)
+        return bytes_response(document, "application/pdf", {**headers, "X-Cache": "MISS"}, range_header)
+    
+    def pdf_stream():
+        # Sync generator - Starlette iterates it in a worker thread. The chunks are kept
+        # for the cache unless the document outgrows the memory budget.
+        kept, kept_bytes = [], 0
+        for chunk in iter_pattern_pdf(pattern, stats, executor=executor):
+            if kept is not None:
+                kept.append(chunk)
+                kept_bytes += len(chunk)
+                if kept_bytes > pdf_cache.memory.max_bytes:
+                    kept = None
+            yield chunk
+        if kept is not None:
+            pdf_cache.set(cache_key, b"".join(kept))
+        log_pdf_stats(pattern_id, stats)
+    
+    return StreamingResponse(pdf_stream(), media_type="application/pdf",
+                             headers={**headers, "X-Cache": "MISS"})
+
+@app.get("/api/v1/user/inventory", response_model=InventoryResponse)
+async def get_user_inventory(user_id: str = Depends(current_user_id)):
+    """
+    Pobiera inwentarz nici zalogowanego użytkownika (Authorization: Bearer <token Firebase>)
+    """
+    threads = await run_in_threadpool(inventory_store.get, user_id)
+    return InventoryResponse(user_id=user_id, threads=sorted(threads))
 
-@app.get("/api/v1/user/inventory")
-async def get_user_inventory():
+@app.put("/api/v1/user/inventory", response_model=InventoryResponse)
+async def update_user_inventory(update: InventoryUpdate, user_id: str = Depends(current_user_id)):
     """
-    Pobiera inwentarz nici użytkownika
+    Zastępuje inwentarz nici zalogowanego użytkownika; nieznane thread_id dają 400
     """
-    # TODO: Implementacja z Firestore
-    return {"threads": []}
+    found = await get_threads_by_ids_async(update.threads)
+    unknown = sorted(set(update.threads) - set(found))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown thread_id: {', '.join(unknown[:10])}")
+    threads = await run_in_threadpool(inventory_store.replace, user_id, update.threads)
+    return InventoryResponse(user_id=user_id, threads=sorted(threads))
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,49 +1,352 @@
-import io
+import hashlib
+import json
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
+from grid_codec import unpack_grid
+from pdf_stream import PageContent, PdfStreamWriter, encode_text, fmt
 
-def generate_pattern_pdf(pattern: dict) -> bytes:
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+# Chart layout (points): cell side, page margin, ruler band, title band
+CELL_SIZE = 8.0
+MARGIN = 36.0
+RULER_SIZE = 18.0
+TITLE_SIZE = 24.0
+# Rows/columns repeated from the neighbouring page, and the major grid line interval
+PAGE_OVERLAP = 2
+MAJOR_EVERY = 10
+# Color key at the bottom of every chart page: entry width and line height
+KEY_ENTRY_WIDTH = 52.0
+KEY_LINE_HEIGHT = 10.0
+# Bump whenever the rendered output changes for the same pattern (invalidates cached PDFs)
+LAYOUT_VERSION = 1
+# Chart pages below this count are rendered inline even when an executor is given
+PARALLEL_MIN_PAGES = 4
+# Chart pages submitted ahead of the one being streamed
+PARALLEL_PREFETCH = 8
+
+@dataclass
+class PdfStats:
+    """Render statistics filled in while the document is streamed"""
+    pages: int = 0
+    bytes: int = 0
+    page_seconds: List[float] = field(default_factory=list)
+
+    @property
+    def mean_page_ms(self) -> float:
+        return 1000 * sum(self.page_seconds) / len(self.page_seconds) if self.page_seconds else 0.0
+
+def pdf_cache_key(pattern: dict, page_size: Tuple[float, float] = A4) -> str:
     """
-    Generates a PDF for the given pattern dict and returns PDF bytes.
-    Layout: Cover, Color Legend, Symbol Chart (grid), Material List.
-    """
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # Cover Page
-    c.setFont("Helvetica-Bold", 24)
-    c.drawCentredString(width/2, height-60, pattern.get("name", "Wzór Mulina"))
-    c.setFont("Helvetica", 14)
-    c.drawCentredString(width/2, height-90, f"{pattern['dimensions']['width_stitches']} x {pattern['dimensions']['height_stitches']} ściegów")
-    c.drawCentredString(width/2, height-110, f"{pattern['color_palette'].__len__()} kolorów")
-    c.showPage()
-
-    # Color Legend
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(40, height-60, "Legenda kolorów")
-    c.setFont("Helvetica", 12)
-    y = height-90
-    for idx, color in enumerate(pattern['color_palette']):
-        c.setFillColorRGB(*(v/255 for v in color['rgb']))
-        c.rect(40, y-8, 16, 16, fill=1)
-        c.setFillColor(colors.black)
-        c.drawString(62, y, f"{color['thread_brand']} {color['thread_code']} {color['thread_name']}  Symbol: {color['symbol']}")
+    Content address of a rendered PDF: SHA-256 of the grid cells, everything from the
+    pattern that is printed (name, dimensions, palette) and the layout settings
+    """
+    grid = unpack_grid(pattern["grid_data"])
+    digest = hashlib.sha256(np.ascontiguousarray(grid, dtype="<u2").tobytes())
+    printed = {
+        "name": pattern.get("name", "Wzór Mulina"),
+        "shape": list(grid.shape),
+        "dimensions": pattern["dimensions"],
+        "palette": [{k: color[k] for k in ("rgb", "symbol", "thread_brand", "thread_code", "thread_name")}
+                    for color in pattern["color_palette"]],
+        "layout": [LAYOUT_VERSION, list(page_size), CELL_SIZE, MARGIN, RULER_SIZE, TITLE_SIZE,
+                   PAGE_OVERLAP, MAJOR_EVERY, KEY_ENTRY_WIDTH, KEY_LINE_HEIGHT],
+    }
+    digest.update(json.dumps(printed, sort_keys=True, separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+def page_tiles(total: int, per_page: int, overlap: int = PAGE_OVERLAP) -> List[Tuple[int, int]]:
+    """[start, stop) ranges covering 0..total, consecutive ranges share `overlap` cells"""
+    step = max(per_page - overlap, 1)
+    tiles = [(0, min(per_page, total))]
+    while tiles[-1][1] < total:
+        start = tiles[-1][0] + step
+        tiles.append((start, min(start + per_page, total)))
+    return tiles
+
+def key_height(n_colors: int, page_size: Tuple[float, float] = A4) -> float:
+    """Height of the color key for n_colors entries"""
+    per_line = max(int((page_size[0] - 2 * MARGIN) // KEY_ENTRY_WIDTH), 1)
+    return -(-n_colors // per_line) * KEY_LINE_HEIGHT + 4
+
+def chart_capacity(page_size: Tuple[float, float] = A4,
+                   cell: float = CELL_SIZE,
+                   reserved: float = 0.0) -> Tuple[int, int]:
+    """(columns, rows) of stitches that fit on one chart page (reserved - height taken by the key)"""
+    width, height = page_size
+    columns = int((width - 2 * MARGIN - RULER_SIZE) // cell)
+    rows = int((height - 2 * MARGIN - RULER_SIZE - TITLE_SIZE - reserved) // cell)
+    return columns, rows
+
+def _symbol_color(rgb) -> Tuple[int, int, int]:
+    """Black or white, whichever reads better on the cell color"""
+    luminance = 0.299 * rgb[0] + 0.587 * rgb[1] + 0.114 * rgb[2]
+    return (0, 0, 0) if luminance > 140 else (255, 255, 255)
+
+def _row_runs(tile: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Horizontal runs of equal cells in all rows at once: (rows, starts, lengths, values)"""
+    n_rows, n_cols = tile.shape
+    change = np.ones((n_rows, n_cols), dtype=bool)
+    change[:, 1:] = tile[:, 1:] != tile[:, :-1]
+    flat_starts = np.flatnonzero(change)
+    # Every row opens with a run, so consecutive starts never span two rows
+    lengths = np.diff(np.append(flat_starts, tile.size))
+    rows, starts = np.divmod(flat_starts, n_cols)
+    return rows, starts, lengths, tile.ravel()[flat_starts]
+
+def render_chart_page(tile: np.ndarray,
+                      palette: List[dict],
+                      origin: Tuple[int, int],
+                      title: str,
+                      page_size: Tuple[float, float] = A4,
+                      cell: float = CELL_SIZE) -> bytes:
+    """
+    Content stream of one chart page: a grid tile with rulers
+
+    Every color is one filled path (one rectangle per horizontal run) and every
+    symbol is one text object, whatever the number of cells. Pure function of its
+    arguments - pages can be rendered in separate processes.
+
+    Args:
+        tile: Part of the grid shown on the page
+        origin: (row, column) of the tile's top-left cell in the whole grid
+    """
+    width, height = page_size
+    row0, col0 = origin
+    n_rows, n_cols = tile.shape
+    left = MARGIN + RULER_SIZE
+    top = height - MARGIN - TITLE_SIZE - RULER_SIZE
+    content = PageContent()
+    content.text(MARGIN, height - MARGIN - 14, title, font="F2", size=12)
+
+    # Ruler bands; repeated (overlapping) ranges are shaded
+    content.raw("0.93 0.93 0.93 rg\n")
+    if col0 > 0:
+        content.raw(f"{fmt(left)} {fmt(top)} {fmt(PAGE_OVERLAP * cell)} {fmt(RULER_SIZE)} re f\n")
+    if row0 > 0:
+        content.raw(f"{fmt(MARGIN)} {fmt(top - PAGE_OVERLAP * cell)} {fmt(RULER_SIZE)} {fmt(PAGE_OVERLAP * cell)} re f\n")
+
+    # Cell colors: one path per palette entry
+    run_rows, run_starts, run_lengths, run_values = _row_runs(tile)
+    order = np.argsort(run_values, kind="stable")
+    xs = (left + run_starts * cell)[order].tolist()
+    ys = (top - (run_rows + 1) * cell)[order].tolist()
+    ws = (run_lengths * cell)[order].tolist()
+    values = run_values[order]
+    present, bounds = np.unique(values, return_index=True)
+    bounds = np.append(bounds, len(values)).tolist()
+    for i, index in enumerate(present.tolist()):
+        path = "\n".join(f"{x:g} {y:g} {w:g} {cell:g} re"
+                         for x, y, w in zip(xs[bounds[i]:bounds[i + 1]], ys[bounds[i]:bounds[i + 1]],
+                                            ws[bounds[i]:bounds[i + 1]]))
+        content.fill_rgb(palette[index]["rgb"]).raw(path + " f\n")
+
+    # Symbols: one text object per symbol, relative moves between its cells
+    font_size = cell * 0.75
+    flat = tile.ravel()
+    cells = np.argsort(flat, kind="stable")
+    cell_bounds = np.searchsorted(flat[cells], np.append(present, np.iinfo(np.int64).max)).tolist()
+    for i, index in enumerate(present.tolist()):
+        symbol = palette[index]["symbol"]
+        offset = (cell - stringWidth(symbol, FONTS["F2"], font_size)) / 2
+        y_cell, x_cell = np.divmod(cells[cell_bounds[i]:cell_bounds[i + 1]], n_cols)
+        x = left + x_cell * cell + offset
+        y = top - (y_cell + 1) * cell + cell * 0.22
+        dx = np.diff(x, prepend=0.0).round(2).tolist()
+        dy = np.diff(y, prepend=0.0).round(2).tolist()
+        literal = encode_text(symbol).decode("latin-1")
+        moves = "\n".join(f"{a:g} {b:g} Td {literal} Tj" for a, b in zip(dx, dy))
+        content.fill_rgb(_symbol_color(palette[index]["rgb"]))
+        content.raw(f"BT /F2 {fmt(font_size)} Tf\n{moves}\nET\n")
+
+    # Grid: thin lines every cell, thick every MAJOR_EVERY stitches (absolute numbering)
+    right, bottom = left + n_cols * cell, top - n_rows * cell
+    thin, thick = [], []
+    for c in range(n_cols + 1):
+        x = fmt(left + c * cell)
+        (thick if (col0 + c) % MAJOR_EVERY == 0 else thin).append(f"{x} {fmt(top)} m {x} {fmt(bottom)} l")
+    for r in range(n_rows + 1):
+        y = fmt(top - r * cell)
+        (thick if (row0 + r) % MAJOR_EVERY == 0 else thin).append(f"{fmt(left)} {y} m {fmt(right)} {y} l")
+    content.raw("0.6 0.6 0.6 RG 0.25 w\n" + "\n".join(thin) + " S\n")
+    content.raw("0 0 0 RG 0.8 w\n" + "\n".join(thick) + " S\n")
+    content.raw(f"{fmt(left)} {fmt(bottom)} {fmt(right - left)} {fmt(top - bottom)} re S\n")
+
+    # Ruler numbers at the major lines
+    content.fill_rgb((0, 0, 0))
+    for c in range(n_cols + 1):
+        if (col0 + c) % MAJOR_EVERY == 0 and col0 + c > 0:
+            label = str(col0 + c)
+            x = left + c * cell - stringWidth(label, FONTS["F1"], 6) / 2
+            content.text(x, top + 6, label, size=6)
+    for r in range(n_rows + 1):
+        if (row0 + r) % MAJOR_EVERY == 0 and row0 + r > 0:
+            label = str(row0 + r)
+            x = left - 3 - stringWidth(label, FONTS["F1"], 6)
+            content.text(x, top - r * cell - 2, label, size=6)
+
+    return content.getvalue()
+
+def render_key(palette: List[dict], page_size: Tuple[float, float] = A4) -> bytes:
+    """
+    Color key (swatch, symbol, thread code) in the bottom margin of chart pages
+
+    Written once per document as a Form XObject and referenced by every chart page.
+    """
+    width, _ = page_size
+    per_line = max(int((width - 2 * MARGIN) // KEY_ENTRY_WIDTH), 1)
+    lines = -(-len(palette) // per_line)
+    content = PageContent().raw("0.4 0.4 0.4 RG 0.3 w\n")
+    for idx, color in enumerate(palette):
+        line, column = divmod(idx, per_line)
+        x = MARGIN + column * KEY_ENTRY_WIDTH
+        y = MARGIN + (lines - 1 - line) * KEY_LINE_HEIGHT
+        content.fill_rgb(color["rgb"]).raw(f"{fmt(x)} {fmt(y)} 7 7 re B\n").fill_rgb((0, 0, 0))
+        content.text(x + 9, y + 1, f"{color['symbol']} {color['thread_code']}", font="F1", size=6)
+    return content.getvalue()
+
+def _render_chart_task(tile: np.ndarray,
+                       palette: List[dict],
+                       origin: Tuple[int, int],
+                       title: str,
+                       page_size: Tuple[float, float]) -> Tuple[bytes, float]:
+    """Worker entry point: compressed chart page content and its render time"""
+    started = time.perf_counter()
+    content = zlib.compress(render_chart_page(tile, palette, origin, title, page_size) + b"/Key Do\n", 6)
+    return content, time.perf_counter() - started
+
+def render_cover_page(pattern: dict, page_size: Tuple[float, float] = A4) -> bytes:
+    width, height = page_size
+    content = PageContent()
+    name = pattern.get("name", "Wzór Mulina")
+    dims = pattern["dimensions"]
+    lines = [
+        (name, "F2", 24, height - 60),
+        (f"{dims['width_stitches']} x {dims['height_stitches']} ściegów", "F1", 14, height - 90),
+        (f"{len(pattern['color_palette'])} kolorów", "F1", 14, height - 110),
+    ]
+    for text, font, size, y in lines:
+        content.text((width - stringWidth(text, FONTS[font], size)) / 2, y, text, font=font, size=size)
+    return content.getvalue()
+
+def render_legend_pages(pattern: dict,
+                        counts: np.ndarray,
+                        page_size: Tuple[float, float] = A4) -> Iterator[bytes]:
+    """Color legend with the stitch count per color (material list)"""
+    width, height = page_size
+    content = PageContent().text(40, height - 60, "Legenda kolorów", font="F2", size=18)
+    y = height - 90
+    for idx, color in enumerate(pattern["color_palette"]):
+        content.fill_rgb(color["rgb"]).raw(f"40 {fmt(y - 4)} 16 16 re f\n").fill_rgb((0, 0, 0))
+        content.text(62, y, f"{color['symbol']}  {color['thread_brand']} {color['thread_code']} "
+                            f"{color['thread_name']}  -  {int(counts[idx])} ściegów", size=12)
         y -= 22
         if y < 80:
-            c.showPage()
-            y = height-60
-    c.showPage()
-
-    # TODO: Symbol Chart (grid) and Material List
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(40, height-60, "Symbol Chart i Materiały - WKRÓTCE")
-    c.showPage()
-
-    c.save()
-    buffer.seek(0)
-    return buffer.read()
+            yield content.getvalue()
+            content = PageContent()
+            y = height - 60
+    yield content.getvalue()
+
+def iter_pattern_pdf(pattern: dict,
+                     stats: Optional[PdfStats] = None,
+                     page_size: Tuple[float, float] = A4,
+                     executor: Optional[Executor] = None) -> Iterator[bytes]:
+    """
+    Streams the PDF of a pattern chunk by chunk (one chunk per page)
+
+    Layout: cover, color legend with stitch counts, symbol chart split into
+    overlapping page tiles with a shared color key. Fonts and the key are written
+    once and referenced by every page.
+
+    With an executor (process pool) chart pages are rendered in parallel, a few pages
+    ahead of the one being sent, and written in order - memory stays bounded by the
+    prefetch window.
+
+    Args:
+        pattern: name, dimensions, color_palette and grid_data (any grid_codec encoding)
+        stats: Filled with page count, per-page render time and total size
+        executor: Optional pool for chart pages
+    """
+    stats = stats if stats is not None else PdfStats()
+    grid = unpack_grid(pattern["grid_data"])
+    palette = pattern["color_palette"]
+    counts = np.bincount(grid.ravel(), minlength=len(palette))
+    writer = PdfStreamWriter(page_size, FONTS)
+
+    def emit_page(content: bytes, seconds: float, **kwargs) -> bytes:
+        chunk = writer.page(content, **kwargs)
+        stats.page_seconds.append(seconds)
+        stats.pages = writer.page_count
+        stats.bytes = writer.position
+        return chunk
+
+    def timed(render) -> Tuple[bytes, float]:
+        started = time.perf_counter()
+        return render(), time.perf_counter() - started
+
+    yield writer.header()
+    yield emit_page(*timed(lambda: render_cover_page(pattern, page_size)))
+    legends = render_legend_pages(pattern, counts, page_size)
+    while True:
+        content, seconds = timed(lambda: next(legends, None))
+        if content is None:
+            break
+        yield emit_page(content, seconds)
+
+    key_id, key_chunk = writer.form_xobject(render_key(palette, page_size))
+    yield key_chunk
+
+    columns, rows = chart_capacity(page_size, reserved=key_height(len(palette), page_size))
+    row_tiles = page_tiles(grid.shape[0], rows)
+    col_tiles = page_tiles(grid.shape[1], columns)
+    total = len(row_tiles) * len(col_tiles)
+    jobs = []
+    for row_range in row_tiles:
+        for col_range in col_tiles:
+            title = (f"Schemat {len(jobs) + 1}/{total} - kolumny {col_range[0] + 1}-{col_range[1]}, "
+                     f"rzędy {row_range[0] + 1}-{row_range[1]}")
+            tile = grid[row_range[0]:row_range[1], col_range[0]:col_range[1]]
+            jobs.append((tile, palette, (row_range[0], col_range[0]), title, page_size))
+
+    if executor is None or total < PARALLEL_MIN_PAGES:
+        results = (_render_chart_task(*job) for job in jobs)
+    else:
+        results = _prefetch(executor, jobs)
+    for content, seconds in results:
+        yield emit_page(content, seconds, xobjects={"Key": key_id}, deflated=True)
+
+    yield writer.close(title=pattern.get("name", "Wzór Mulina"))
+    stats.bytes = writer.position
+
+def _prefetch(executor: Executor, jobs: List[tuple]) -> Iterator[Tuple[bytes, float]]:
+    """Results of _render_chart_task in job order, keeping PARALLEL_PREFETCH jobs submitted"""
+    pending = deque()
+    queued = iter(jobs)
+    try:
+        for job in queued:
+            pending.append(executor.submit(_render_chart_task, *job))
+            if len(pending) >= PARALLEL_PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Client went away mid-stream - drop the pages nobody will read
+        for future in pending:
+            future.cancel()
+
+def generate_pattern_pdf(pattern: dict) -> bytes:
+    """
+    Generates a PDF for the given pattern dict and returns PDF bytes.
+    Layout: Cover, Color Legend with stitch counts (material list), Symbol Chart (grid).
+    Use iter_pattern_pdf to stream large patterns instead.
+    """
+    return b"".join(iter_pattern_pdf(pattern))
@@ -0,0 +1,185 @@
+"""
+Incremental PDF writer
+Objects are serialized as soon as they are complete and handed back as byte chunks;
+the writer keeps only their offsets for the cross-reference table, so a document can be
+streamed page by page without ever holding it in memory.
+
+Text uses the standard Helvetica fonts (not embedded) with WinAnsiEncoding plus
+a /Differences table for Polish letters.
+"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Polish letters outside WinAnsiEncoding, remapped onto codes 0x80+ (ó/Ó are in WinAnsi)
+_POLISH_GLYPHS = (
+    ("ą", "aogonek"), ("ć", "cacute"), ("ę", "eogonek"), ("ł", "lslash"),
+    ("ń", "nacute"), ("ś", "sacute"), ("ź", "zacute"), ("ż", "zdotaccent"),
+    ("Ą", "Aogonek"), ("Ć", "Cacute"), ("Ę", "Eogonek"), ("Ł", "Lslash"),
+    ("Ń", "Nacute"), ("Ś", "Sacute"), ("Ź", "Zacute"), ("Ż", "Zdotaccent"),
+)
+_POLISH_CODES = {char: 0x80 + i for i, (char, _) in enumerate(_POLISH_GLYPHS)}
+_REMAPPED = set(_POLISH_CODES.values())
+
+FONT_ENCODING = (
+    "<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences [128 "
+    + " ".join(f"/{glyph}" for _, glyph in _POLISH_GLYPHS)
+    + "] >>"
+)
+
+def encode_text(text: str) -> bytes:
+    """PDF string literal (with parentheses) in the font encoding; unknown characters become '?'"""
+    out = bytearray(b"(")
+    for char in text:
+        code = _POLISH_CODES.get(char)
+        if code is None:
+            encoded = char.encode("cp1252", errors="replace")
+            code = ord("?") if encoded[0] in _REMAPPED else encoded[0]
+        if code in (0x28, 0x29, 0x5C):  # ( ) \
+            out.append(0x5C)
+        out.append(code)
+    out.append(0x29)
+    return bytes(out)
+
+def fmt(value: float) -> str:
+    """Compact number for content streams"""
+    return f"{value:.2f}".rstrip("0").rstrip(".") if value != int(value) else str(int(value))
+
+class PdfStreamWriter:
+    """
+    Writes a PDF as a sequence of chunks
+
+    Usage: header(), then page(...) per page (each returns the bytes to send),
+    and finally close() with the document trailer.
+    """
+
+    def __init__(self, page_size: Tuple[float, float], fonts: Dict[str, str]):
+        self.page_size = page_size
+        self.position = 0
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 1
+        self._page_ids: List[int] = []
+
+        self.catalog_id = self.reserve()
+        self.pages_id = self.reserve()
+        self.encoding_id = self.reserve()
+        self.font_ids = {name: self.reserve() for name in fonts}
+        self._fonts = fonts
+
+    def reserve(self) -> int:
+        """Allocates an object number (the object itself may be written later)"""
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self.position += len(chunk)
+        return chunk
+
+    def object(self, obj_id: int, body: str) -> bytes:
+        self._offsets[obj_id] = self.position
+        return self._emit(f"{obj_id} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+
+    def stream(self, obj_id: int, data: bytes, compress: bool = True,
+               deflated: bool = False, extra: str = "") -> bytes:
+        """
+        Stream object; deflated=True marks data that is already zlib-compressed
+        (e.g. rendered in a worker process)
+        """
+        if compress and not deflated:
+            data = zlib.compress(data, 6)
+        filtered = " /Filter /FlateDecode" if compress or deflated else ""
+        head = f"{obj_id} 0 obj\n<< {extra}/Length {len(data)}{filtered} >>\nstream\n"
+        self._offsets[obj_id] = self.position
+        return self._emit(head.encode("latin-1") + data + b"\nendstream\nendobj\n")
+
+    def header(self) -> bytes:
+        chunks = [self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"),
+                  self.object(self.encoding_id, FONT_ENCODING)]
+        for name, base_font in self._fonts.items():
+            chunks.append(self.object(
+                self.font_ids[name],
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} /Encoding {self.encoding_id} 0 R >>"
+            ))
+        return b"".join(chunks)
+
+    def resources(self, xobjects: Optional[Dict[str, int]] = None) -> str:
+        fonts = " ".join(f"/{name} {obj_id} 0 R" for name, obj_id in self.font_ids.items())
+        resources = f"/Font << {fonts} >>"
+        if xobjects:
+            resources += " /XObject << " + " ".join(f"/{name} {obj_id} 0 R" for name, obj_id in xobjects.items()) + " >>"
+        return f"<< {resources} >>"
+
+    def form_xobject(self, content: bytes) -> Tuple[int, bytes]:
+        """
+        Writes content shared by many pages as a Form XObject (drawn with "/Name Do")
+
+        Returns:
+            (object number, chunk to send)
+        """
+        obj_id = self.reserve()
+        width, height = self.page_size
+        extra = (f"/Type /XObject /Subtype /Form /BBox [0 0 {fmt(width)} {fmt(height)}] "
+                 f"/Resources {self.resources()} ")
+        return obj_id, self.stream(obj_id, content, extra=extra)
+
+    def page(self, content: bytes, xobjects: Optional[Dict[str, int]] = None, deflated: bool = False) -> bytes:
+        """Writes one page (content stream + page object)"""
+        content_id, page_id = self.reserve(), self.reserve()
+        self._page_ids.append(page_id)
+        width, height = self.page_size
+        return self.stream(content_id, content, deflated=deflated) + self.object(
+            page_id,
+            f"<< /Type /Page /Parent {self.pages_id} 0 R /MediaBox [0 0 {fmt(width)} {fmt(height)}] "
+            f"/Resources {self.resources(xobjects)} /Contents {content_id} 0 R >>"
+        )
+
+    def close(self, title: str = "") -> bytes:
+        """Page tree, catalog, info, cross-reference table and trailer"""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        info_id = self.reserve()
+        chunks = [
+            self.object(self.pages_id, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>"),
+            self.object(self.catalog_id, f"<< /Type /Catalog /Pages {self.pages_id} 0 R >>"),
+            self.object(info_id, f"<< /Title {encode_text(title).decode('latin-1')} /Producer (Mulina) >>"),
+        ]
+
+        xref_offset = self.position
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            offset = self._offsets.get(obj_id)
+            lines.append(f"{offset:010d} 00000 n \n" if offset is not None else "0000000000 65535 f \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self.catalog_id} 0 R /Info {info_id} 0 R >>\n"
+                     f"startxref\n{xref_offset}\n%%EOF\n")
+        chunks.append(self._emit("".join(lines).encode("latin-1")))
+        return b"".join(chunks)
+
+class PageContent:
+    """Content stream builder (PDF operators, origin in the bottom-left corner)"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def raw(self, operators: str) -> "PageContent":
+        self._parts.append(operators.encode("latin-1"))
+        return self
+
+    def fill_rgb(self, rgb) -> "PageContent":
+        r, g, b = (fmt(v / 255) for v in rgb)
+        return self.raw(f"{r} {g} {b} rg\n")
+
+    def text(self, x: float, y: float, text: str, font: str = "F1", size: float = 12) -> "PageContent":
+        self._parts.append(f"BT /{font} {fmt(size)} Tf {fmt(x)} {fmt(y)} Td ".encode("latin-1")
+                           + encode_text(text) + b" Tj ET\n")
+        return self
+
+    def extend(self, chunk: bytes) -> "PageContent":
+        self._parts.append(chunk)
+        return self
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._parts)
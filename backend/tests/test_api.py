@@ -0,0 +1,469 @@
+"""
+API tests for the conversion endpoints
+"""
+import io
+import json
+
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+from cache import LRUByteCache, TieredCache
+from fetcher import ImageFetcher
+from grid_codec import decode_frame, unpack_grid
+from inventory import InventoryStore
+from worker_pool import ConversionPool
+
+def make_png(width: int = 40, height: int = 30) -> bytes:
+    """Three flat color blocks with a bit of noise"""
+    rng = np.random.default_rng(0)
+    img = np.zeros((height, width, 3), dtype=np.int16)
+    img[:, : width // 2] = (200, 30, 40)
+    img[:, width // 2:] = (20, 40, 200)
+    img[height // 2:] = (240, 240, 230)
+    img = np.clip(img + rng.integers(-8, 8, img.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def storage_stub(handler) -> ImageFetcher:
+    """Fetcher whose requests are answered by handler(request) instead of the network"""
+    return ImageFetcher(transport=httpx.MockTransport(handler))
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    image = make_png()
+    monkeypatch.setattr(main, "image_fetcher", storage_stub(
+        lambda request: httpx.Response(200, content=image, headers={"content-type": "image/png"})
+    ))
+    monkeypatch.setattr(main, "conversion_pool", ConversionPool(max_workers=0, max_queue=2))
+    monkeypatch.setattr(main, "result_cache", TieredCache(LRUByteCache(16 * 1024 * 1024)))
+    monkeypatch.setattr(main, "pdf_cache", TieredCache(LRUByteCache(16 * 1024 * 1024)))
+    monkeypatch.setattr(main, "inventory_store", InventoryStore(tmp_path / "inventory.db"))
+    monkeypatch.setattr(main, "token_verifier", verify_test_token)
+    return TestClient(main.app)
+
+TEST_TOKENS = {"token-alice": "alice", "token-bob": "bob"}
+
+def verify_test_token(id_token: str) -> str:
+    """Stands in for Firebase token verification (no network or credentials in tests)"""
+    if id_token not in TEST_TOKENS:
+        raise ValueError("Invalid ID token")
+    return TEST_TOKENS[id_token]
+
+def auth(user: str) -> dict:
+    return {"Authorization": f"Bearer token-{user}"}
+
+def conversion_payload(**overrides):
+    payload = {
+        "image_url": "https://example.com/image.png",
+        "pattern_type": "cross_stitch",
+        "max_colors": 3,
+        "thread_brand": "DMC",
+    }
+    payload.update(overrides)
+    return payload
+
+def test_convert_returns_pattern(client):
+    response = client.post("/api/v1/convert", json=conversion_payload())
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert len(data["color_palette"]) == 3
+    assert data["grid_data"]["width"] == 40
+    assert len(data["grid_data"]["grid"]) == 30
+
+def test_convert_result_cache(client):
+    first = client.post("/api/v1/convert", json=conversion_payload())
+    second = client.post("/api/v1/convert", json=conversion_payload(image_url="https://cdn.example.com/copy.png"))
+    other = client.post("/api/v1/convert", json=conversion_payload(max_colors=2))
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert other.headers["x-cache"] == "MISS"
+    # Same bytes + settings → same stable pattern id and identical result
+    assert first.json()["pattern_id"] == second.json()["pattern_id"]
+    assert first.json()["grid_data"] == second.json()["grid_data"]
+    assert other.json()["pattern_id"] != first.json()["pattern_id"]
+
+@pytest.mark.parametrize("quantizer", ["wu", "median_cut", "direct", "thread_palette"])
+def test_convert_quantizer_backends(client, quantizer):
+    response = client.post("/api/v1/convert", json=conversion_payload(quantizer=quantizer))
+
+    assert response.status_code == 200
+    data = response.json()
+    assert 1 <= len(data["color_palette"]) <= 3
+    assert data["quantization_error"] >= 0
+
+def test_convert_with_dithering(client):
+    plain = client.post("/api/v1/convert", json=conversion_payload()).json()
+    dithered = client.post("/api/v1/convert",
+                           json=conversion_payload(enable_dithering=True, dither_method="atkinson")).json()
+
+    assert dithered["pattern_id"] != plain["pattern_id"]
+    grid = np.array(dithered["grid_data"]["grid"])
+    assert grid.shape == (30, 40)
+    assert grid.max() < len(dithered["color_palette"])
+
+def test_convert_compact_grid_encodings(client):
+    plain = client.post("/api/v1/convert", json=conversion_payload()).json()
+    rle = client.post("/api/v1/convert", json=conversion_payload(grid_encoding="rle")).json()
+    binary = client.post("/api/v1/convert", json=conversion_payload(),
+                         headers={"Accept": "application/octet-stream"})
+
+    grid = np.array(plain["grid_data"]["grid"])
+    assert rle["grid_data"]["encoding"] == "rle"
+    np.testing.assert_array_equal(unpack_grid(rle["grid_data"]), grid)
+
+    assert binary.headers["content-type"] == "application/octet-stream"
+    header, frame_grid = decode_frame(binary.content)
+    assert header["pattern_id"] == plain["pattern_id"]
+    assert header["color_palette"] == plain["color_palette"]
+    np.testing.assert_array_equal(frame_grid, grid)
+
+    stored = client.get(f"/api/v1/patterns/{plain['pattern_id']}", params={"grid_encoding": "zlib"})
+    np.testing.assert_array_equal(unpack_grid(stored.json()["grid_data"]), grid)
+
+def test_convert_rejects_unknown_grid_encoding(client):
+    response = client.post("/api/v1/convert", json=conversion_payload(grid_encoding="lz4"))
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("option", [
+    {"quantizer": "kmeanz"},
+    {"metric": "cie2001"},
+    {"dither_method": "random"},
+    {"thread_brand": "Coats"},
+])
+@pytest.mark.parametrize("async_mode", ["false", "true"])
+def test_convert_rejects_unknown_options(client, option, async_mode):
+    response = client.post(f"/api/v1/convert?async={async_mode}", json=conversion_payload(**option))
+
+    assert response.status_code == 400
+    assert list(option.values())[0] in response.json()["detail"]
+
+@pytest.mark.parametrize("option", [{"max_colors": 0}, {"aida_count": 0}, {"max_colors": -3}])
+def test_convert_rejects_non_positive_sizes(client, option):
+    assert client.post("/api/v1/convert", json=conversion_payload(**option)).status_code == 422
+
+def test_convert_normalizes_metric_case(client):
+    lower = client.post("/api/v1/convert", json=conversion_payload(metric="ciede2000"))
+    upper = client.post("/api/v1/convert", json=conversion_payload(metric="CIEDE2000"))
+
+    assert upper.status_code == 200
+    assert upper.json()["pattern_id"] == lower.json()["pattern_id"]
+
+def test_convert_rejects_when_pool_saturated(client, monkeypatch):
+    pool = ConversionPool(max_workers=0, max_queue=0)
+    pool._in_flight = pool.capacity
+    monkeypatch.setattr(main, "conversion_pool", pool)
+
+    response = client.post("/api/v1/convert", json=conversion_payload())
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+def test_async_convert_job_lifecycle(client, monkeypatch):
+    from jobs import InMemoryJobStore
+    store = InMemoryJobStore()
+    stages = []
+    original_advance = store.advance
+    monkeypatch.setattr(store, "advance", lambda pid, stage: stages.append(stage) or original_advance(pid, stage))
+    monkeypatch.setattr(main, "job_store", store)
+
+    submitted = client.post("/api/v1/convert?async=true", json=conversion_payload())
+
+    assert submitted.status_code == 202
+    pattern_id = submitted.json()["pattern_id"]
+    assert submitted.json()["status"] == "queued"
+
+    # TestClient runs background tasks before returning
+    pattern = client.get(f"/api/v1/patterns/{pattern_id}").json()
+    assert pattern["status"] == "ready"
+    assert pattern["progress"] == 1.0
+    assert len(pattern["grid_data"]["grid"]) == 30
+    assert stages == ["download", "resize", "quantize", "match", "grid"]
+
+    events = client.get(f"/api/v1/patterns/{pattern_id}/events")
+    assert events.headers["content-type"].startswith("text/event-stream")
+    assert '"status": "ready"' in events.text
+
+def test_async_convert_records_failure(client, monkeypatch):
+    def failing_get(request):
+        raise httpx.ConnectError("storage unavailable")
+    monkeypatch.setattr(main, "image_fetcher", storage_stub(failing_get))
+
+    pattern_id = client.post("/api/v1/convert?async=true", json=conversion_payload()).json()["pattern_id"]
+
+    pattern = client.get(f"/api/v1/patterns/{pattern_id}").json()
+    assert pattern["status"] == "failed"
+    assert "storage unavailable" in pattern["error"]
+    # The slot reserved at submit is given back when the job fails before the pool
+    assert main.conversion_pool.in_flight == 0
+
+def test_async_convert_reserves_slot_at_submit(client, monkeypatch):
+    pool = ConversionPool(max_workers=0, max_queue=0)
+    monkeypatch.setattr(main, "conversion_pool", pool)
+    slot = pool.reserve()
+
+    response = client.post("/api/v1/convert?async=true", json=conversion_payload())
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    slot.close()
+    assert client.post("/api/v1/convert?async=true", json=conversion_payload()).status_code == 202
+    assert pool.in_flight == 0
+
+def test_get_unknown_pattern(client):
+    assert client.get("/api/v1/patterns/pattern_missing").status_code == 404
+
+def test_convert_rejects_non_image_download(client, monkeypatch):
+    monkeypatch.setattr(main, "image_fetcher", storage_stub(
+        lambda request: httpx.Response(200, content=b"<html>login</html>")
+    ))
+
+    response = client.post("/api/v1/convert", json=conversion_payload())
+
+    assert response.status_code == 415
+    assert "not a supported image" in response.json()["detail"]
+
+def upload_options(**overrides) -> dict:
+    options = conversion_payload(**overrides)
+    del options["image_url"]
+    return {"options": json.dumps(options)}
+
+def test_upload_matches_url_conversion(client):
+    by_url = client.post("/api/v1/convert", json=conversion_payload())
+
+    uploaded = client.post("/api/v1/convert/upload", data=upload_options(),
+                           files={"image": ("photo.png", make_png(), "image/png")})
+
+    assert uploaded.status_code == 200
+    assert uploaded.headers["x-cache"] == "HIT"
+    assert uploaded.json()["pattern_id"] == by_url.json()["pattern_id"]
+    assert uploaded.json()["grid_data"] == by_url.json()["grid_data"]
+
+def test_async_upload_job(client):
+    submitted = client.post("/api/v1/convert/upload?async=true", data=upload_options(grid_encoding="rle"),
+                            files={"image": ("photo.png", make_png(), "image/png")})
+
+    assert submitted.status_code == 202
+    pattern = client.get(f"/api/v1/patterns/{submitted.json()['pattern_id']}?grid_encoding=rle").json()
+    assert pattern["status"] == "ready"
+    assert unpack_grid(pattern["grid_data"]).shape == (30, 40)
+
+def test_upload_rejects_invalid_input(client, monkeypatch):
+    files = {"image": ("photo.png", make_png(), "image/png")}
+
+    assert client.post("/api/v1/convert/upload", data={"options": "{}"}, files=files).status_code == 422
+    not_image = client.post("/api/v1/convert/upload", data=upload_options(),
+                            files={"image": ("notes.txt", b"hello world, not pixels", "image/png")})
+    assert not_image.status_code == 415
+
+    monkeypatch.setattr(main.image_fetcher, "max_bytes", 100)
+    assert client.post("/api/v1/convert/upload", data=upload_options(), files=files).status_code == 413
+
+def multipart_body(image: bytes, boundary: str = "mulina-test") -> bytes:
+    """Hand-built multipart form, so it can also be sent chunked (without Content-Length)"""
+    return (f"--{boundary}\r\nContent-Disposition: form-data; name=\"options\"\r\n\r\n"
+            f"{upload_options()['options']}\r\n--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"image\"; filename=\"photo.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode() + image + f"\r\n--{boundary}--\r\n".encode()
+
+def test_upload_limit_is_enforced_before_parsing(client, monkeypatch):
+    monkeypatch.setattr(main.image_fetcher, "max_bytes", 100)
+    monkeypatch.setattr(main, "UPLOAD_FORM_OVERHEAD_BYTES", 0)
+    body = multipart_body(make_png())
+    headers = {"Content-Type": "multipart/form-data; boundary=mulina-test"}
+
+    declared = client.post("/api/v1/convert/upload", content=body, headers=headers)
+    # Chunked transfer: no Content-Length, the guard counts the received body
+    streamed = client.post("/api/v1/convert/upload", headers=headers,
+                           content=(body[i:i + 64] for i in range(0, len(body), 64)))
+
+    for response in (declared, streamed):
+        assert response.status_code == 413
+        assert "Request body exceeds 100 bytes" in response.json()["detail"]
+
+def test_upload_multipart_body_is_accepted(client):
+    response = client.post("/api/v1/convert/upload", content=multipart_body(make_png()),
+                           headers={"Content-Type": "multipart/form-data; boundary=mulina-test"})
+
+    assert response.status_code == 200
+
+def test_export_pdf_streams_stored_pattern(client):
+    pattern_id = client.post("/api/v1/convert", json=conversion_payload()).json()["pattern_id"]
+
+    response = client.post(f"/api/v1/patterns/{pattern_id}/export-pdf")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert client.post("/api/v1/patterns/pattern_missing/export-pdf").status_code == 404
+
+def test_pdf_executor_is_recreated_after_lifespan_shutdown(client, monkeypatch):
+    monkeypatch.setattr(main, "pdf_workers", 1)
+    monkeypatch.setattr(main, "pdf_executor", None)
+
+    for _ in range(2):
+        with TestClient(main.app):
+            assert main.get_pdf_executor().submit(int, "7").result(timeout=30) == 7
+        assert main.pdf_executor is None
+
+def test_export_pdf_logs_render_stats(client, caplog, capsys):
+    pattern_id = client.post("/api/v1/convert", json=conversion_payload()).json()["pattern_id"]
+
+    with caplog.at_level("INFO", logger="main"):
+        client.post(f"/api/v1/patterns/{pattern_id}/export-pdf")
+
+    assert f"PDF {pattern_id} rendered" in caplog.text
+    assert "PDF" not in capsys.readouterr().out
+
+def test_export_pdf_is_cached_with_etag(client):
+    pattern_id = client.post("/api/v1/convert", json=conversion_payload()).json()["pattern_id"]
+    url = f"/api/v1/patterns/{pattern_id}/export-pdf"
+
+    first = client.post(url)
+    second = client.get(url)
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == first.content
+
+    not_modified = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+def test_export_pdf_serves_byte_ranges(client):
+    pattern_id = client.post("/api/v1/convert", json=conversion_payload()).json()["pattern_id"]
+    url = f"/api/v1/patterns/{pattern_id}/export-pdf"
+
+    # A range on a cold cache renders the document first
+    head = client.get(url, headers={"Range": "bytes=0-99"})
+    full = client.get(url)
+    tail = client.get(url, headers={"Range": "bytes=100-"})
+
+    assert head.status_code == 206
+    assert head.headers["content-range"] == f"bytes 0-99/{len(full.content)}"
+    assert head.content + tail.content == full.content
+    assert full.headers["accept-ranges"] == "bytes"
+
+    stale = client.get(url, headers={"Range": "bytes=100-", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == full.content
+    assert client.get(url, headers={"Range": f"bytes={len(full.content)}-"}).status_code == 416
+
+def test_parse_byte_range():
+    assert main.parse_byte_range(None, 100) is None
+    assert main.parse_byte_range("bytes=10-19", 100) == (10, 20)
+    assert main.parse_byte_range("bytes=90-200", 100) == (90, 100)
+    assert main.parse_byte_range("bytes=-30", 100) == (70, 100)
+    assert main.parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert main.parse_byte_range("items=0-1", 100) is None
+
+def test_bulk_thread_conversion(client):
+    codes = [thread.color_code for thread in main.get_catalog().brand("Anchor").threads][:5]
+
+    response = client.post("/api/v1/threads/convert", json={
+        "from_brand": "Anchor", "to_brand": "DMC", "codes": codes + ["missing"], "top_k": 3,
+    })
+
+    assert response.status_code == 200
+    conversions = response.json()["conversions"]
+    assert [c["color_code"] for c in conversions] == codes + ["missing"]
+    assert all(c["found"] and len(c["matches"]) == 3 for c in conversions[:-1])
+    assert conversions[-1] == {"color_code": "missing", "found": False, "matches": []}
+    assert all(m["thread"]["brand"] == "DMC" for m in conversions[0]["matches"])
+
+    bad_metric = client.post("/api/v1/threads/convert", json={
+        "from_brand": "Anchor", "to_brand": "DMC", "codes": codes, "metric": "cie2001",
+    })
+    assert bad_metric.status_code == 400
+
+def test_bulk_thread_conversion_validates_up_front(client):
+    unknown_brand = client.post("/api/v1/threads/convert", json={
+        "from_brand": "Anchor", "to_brand": "Nobrand", "codes": [],
+    })
+    assert unknown_brand.status_code == 400
+    assert "Nobrand" in unknown_brand.json()["detail"]
+
+    code = main.get_catalog().brand("DMC").threads[0].color_code
+    upper = client.post("/api/v1/threads/convert", json={
+        "from_brand": "DMC", "to_brand": "DMC", "codes": [code], "metric": "CIEDE2000", "top_k": 3,
+    })
+    assert upper.status_code == 200
+    assert upper.json()["metric"] == "ciede2000"
+    matches = upper.json()["conversions"][0]["matches"]
+    assert len(matches) == 3
+    assert matches[0]["thread"]["color_code"] == code and matches[0]["delta_e"] == 0.0
+
+def test_user_inventory_round_trip(client):
+    owned = [thread.thread_id for thread in main.get_catalog().brand("DMC").threads][:3]
+
+    empty = client.get("/api/v1/user/inventory", headers=auth("alice"))
+    assert empty.json() == {"user_id": "alice", "threads": []}
+
+    updated = client.put("/api/v1/user/inventory", json={"threads": owned}, headers=auth("alice"))
+    assert updated.status_code == 200
+    assert client.get("/api/v1/user/inventory", headers=auth("alice")).json()["threads"] == sorted(owned)
+
+    unknown = client.put("/api/v1/user/inventory", json={"threads": owned + ["dmc_nope"]},
+                         headers=auth("alice"))
+    assert unknown.status_code == 400
+    assert "dmc_nope" in unknown.json()["detail"]
+
+def test_convert_reads_inventory_of_user(client):
+    owned = [thread.thread_id for thread in main.get_catalog().brand("DMC").threads][::4]
+    client.put("/api/v1/user/inventory", json={"threads": owned}, headers=auth("alice"))
+
+    by_user = client.post("/api/v1/convert", json=conversion_payload(
+        use_inventory=True, inventory_bonus=0.5
+    ), headers=auth("alice")).json()
+    explicit = client.post("/api/v1/convert", json=conversion_payload(
+        use_inventory=True, user_inventory=owned, inventory_bonus=0.5
+    )).json()
+    plain = client.post("/api/v1/convert", json=conversion_payload()).json()
+
+    assert by_user["pattern_id"] == explicit["pattern_id"]
+    assert by_user["pattern_id"] != plain["pattern_id"]
+    owned_codes = {thread.color_code for thread in main.get_catalog().brand("DMC").threads[::4]}
+    def owned_count(pattern):
+        return sum(entry["thread_code"] in owned_codes for entry in pattern["color_palette"])
+    assert owned_count(by_user) > owned_count(plain)
+
+    bad_bonus = client.post("/api/v1/convert", json=conversion_payload(use_inventory=True, inventory_bonus=1.5))
+    assert bad_bonus.status_code == 422
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"Authorization": "Bearer forged"},
+    {"Authorization": "token-alice"},
+    {"Authorization": "Bearer "},
+])
+def test_user_inventory_requires_valid_token(client, headers):
+    owned = [thread.thread_id for thread in main.get_catalog().brand("DMC").threads][:2]
+
+    read = client.get("/api/v1/user/inventory", headers=headers)
+    write = client.put("/api/v1/user/inventory", json={"threads": owned}, headers=headers)
+
+    assert read.status_code == 401
+    assert write.status_code == 401
+    assert read.headers["WWW-Authenticate"] == "Bearer"
+    assert main.inventory_store.get("alice") == frozenset()
+
+def test_inventories_are_scoped_to_token_owner(client):
+    threads = [thread.thread_id for thread in main.get_catalog().brand("DMC").threads]
+    client.put("/api/v1/user/inventory", json={"threads": threads[:2]}, headers=auth("alice"))
+    client.put("/api/v1/user/inventory", json={"threads": threads[2:3]}, headers=auth("bob"))
+
+    assert client.get("/api/v1/user/inventory", headers=auth("bob")).json() == {
+        "user_id": "bob", "threads": threads[2:3]
+    }
+    # A user_id in the body is not a way to pick someone else's inventory
+    response = client.post("/api/v1/convert", json=conversion_payload(use_inventory=True, user_id="alice"),
+                           headers={"Authorization": "Bearer forged"})
+    assert response.status_code == 401
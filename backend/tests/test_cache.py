@@ -0,0 +1,57 @@
+"""
+Unit tests for the byte caches
+"""
+import os
+
+from cache import DiskCache, LRUByteCache, TieredCache
+
+def test_lru_evicts_by_size():
+    cache = LRUByteCache(max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"5678")
+    cache.get("a")  # "a" becomes most recently used
+    cache.set("c", b"90ab")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"90ab"
+    assert cache.size == 8
+
+def test_lru_skips_values_over_budget():
+    cache = LRUByteCache(max_bytes=4)
+    cache.set("a", b"12")
+    cache.set("big", b"123456")
+
+    assert cache.get("big") is None
+    assert cache.get("a") == b"12"
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    disk = DiskCache(tmp_path)
+    TieredCache(LRUByteCache(100), disk).set("ab12", b"payload")
+
+    # A fresh process only has the disk tier
+    cache = TieredCache(LRUByteCache(100), disk)
+    assert cache.get("ab12") == b"payload"
+    assert cache.memory.get("ab12") == b"payload"
+    assert (tmp_path / "ab" / "ab12").exists()
+
+def test_disk_cache_prunes_least_recently_used(tmp_path):
+    disk = DiskCache(tmp_path, max_bytes=12)
+    for i, key in enumerate(("aa01", "bb02", "cc03")):
+        disk.set(key, b"1234")
+        # Distinct mtimes - some filesystems only keep whole seconds
+        os.utime(tmp_path / key[:2] / key, (1000 + i, 1000 + i))
+    disk.get("aa01")  # read → most recently used
+
+    disk.set("dd04", b"1234")
+
+    assert disk.get("bb02") is None
+    assert disk.get("cc03") is None
+    assert disk.get("aa01") == b"1234"
+    assert disk.get("dd04") == b"1234"
+
+def test_disk_cache_skips_values_over_budget(tmp_path):
+    disk = DiskCache(tmp_path, max_bytes=4)
+    disk.set("ab12", b"123456")
+
+    assert disk.get("ab12") is None
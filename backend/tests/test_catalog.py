@@ -0,0 +1,211 @@
+"""
+Unit tests for the in-memory thread catalog snapshot
+"""
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+from color_engine.delta_e import rgb_to_lab
+from database.catalog import CatalogHolder, ThreadCatalog, load_catalog
+from database.threads import StringColumn, open_thread_columns, write_thread_columns
+
+SCHEMA = """
+    CREATE TABLE threads (
+        thread_id TEXT PRIMARY KEY,
+        brand TEXT NOT NULL,
+        color_code TEXT NOT NULL,
+        color_name TEXT NOT NULL,
+        r INTEGER NOT NULL,
+        g INTEGER NOT NULL,
+        b INTEGER NOT NULL,
+        l_star REAL NOT NULL,
+        a_star REAL NOT NULL,
+        b_star REAL NOT NULL,
+        hex_color TEXT NOT NULL,
+        UNIQUE(brand, color_code)
+    )
+"""
+
+def insert_thread(conn, thread_id, brand, code, rgb):
+    conn.execute(
+        "INSERT INTO threads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (thread_id, brand, code, f"Color {code}", *rgb, *rgb_to_lab(rgb), "#%02x%02x%02x" % rgb)
+    )
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "threads.db"
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    insert_thread(conn, "dmc_310", "DMC", "310", (0, 0, 0))
+    insert_thread(conn, "dmc_321", "DMC", "321", (199, 44, 72))
+    insert_thread(conn, "anchor_403", "Anchor", "403", (10, 10, 10))
+    conn.commit()
+    conn.close()
+    return path
+
+def test_brand_views_share_catalog_arrays(db_path):
+    catalog = load_catalog(db_path)
+
+    assert len(catalog) == 3
+    assert catalog.brand_names == ("Anchor", "DMC", "DMC")
+    dmc = catalog.brand("DMC")
+    assert len(dmc) == 2
+    assert np.shares_memory(dmc.lab, catalog.lab)
+    assert [t.color_code for t in dmc.threads] == ["310", "321"]
+    assert catalog.brand("Madeira") is None
+    assert not catalog.lab.flags.writeable
+
+def test_thread_info_json(db_path):
+    catalog = load_catalog(db_path)
+
+    anchor = json.loads(catalog.brand("Anchor").thread_info_json)
+    assert anchor == [{
+        "thread_id": "anchor_403", "brand": "Anchor", "color_code": "403",
+        "color_name": "Color 403", "rgb": [10, 10, 10], "hex_color": "#0a0a0a"
+    }]
+    assert len(json.loads(catalog.thread_info_json)) == 3
+
+def test_holder_reuses_snapshot_until_user_version_changes(db_path):
+    holder = CatalogHolder(db_path, check_interval=0)
+    first = holder.get()
+    assert holder.get() is first
+
+    conn = sqlite3.connect(db_path)
+    insert_thread(conn, "dmc_blanc", "DMC", "BLANC", (255, 255, 255))
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+
+    refreshed = holder.get()
+    assert refreshed is not first
+    assert len(refreshed.brand("DMC")) == 3
+    assert refreshed.fingerprint != first.fingerprint
+
+def test_equivalents_match_brute_force(db_path):
+    catalog = load_catalog(db_path)
+
+    matches = catalog.equivalents("Anchor", "DMC", "403", metric="ciede2000", top_k=2)
+
+    assert [thread.color_code for thread, _ in matches] == ["310", "321"]
+    assert matches[0][1] < matches[1][1]
+    assert catalog.equivalents("Anchor", "DMC", "999") is None
+    assert catalog.equivalents("DMC", "DMC", "321")[0][1] == 0.0
+    with pytest.raises(ValueError):
+        catalog.equivalents("Anchor", "Nobrand", "403")
+
+def test_equivalents_normalize_metric_and_apply_top_k(db_path):
+    catalog = load_catalog(db_path)
+
+    upper = catalog.equivalents("Anchor", "DMC", "403", metric="CIEDE2000", top_k=2)
+    assert upper == catalog.equivalents("Anchor", "DMC", "403", metric="ciede2000", top_k=2)
+
+    same_brand = catalog.equivalents("DMC", "DMC", "321", top_k=2)
+    assert [thread.color_code for thread, _ in same_brand] == ["321", "310"]
+    assert same_brand[0][1] == 0.0
+    assert len(catalog.equivalents("DMC", "DMC", "321")) == 1
+
+    with pytest.raises(ValueError):
+        catalog.equivalents("Anchor", "DMC", "403", metric="cie2001")
+    with pytest.raises(ValueError):
+        catalog.conversion_pair("Nobrand", "DMC")
+
+def test_equivalence_table_is_persisted_next_to_database(db_path):
+    catalog = load_catalog(db_path)
+    files = list(db_path.parent.glob("threads.equivalence_*.npz"))
+    assert [f.name for f in files] == [f"threads.equivalence_5_{catalog.fingerprint}.npz"]
+
+    reloaded = load_catalog(db_path)
+    key = ("DMC", "Anchor", "cie94")
+    assert np.array_equal(reloaded.equivalence.distances[key], catalog.equivalence.distances[key])
+
+    # A catalog change writes a new table and removes the stale one
+    conn = sqlite3.connect(db_path)
+    insert_thread(conn, "anchor_1", "Anchor", "1", (255, 255, 255))
+    conn.commit()
+    conn.close()
+    changed = load_catalog(db_path)
+    files = list(db_path.parent.glob("threads.equivalence_*.npz"))
+    assert [f.name for f in files] == [f"threads.equivalence_5_{changed.fingerprint}.npz"]
+
+def test_truncated_equivalence_table_is_rebuilt(db_path):
+    catalog = load_catalog(db_path)
+    path = db_path.parent / f"threads.equivalence_5_{catalog.fingerprint}.npz"
+    path.write_bytes(path.read_bytes()[:100])
+
+    reloaded = load_catalog(db_path)
+
+    key = ("DMC", "Anchor", "cie94")
+    assert np.array_equal(reloaded.equivalence.indices[key], catalog.equivalence.indices[key])
+    assert path.stat().st_size > 100
+    assert not list(db_path.parent.glob("*.tmp"))
+
+def test_columns_file_round_trip(tmp_path):
+    path = tmp_path / "threads.columns"
+    strings = {
+        "thread_id": ["ariadna_1", "dmc_310", "dmc_321"],
+        "brand": ["Ariadna", "DMC", "DMC"],
+        "color_code": ["1", "310", "321"],
+        "color_name": ["Łososiowy róż", "Black", "Red"],
+        "hex_color": ["#fa8072", "#000000", "#c72c48"],
+    }
+    rgb = np.array([(250, 128, 114), (0, 0, 0), (199, 44, 72)], dtype=np.uint8)
+    lab = np.array([rgb_to_lab(tuple(int(v) for v in color)) for color in rgb])
+    write_thread_columns(path, (123, 4), strings, rgb, lab)
+
+    columns = open_thread_columns(path)
+    assert columns.source == (123, 4)
+    assert len(columns) == 3
+    assert columns.strings["color_name"][0] == "Łososiowy róż"
+    assert columns.strings["thread_id"].tolist() == strings["thread_id"]
+    np.testing.assert_array_equal(columns.rgb, rgb)
+    np.testing.assert_array_equal(columns.lab, lab)
+    assert not columns.lab.flags.writeable
+
+    dmc = columns.brand_slice("DMC")
+    assert (dmc.start, dmc.stop) == (1, 3)
+    assert np.shares_memory(columns.lab[dmc], columns.lab)
+    assert columns.brand_slice("Madeira") is None
+
+def test_columns_file_rejects_other_formats(tmp_path):
+    path = tmp_path / "threads.columns"
+    path.write_bytes(b"not a columns file")
+    with pytest.raises(ValueError):
+        open_thread_columns(path)
+
+def test_load_catalog_reuses_columns_file(db_path, monkeypatch):
+    first = load_catalog(db_path)
+    assert db_path.with_suffix(".columns").exists()
+
+    # Second process: no SQL rows are materialized, arrays map the columns file
+    def from_rows(*args):
+        raise AssertionError("catalog rebuilt from SQLite")
+    monkeypatch.setattr(ThreadCatalog, "from_rows", classmethod(from_rows))
+    second = load_catalog(db_path)
+
+    # Strings stay in the mapped file; Thread objects and JSON are built on first use
+    assert isinstance(second.thread_ids, StringColumn)
+    assert "thread_info_json" not in vars(second.brand("DMC"))
+    assert second.thread_ids == first.thread_ids
+    assert second.fingerprint == first.fingerprint
+    assert second.threads == first.threads
+    assert second.thread_info_json == first.thread_info_json
+    assert second.brand("DMC").code_index == {"310": 0, "321": 1}
+    assert not list(db_path.parent.glob("*.tmp"))
+    assert not second.lab.flags.owndata
+    assert np.shares_memory(second.brand("DMC").lab, second.lab)
+    assert second.equivalents("DMC", "Anchor", "310")[0][0].thread_id == "anchor_403"
+
+def test_stale_columns_file_is_rebuilt(db_path):
+    load_catalog(db_path)
+    conn = sqlite3.connect(db_path)
+    insert_thread(conn, "dmc_blanc", "DMC", "BLANC", (255, 255, 255))
+    conn.execute("PRAGMA user_version = 7")
+    conn.commit()
+    conn.close()
+
+    catalog = load_catalog(db_path)
+    assert len(catalog) == 4
+    assert open_thread_columns(db_path.with_suffix(".columns")).source == catalog.version
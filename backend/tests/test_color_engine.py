@@ -1,13 +1,17 @@
 """
 Unit tests for color matching engine
 """
+import numpy as np
 import pytest
-from backend.color_engine.delta_e import (
+from color_engine.delta_e import (
     rgb_to_lab, 
+    rgb_to_lab_array,
+    lab_to_rgb_array,
     delta_e, 
     find_closest_thread,
     Thread
 )
+from color_engine.metrics import delta_e_matrix
 
 def test_rgb_to_lab_white():
     """Test conversion of pure white"""
@@ -27,6 +31,28 @@ def test_rgb_to_lab_black():
     # Black should have L* = 0
     assert lab[0] == pytest.approx(0.0, abs=1.0)
 
+def test_rgb_to_lab_array_matches_scalar():
+    """Array conversion should match the scalar version pixel by pixel"""
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, size=(8, 6, 3), dtype=np.uint8)
+    
+    lab = rgb_to_lab_array(img)
+    
+    assert lab.shape == (8, 6, 3)
+    for y, x in [(0, 0), (3, 4), (7, 5)]:
+        expected = rgb_to_lab(tuple(int(v) for v in img[y, x]))
+        assert lab[y, x] == pytest.approx(expected)
+
+def test_lab_to_rgb_array_roundtrip():
+    """RGB → LAB → RGB should reproduce the original colors"""
+    rng = np.random.default_rng(1)
+    palette = rng.integers(0, 256, size=(500, 3), dtype=np.uint8)
+    
+    restored = lab_to_rgb_array(rgb_to_lab_array(palette))
+    
+    assert restored.dtype == np.uint8
+    assert np.array_equal(restored, palette)
+
 def test_delta_e_identical_colors():
     """Delta E between identical colors should be 0"""
     lab1 = (50.0, 25.0, -10.0)
@@ -44,6 +70,40 @@ def test_delta_e_perceptual_difference():
     de = delta_e(lab1, lab2)
     assert de == pytest.approx(1.0)
 
+# Reference pairs from Sharma, Wu, Dalal (2005) CIEDE2000 test data
+CIEDE2000_PAIRS = [
+    ((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), 2.0425),
+    ((50.0, -1.3802, -84.2814), (50.0, 0.0, -82.7485), 1.0000),
+    ((50.0, 0.0, 0.0), (50.0, -1.0, 2.0), 2.3669),
+    ((50.0, 2.49, -0.001), (50.0, -2.49, 0.0009), 7.1792),
+    ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+    ((2.0776, 0.0795, -1.135), (0.9033, -0.0636, -0.5514), 0.9082),
+]
+
+@pytest.mark.parametrize("lab1,lab2,expected", CIEDE2000_PAIRS)
+def test_delta_e_ciede2000_reference(lab1, lab2, expected):
+    assert delta_e(lab1, lab2, metric="ciede2000") == pytest.approx(expected, abs=1e-4)
+
+def test_delta_e_cie94():
+    de = delta_e((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), metric="cie94")
+    assert de == pytest.approx(1.3950, abs=1e-4)
+
+def test_delta_e_matrix_matches_pairwise():
+    """Batched matrix should equal pairwise scalar results for every metric"""
+    colors = np.array([pair[0] for pair in CIEDE2000_PAIRS])
+    threads = np.array([pair[1] for pair in CIEDE2000_PAIRS[:4]])
+    
+    for metric in ("cie76", "cie94", "ciede2000"):
+        matrix = delta_e_matrix(colors, threads, metric=metric, max_chunk_elements=5)
+        assert matrix.shape == (6, 4)
+        for i, lab1 in enumerate(colors):
+            for j, lab2 in enumerate(threads):
+                assert matrix[i, j] == pytest.approx(delta_e(tuple(lab1), tuple(lab2), metric=metric))
+
+def test_delta_e_unknown_metric():
+    with pytest.raises(ValueError):
+        delta_e((50.0, 0.0, 0.0), (50.0, 1.0, 0.0), metric="cmc")
+
 def test_find_closest_thread():
     """Test finding closest thread match"""
     # Sample thread database
@@ -89,5 +149,17 @@ def test_find_closest_thread_brand_filter():
     assert result["thread"].brand == "Anchor"
     assert result["thread"].color_code == "403"
 
+def test_find_closest_thread_metric():
+    """All metrics should agree on an obvious match"""
+    threads = [
+        Thread("dmc_310", "DMC", "310", "Black", (0, 0, 0), (0.0, 0.0, 0.0)),
+        Thread("dmc_blanc", "DMC", "BLANC", "White", (255, 255, 255), (100.0, 0.0, 0.0)),
+        Thread("dmc_820", "DMC", "820", "Very Dark Royal Blue", (14, 54, 92), rgb_to_lab((14, 54, 92))),
+    ]
+    
+    for metric in ("cie76", "cie94", "ciede2000"):
+        result = find_closest_thread((20, 50, 100), threads, metric=metric)
+        assert result["thread"].color_code == "820"
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,83 @@
+"""
+Unit tests for the dithering engine
+"""
+import numpy as np
+import pytest
+
+from image_processor.dithering import (DIFFUSION_KERNELS, METHODS, PaletteLookup, bayer_matrix,
+                                       blue_noise_matrix, dither, error_diffusion)
+
+PALETTE = np.array([(0, 0, 0), (255, 255, 255), (200, 30, 40), (30, 60, 200), (240, 200, 40)])
+
+def gradient(height: int = 24, width: int = 32) -> np.ndarray:
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[..., 0] = np.linspace(0, 255, width)[None, :]
+    img[..., 1] = np.linspace(0, 255, height)[:, None]
+    img[..., 2] = 90
+    return img
+
+def serial_error_diffusion(image, lookup, method):
+    """Reference raster-order implementation"""
+    kernel, _ = DIFFUSION_KERNELS[method]
+    height, width = image.shape[:2]
+    buffer = image.astype(np.float32)
+    labels = np.empty((height, width), dtype=int)
+    for y in range(height):
+        for x in range(width):
+            value = np.clip(buffer[y, x], 0, 255)
+            nearest = lookup.nearest(value[None])[0]
+            labels[y, x] = nearest
+            error = value - lookup.palette[nearest]
+            for dy, dx, weight in kernel:
+                if 0 <= y + dy < height and 0 <= x + dx < width:
+                    buffer[y + dy, x + dx] += error * weight
+    return labels
+
+@pytest.mark.parametrize("method", list(DIFFUSION_KERNELS))
+def test_wavefront_matches_raster_order(method):
+    image = gradient()
+    lookup = PaletteLookup(PALETTE)
+
+    np.testing.assert_array_equal(
+        error_diffusion(image, lookup, method),
+        serial_error_diffusion(image, lookup, method)
+    )
+
+def test_palette_lookup_is_exact_nearest_in_lab():
+    from color_engine.delta_e import rgb_to_lab_array
+    rng = np.random.default_rng(1)
+    rgb = rng.integers(0, 256, size=(500, 3)).astype(np.uint8)
+    lookup = PaletteLookup(PALETTE)
+
+    lab = rgb_to_lab_array(rgb)
+    expected = np.argmin(np.sum((lab[:, None] - lookup.palette_lab[None]) ** 2, axis=-1), axis=1)
+    np.testing.assert_array_equal(lookup.nearest(rgb), expected)
+
+@pytest.mark.parametrize("method", METHODS)
+def test_dither_preserves_average_color(method):
+    # Mid gray between black and white: dithering mixes both, plain mapping picks one
+    image = np.full((32, 32, 3), 128, dtype=np.uint8)
+
+    labels = dither(image, PALETTE[:2], method)
+
+    assert labels.shape == (32, 32)
+    white_share = (labels == 1).mean()
+    assert 0.3 < white_share < 0.7
+
+def test_threshold_matrices():
+    bayer = bayer_matrix(2)
+    assert bayer.shape == (4, 4)
+    assert sorted(np.rint(bayer.ravel() * 16 - 0.5)) == list(range(16))
+
+    noise = blue_noise_matrix(16)
+    assert noise.shape == (16, 16)
+    assert len(np.unique(noise)) == 256
+    # Blue noise: the darkest 1/8 of thresholds is spread out, not clumped
+    ys, xs = np.nonzero(noise < 1 / 8)
+    distances = np.hypot(ys[:, None] - ys[None], xs[:, None] - xs[None])
+    np.fill_diagonal(distances, np.inf)
+    assert distances.min() >= 2
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        dither(gradient(), PALETTE, "random")
@@ -0,0 +1,101 @@
+"""
+Tests for the async image fetcher (httpx.MockTransport stands in for storage)
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from cache import LRUByteCache, TieredCache
+from fetcher import (FetchError, ImageFetcher, ImageTooLargeError, UnsupportedImageError,
+                     create_fetcher, sniff_image_type)
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(200)
+URL = "https://storage.example.com/photo.png"
+
+def fetch(fetcher: ImageFetcher, url: str = URL) -> bytes:
+    async def run():
+        try:
+            return await fetcher.fetch(url)
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+def test_sniff_image_type():
+    assert sniff_image_type(PNG) == "image/png"
+    assert sniff_image_type(b"\xff\xd8\xff\xe0" + bytes(8)) == "image/jpeg"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBP") == "image/webp"
+    assert sniff_image_type(b"<!DOCTYPE html>") is None
+
+def test_fetch_returns_body():
+    fetcher = ImageFetcher(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=PNG)))
+
+    assert fetch(fetcher) == PNG
+
+def test_etag_revalidation_serves_cached_body():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=PNG, headers={"etag": '"v1"'})
+
+    cache = TieredCache(LRUByteCache(1024 * 1024))
+    transport = httpx.MockTransport(handler)
+
+    assert fetch(ImageFetcher(cache, transport=transport)) == PNG
+    assert fetch(ImageFetcher(cache, transport=transport)) == PNG
+    assert seen == [None, '"v1"']
+
+def test_changed_etag_replaces_cached_body():
+    versions = iter([(PNG, '"v1"'), (PNG + b"new", '"v2"')])
+
+    def handler(request):
+        body, etag = next(versions)
+        return httpx.Response(200, content=body, headers={"etag": etag})
+
+    fetcher = ImageFetcher(TieredCache(LRUByteCache(1024 * 1024)), transport=httpx.MockTransport(handler))
+
+    fetch(fetcher)
+    assert fetch(fetcher) == PNG + b"new"
+    assert fetcher._cached(fetcher._cache_key(URL)) == ('"v2"', PNG + b"new")
+
+def test_declared_size_over_limit_is_rejected():
+    def handler(request):
+        return httpx.Response(200, content=PNG, headers={"content-length": str(10 ** 9)})
+
+    with pytest.raises(ImageTooLargeError):
+        fetch(ImageFetcher(max_bytes=1000, transport=httpx.MockTransport(handler)))
+
+def test_streamed_size_over_limit_is_rejected():
+    async def chunks():
+        yield PNG
+        while True:
+            yield bytes(4096)
+
+    def handler(request):
+        return httpx.Response(200, content=chunks())
+
+    with pytest.raises(ImageTooLargeError):
+        fetch(ImageFetcher(max_bytes=64 * 1024, transport=httpx.MockTransport(handler)))
+
+def test_non_image_body_is_rejected():
+    def handler(request):
+        return httpx.Response(200, content=b"<html>Access denied</html>", headers={"content-type": "image/png"})
+
+    with pytest.raises(UnsupportedImageError):
+        fetch(ImageFetcher(transport=httpx.MockTransport(handler)))
+
+def test_http_errors_become_fetch_errors():
+    def handler(request):
+        return httpx.Response(404)
+
+    with pytest.raises(FetchError) as error:
+        fetch(ImageFetcher(transport=httpx.MockTransport(handler)))
+    assert error.value.status_code == 400
+
+def test_size_limit_comes_from_max_image_size_mb(monkeypatch):
+    monkeypatch.setenv("MAX_IMAGE_SIZE_MB", "2.5")
+
+    assert create_fetcher().max_bytes == int(2.5 * 1024 * 1024)
@@ -0,0 +1,69 @@
+"""
+Unit tests for the compact grid encodings
+"""
+import numpy as np
+import pytest
+
+from grid_codec import decode_frame, decode_grid, encode_frame, encode_grid, pack_grid_data, unpack_grid
+
+def make_grid(max_value: int = 20, shape=(37, 53), seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Blocks of equal values, like a real pattern
+    blocks = rng.integers(0, max_value + 1, size=(shape[0] // 4 + 1, shape[1] // 4 + 1))
+    return np.kron(blocks, np.ones((4, 4), dtype=int))[:shape[0], :shape[1]]
+
+@pytest.mark.parametrize("encoding", ["raw", "rle", "zlib"])
+@pytest.mark.parametrize("max_value", [20, 700])
+def test_encode_decode_roundtrip(encoding, max_value):
+    grid = make_grid(max_value)
+
+    payload, dtype = encode_grid(grid, encoding)
+
+    assert dtype == ("uint8" if max_value < 256 else "uint16")
+    decoded = decode_grid(payload, encoding, dtype, grid.shape[1], grid.shape[0])
+    np.testing.assert_array_equal(decoded, grid)
+
+def test_rle_splits_long_runs():
+    grid = np.zeros((300, 300), dtype=np.uint8)
+    grid[-1, -1] = 3
+
+    payload, dtype = encode_grid(grid, "rle")
+
+    # 89999 zeros → two records (65535 + 24464), then one record for the 3
+    assert len(payload) == 3 * 3
+    np.testing.assert_array_equal(decode_grid(payload, "rle", dtype, 300, 300), grid)
+
+def test_pack_grid_data_converts_between_encodings():
+    grid = make_grid()
+    grid_data = {"grid": grid, "type": "cross_stitch", "width": grid.shape[1], "height": grid.shape[0]}
+
+    packed = pack_grid_data(grid_data, "zlib")
+    as_json = pack_grid_data(packed, "json")
+
+    assert packed["encoding"] == "zlib" and packed["dtype"] == "uint8"
+    assert isinstance(packed["data"], str)
+    assert as_json["grid"] == grid.tolist()
+    assert as_json["type"] == "cross_stitch" and "data" not in as_json
+    np.testing.assert_array_equal(unpack_grid(pack_grid_data(as_json, "rle")), grid)
+
+def test_frame_roundtrip():
+    grid = make_grid()
+    fields = {
+        "pattern_id": "pattern_1",
+        "status": "ready",
+        "grid_data": pack_grid_data({"grid": grid, "type": "cross_stitch",
+                                     "width": grid.shape[1], "height": grid.shape[0]}, "zlib"),
+        "color_palette": [{"symbol": "A"}],
+    }
+
+    header, decoded = decode_frame(encode_frame(fields, "rle"))
+
+    assert header["pattern_id"] == "pattern_1"
+    assert header["color_palette"] == [{"symbol": "A"}]
+    assert header["grid_data"]["encoding"] == "rle"
+    assert "data" not in header["grid_data"]
+    np.testing.assert_array_equal(decoded, grid)
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        encode_grid(make_grid(), "lz4")
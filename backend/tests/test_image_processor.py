@@ -0,0 +1,149 @@
+"""
+Unit tests for the ImageProcessor pipeline
+"""
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_processor import converter
+from image_processor.converter import ImageProcessor
+from image_processor.loader import load_rgb
+from image_processor.tiles import tiled_canny, tiled_clahe
+
+@pytest.fixture
+def image_path(tmp_path):
+    img = np.zeros((60, 80, 3), dtype=np.uint8)
+    img[:, :40] = (200, 30, 40)
+    img[:, 40:] = (20, 40, 200)
+    img[30:] = (240, 240, 230)
+    path = tmp_path / "image.png"
+    Image.fromarray(img).save(path)
+    return str(path)
+
+def test_pattern_grid_comes_from_labels(image_path):
+    processor = ImageProcessor(image_path)
+
+    pattern = processor.generate_cross_stitch_pattern(aida_count=14, max_colors=3,
+                                                      target_width_cm=80 * 2.54 / 14, quantizer="wu")
+
+    grid = pattern["grid"]
+    assert isinstance(grid, np.ndarray)
+    assert grid.dtype == np.uint8
+    assert grid.shape == (pattern["dimensions"]["height_stitches"], pattern["dimensions"]["width_stitches"])
+    palette = np.array(pattern["palette"])
+    assert len(np.unique(grid)) == 3
+    np.testing.assert_array_equal(palette[grid[0, 0]], (200, 30, 40))
+    np.testing.assert_array_equal(palette[grid[-1, -1]], (240, 240, 230))
+
+def test_quantize_keeps_duplicate_palette_entries_apart(image_path, monkeypatch):
+    from image_processor import converter
+    from image_processor.quantizers import QuantizationResult
+
+    def duplicate_palette(img, n_colors):
+        labels = np.zeros(img.shape[:2], dtype=np.int64)
+        labels[:, img.shape[1] // 2:] = 1
+        return QuantizationResult(np.array([(10, 10, 10), (10, 10, 10)]), labels, 0.0)
+
+    monkeypatch.setattr(converter, "get_quantizer", lambda name: duplicate_palette)
+    processor = ImageProcessor(image_path)
+
+    labels, palette = processor.quantize(processor.image_rgb, max_colors=2)
+
+    assert labels[0, 0] == 0 and labels[0, -1] == 1
+
+def test_quantize_uses_uint16_above_255_colors(image_path, monkeypatch):
+    from image_processor import converter
+    from image_processor.quantizers import QuantizationResult
+
+    def many_colors(img, n_colors):
+        labels = (np.arange(img.shape[0] * img.shape[1]) % 300).reshape(img.shape[:2])
+        return QuantizationResult(np.zeros((300, 3)), labels, 0.0)
+
+    monkeypatch.setattr(converter, "get_quantizer", lambda name: many_colors)
+    processor = ImageProcessor(image_path)
+
+    labels, _ = processor.quantize(processor.image_rgb, max_colors=300)
+
+    assert labels.dtype == np.uint16
+    assert labels.max() == 299
+
+def make_jpeg(width: int = 1600, height: int = 1200) -> bytes:
+    rng = np.random.default_rng(0)
+    blocks = rng.integers(0, 256, size=(height // 100, width // 100, 3)).astype(np.uint8)
+    img = np.kron(blocks, np.ones((100, 100, 1), dtype=np.uint8))
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def test_load_rgb_decodes_at_reduced_size():
+    data = make_jpeg()
+
+    assert load_rgb(data, max_size=300).shape == (225, 300, 3)
+    assert load_rgb(data, target_width=150).shape == (112, 150, 3)
+    # Smaller than the limit - no upscaling
+    assert load_rgb(data, max_size=4000).shape == (1200, 1600, 3)
+
+def test_processor_preprocess_never_decodes_full_image(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(make_jpeg())
+    processor = ImageProcessor(str(path))
+
+    small = processor.preprocess(target_width=110, enhance_contrast=True)
+
+    assert small.shape == (82, 110, 3)
+    assert processor.size == (1600, 1200)
+    assert processor._image_rgb is None
+
+def test_load_rgb_reduces_formats_without_draft():
+    img = np.kron(np.random.default_rng(1).integers(0, 256, size=(12, 16, 3)).astype(np.uint8),
+                  np.ones((100, 100, 1), dtype=np.uint8))
+    buffer = io.BytesIO()
+    Image.fromarray(img).save(buffer, "PNG")
+
+    small = load_rgb(buffer.getvalue(), max_size=300)
+
+    assert small.shape == (225, 300, 3)
+    # Flat 100 px blocks survive the reduction (compare a block center)
+    assert np.abs(small[10, 10].astype(int) - img[50, 50]).max() <= 2
+
+def test_processor_working_image_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(converter, "MAX_WORKING_SIZE", 400)
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(make_jpeg())
+
+    # No max_size: still capped instead of decoding the full 1600 × 1200 source
+    processor = ImageProcessor(str(path))
+
+    assert processor.image_rgb.shape == (300, 400, 3)
+    assert processor.detect_edges_for_outline().shape == (300, 400)
+    assert processor.preprocess(enhance_contrast=True).shape == (300, 400, 3)
+    assert ImageProcessor(str(path), max_size=200).image_rgb.shape == (150, 200, 3)
+
+def test_tiled_canny_matches_global():
+    rgb = Image.open(io.BytesIO(make_jpeg(640, 400)))
+    rgb = np.asarray(rgb)
+    gray = cv2.GaussianBlur(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), (5, 5), 0)
+    expected = cv2.Canny(gray, 50, 150)
+
+    edges = tiled_canny(rgb, tile=128)
+
+    assert expected.any()
+    assert (edges != expected).mean() < 0.001
+
+@pytest.mark.parametrize("width, height", [(640, 400), (203, 64), (130, 100), (50, 60), (640, 401)])
+def test_tiled_clahe_matches_global(width, height):
+    # Sizes not divisible by the grid: OpenCV pads both axes
+    rgb = np.asarray(Image.open(io.BytesIO(make_jpeg(700, 500))))[:height, :width]
+    rgb = np.ascontiguousarray(rgb)
+    lab = cv2.cvtColor(rgb, cv2.COLOR_RGB2LAB)
+    lab[..., 0] = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(np.ascontiguousarray(lab[..., 0]))
+    expected = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+
+    result = tiled_clahe(rgb, clip_limit=3.0, grid=(8, 8), max_tile_rows=1)
+
+    difference = np.abs(result.astype(int) - expected)
+    assert difference.max() <= 3
+    assert (difference > 0).mean() < 0.005
@@ -0,0 +1,126 @@
+"""
+Unit tests for the bulk CSV catalog import
+"""
+import csv
+import sqlite3
+
+import pytest
+
+from color_engine.delta_e import rgb_to_lab
+from database.catalog import load_catalog
+from database.importer import (CSV_COLUMNS, build_artifacts, connect, find_csv_files,
+                               import_catalog, parse_csv_files)
+
+DMC_ROWS = [
+    ("dmc_310", "DMC", "310", "Black", 0, 0, 0),
+    ("dmc_321", "DMC", "321", "Red", 199, 44, 72),
+    ("dmc_blanc", "DMC", "BLANC", "White", 252, 251, 248),
+]
+ANCHOR_ROWS = [
+    ("anchor_403", "Anchor", "403", "Black", 10, 10, 10),
+    ("anchor_1", "Anchor", "1", "White", 255, 255, 255),
+]
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    directory = tmp_path / "threads"
+    directory.mkdir()
+    write_csv(directory / "dmc_colors.csv", DMC_ROWS)
+    write_csv(directory / "anchor_colors.csv", ANCHOR_ROWS)
+    return directory
+
+def user_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def test_parse_groups_rows_by_brand(csv_dir):
+    rows = parse_csv_files(find_csv_files(csv_dir))
+    assert sorted(rows) == ["Anchor", "DMC"]
+    assert rows["DMC"].color_codes == ["310", "321", "BLANC"]
+
+    only_dmc = parse_csv_files(find_csv_files(csv_dir), brands=["dmc"])
+    assert list(only_dmc) == ["DMC"]
+
+def test_parse_rejects_missing_columns(tmp_path):
+    path = tmp_path / "broken_colors.csv"
+    path.write_text("thread_id,brand\nx,DMC\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="missing columns"):
+        parse_csv_files([path])
+
+def test_first_import_writes_threads_with_lab(csv_dir, tmp_path):
+    conn = connect(tmp_path / "threads.db")
+    report = import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+
+    assert report.imported == {"Anchor": 2, "DMC": 3}
+    assert user_version(conn) == 1
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    row = conn.execute(
+        "SELECT l_star, a_star, b_star, hex_color FROM threads WHERE thread_id = 'dmc_321'"
+    ).fetchone()
+    assert row[:3] == pytest.approx(rgb_to_lab((199, 44, 72)), abs=1e-6)
+    assert row[3] == "#c72c48"
+
+def test_reimport_of_unchanged_csv_is_noop(csv_dir, tmp_path):
+    conn = connect(tmp_path / "threads.db")
+    import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+
+    report = import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+    assert not report.changed
+    assert sorted(report.unchanged) == ["Anchor", "DMC"]
+    assert user_version(conn) == 1
+
+    forced = import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)), force=True)
+    assert forced.imported == {"Anchor": 2, "DMC": 3}
+    assert user_version(conn) == 2
+
+def test_changed_brand_is_upserted_and_pruned(csv_dir, tmp_path):
+    conn = connect(tmp_path / "threads.db")
+    import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+
+    write_csv(csv_dir / "dmc_colors.csv", [
+        ("dmc_310", "DMC", "310", "Black", 0, 0, 0),
+        ("dmc_321", "DMC", "321", "Christmas Red", 190, 40, 70),
+        # BLANC comes back under a new thread_id
+        ("dmc_white", "DMC", "BLANC", "White", 255, 255, 255),
+    ])
+    report = import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+
+    assert report.imported == {"DMC": 3}
+    assert report.removed == {"DMC": 1}
+    assert report.unchanged == ["Anchor"]
+    assert user_version(conn) == 2
+    threads = dict(conn.execute("SELECT thread_id, color_name FROM threads WHERE brand = 'DMC'"))
+    assert threads == {"dmc_310": "Black", "dmc_321": "Christmas Red", "dmc_white": "White"}
+
+def test_failed_import_rolls_back(csv_dir, tmp_path):
+    conn = connect(tmp_path / "threads.db")
+    rows = parse_csv_files(find_csv_files(csv_dir))
+    # The same code twice within a brand violates UNIQUE(brand, color_code)
+    rows["DMC"].thread_ids.append("dmc_310_dup")
+    rows["DMC"].color_codes.append("310")
+    rows["DMC"].color_names.append("Black")
+    rows["DMC"].rgb.append((0, 0, 0))
+
+    with pytest.raises(sqlite3.IntegrityError):
+        import_catalog(conn, rows)
+    assert conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] == 0
+    assert user_version(conn) == 0
+
+def test_build_artifacts_after_import(csv_dir, tmp_path):
+    db_path = tmp_path / "threads.db"
+    conn = connect(db_path)
+    import_catalog(conn, parse_csv_files(find_csv_files(csv_dir)))
+    conn.close()
+
+    timings = build_artifacts(db_path, lut_metrics=("cie76",), lut_dir=tmp_path / "luts")
+
+    assert set(timings) == {"catalog", "lut"}
+    assert list(tmp_path.glob("threads.equivalence_*.npz"))
+    assert len(list((tmp_path / "luts").iterdir())) == 2
+    catalog = load_catalog(db_path)
+    assert catalog.equivalents("DMC", "Anchor", "310")[0][0].thread_id == "anchor_403"
@@ -0,0 +1,29 @@
+"""
+Unit tests for the user inventory store
+"""
+from inventory import InventoryStore
+
+def test_inventory_round_trip(tmp_path):
+    store = InventoryStore(tmp_path / "inventory.db")
+    assert store.get("alice") == frozenset()
+
+    store.replace("alice", ["dmc_310", "dmc_321", "dmc_310"])
+    store.replace("bob", ["anchor_403"])
+    assert store.get("alice") == {"dmc_310", "dmc_321"}
+
+    store.replace("alice", ["dmc_blanc"])
+    assert store.get("alice") == {"dmc_blanc"}
+    store.close()
+
+    reopened = InventoryStore(tmp_path / "inventory.db")
+    assert reopened.get("alice") == {"dmc_blanc"}
+    assert reopened.get("bob") == {"anchor_403"}
+
+def test_inventory_cache_is_bounded(tmp_path):
+    store = InventoryStore(tmp_path / "inventory.db", cache_size=2)
+    for user in ("a", "b", "c"):
+        store.replace(user, [f"dmc_{user}"])
+
+    assert list(store._cache) == ["b", "c"]
+    assert store.get("a") == {"dmc_a"}
+    assert list(store._cache) == ["c", "a"]
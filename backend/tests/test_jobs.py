@@ -0,0 +1,40 @@
+"""
+Unit tests for conversion job stores
+"""
+import pytest
+
+from jobs import InMemoryJobStore, SQLiteJobStore
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobStore()
+    return SQLiteJobStore(tmp_path / "jobs.db")
+
+def test_job_progress_and_result(store):
+    store.create("pattern_1")
+
+    store.advance("pattern_1", "quantize")
+    job = store.get("pattern_1")
+    assert job["status"] == "processing"
+    assert job["stage"] == "quantize"
+    assert job["progress"] == pytest.approx(0.4)
+
+    store.update("pattern_1", status="ready", stage=None, progress=1.0, result={"dimensions": {"width_stitches": 3}})
+    # Late progress events must not reopen a finished job
+    assert store.advance("pattern_1", "grid") is None
+    job = store.get("pattern_1")
+    assert job["status"] == "ready"
+    assert job["result"]["dimensions"]["width_stitches"] == 3
+
+def test_unknown_job(store):
+    assert store.get("missing") is None
+    assert store.update("missing", status="ready") is None
+
+@pytest.mark.parametrize("kind", ["memory", "sqlite"])
+def test_store_evicts_oldest(kind, tmp_path):
+    store = InMemoryJobStore(max_jobs=2) if kind == "memory" else SQLiteJobStore(tmp_path / "jobs.db", max_jobs=2)
+    for i in range(3):
+        store.create(f"pattern_{i}")
+    assert store.get("pattern_0") is None
+    assert store.get("pattern_2") is not None
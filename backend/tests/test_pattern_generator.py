@@ -0,0 +1,76 @@
+"""
+Tests for the streamed PDF pattern renderer
+"""
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PyPDF2 import PdfReader
+
+from grid_codec import pack_grid_data
+from pattern_generator import PdfStats, chart_capacity, generate_pattern_pdf, iter_pattern_pdf, page_tiles
+
+def make_pattern(width: int, height: int, n_colors: int = 4) -> dict:
+    rng = np.random.default_rng(0)
+    grid = rng.integers(0, n_colors, size=(height, width)).astype(np.uint8)
+    palette = [
+        {"rgb": [int(v) for v in rng.integers(0, 256, 3)], "thread_brand": "DMC",
+         "thread_code": str(300 + i), "thread_name": f"Kolor {i}", "symbol": chr(65 + i)}
+        for i in range(n_colors)
+    ]
+    return {
+        "name": "Wzór testowy",
+        "dimensions": {"width_stitches": width, "height_stitches": height},
+        "color_palette": palette,
+        "grid_data": pack_grid_data({"grid": grid, "width": width, "height": height}, "zlib"),
+    }
+
+def test_page_tiles_cover_grid_with_overlap():
+    tiles = page_tiles(150, 60, overlap=2)
+
+    assert tiles == [(0, 60), (58, 118), (116, 150)]
+    assert page_tiles(10, 60) == [(0, 10)]
+
+def test_pdf_has_cover_legend_and_chart_tiles():
+    pattern = make_pattern(150, 100)
+    columns, rows = chart_capacity()
+    chart_pages = len(page_tiles(100, rows)) * len(page_tiles(150, columns))
+
+    reader = PdfReader(io.BytesIO(generate_pattern_pdf(pattern)))
+
+    assert len(reader.pages) == 2 + chart_pages
+    assert "Wzór testowy" in reader.pages[0].extract_text()
+    assert "Legenda kolorów" in reader.pages[1].extract_text()
+    assert "DMC 300 Kolor 0" in reader.pages[1].extract_text()
+    assert f"Schemat 1/{chart_pages}" in reader.pages[2].extract_text()
+
+def test_pdf_streams_page_by_page_and_reports_stats():
+    stats = PdfStats()
+
+    chunks = list(iter_pattern_pdf(make_pattern(200, 200, n_colors=10), stats))
+
+    document = b"".join(chunks)
+    assert document.startswith(b"%PDF") and document.rstrip().endswith(b"%%EOF")
+    assert len(chunks) == stats.pages + 3  # header, one chunk per page, color key, trailer
+    assert stats.bytes == len(document)
+    assert len(stats.page_seconds) == stats.pages
+    # No chunk comes close to the whole document
+    assert max(len(chunk) for chunk in chunks) < len(document) / 4
+    assert len(PdfReader(io.BytesIO(document)).pages) == stats.pages
+
+def test_parallel_rendering_matches_inline():
+    pattern = make_pattern(300, 250, n_colors=12)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        parallel = b"".join(iter_pattern_pdf(pattern, executor=executor))
+
+    assert parallel == generate_pattern_pdf(pattern)
+
+def test_chart_pages_share_one_key_xobject():
+    document = generate_pattern_pdf(make_pattern(300, 250, n_colors=12))
+    reader = PdfReader(io.BytesIO(document))
+
+    keys = {page["/Resources"]["/XObject"].raw_get("/Key").idnum for page in reader.pages[2:]}
+    assert len(keys) == 1
+    assert document.count(b"/Subtype /Form") == 1
+    assert "A 300" in reader.pages[2].extract_text()
@@ -0,0 +1,148 @@
+"""
+Unit tests for the color quantizer backends
+"""
+import numpy as np
+import pytest
+
+from color_engine.delta_e import Thread, rgb_to_lab
+from color_engine.thread_index import ThreadIndex
+from image_processor.quantizers import (QUANTIZERS, compress_colors, get_quantizer, quantization_error,
+                                        quantize_to_thread_palette, wu_palette)
+
+BLOCK_COLORS = np.array([(200, 30, 40), (20, 40, 200), (240, 240, 230), (30, 160, 60)])
+
+def block_image(noise: int = 6, size: int = 48) -> np.ndarray:
+    """Four flat color quadrants with a bit of noise"""
+    rng = np.random.default_rng(0)
+    half = size // 2
+    img = np.zeros((size, size, 3), dtype=np.int16)
+    img[:half, :half] = BLOCK_COLORS[0]
+    img[:half, half:] = BLOCK_COLORS[1]
+    img[half:, :half] = BLOCK_COLORS[2]
+    img[half:, half:] = BLOCK_COLORS[3]
+    return np.clip(img + rng.integers(-noise, noise + 1, img.shape), 0, 255).astype(np.uint8)
+
+@pytest.mark.parametrize("name", list(QUANTIZERS))
+def test_quantizer_recovers_flat_blocks(name):
+    image = block_image()
+
+    result = get_quantizer(name)(image, 4)
+
+    assert result.labels.shape == image.shape[:2]
+    assert len(result.palette) == 4
+    # Every quadrant is a single label, close to its source color
+    for quadrant, color in zip([(0, 0), (0, 24), (24, 0), (24, 24)], BLOCK_COLORS):
+        labels = result.labels[quadrant[0]:quadrant[0] + 24, quadrant[1]:quadrant[1] + 24]
+        assert len(np.unique(labels)) == 1
+        assert np.abs(result.palette[labels[0, 0]] - color).max() < 8
+    assert result.error == pytest.approx(
+        quantization_error(image.reshape(-1, 3), result.palette, result.labels)
+    )
+    assert result.error < 3 * 6 ** 2
+
+@pytest.mark.parametrize("name", ["median_cut", "octree", "wu"])
+def test_histogram_quantizers_respect_color_budget(name):
+    rng = np.random.default_rng(1)
+    image = rng.integers(0, 256, size=(64, 64, 3)).astype(np.uint8)
+
+    result = get_quantizer(name)(image, 16)
+
+    assert 1 <= len(result.palette) <= 16
+    assert result.labels.max() < len(result.palette)
+
+@pytest.mark.parametrize("name", list(QUANTIZERS))
+def test_quantizer_on_tiny_image(name):
+    # 6 pixels, 5 distinct colors, far fewer than the color budget
+    image = np.array([[(255, 0, 0), (0, 255, 0), (0, 0, 255)],
+                      [(255, 255, 0), (0, 0, 0), (0, 0, 0)]], dtype=np.uint8)
+
+    result = get_quantizer(name)(image, 30)
+
+    assert 1 <= len(result.palette) <= 5
+    assert result.labels.shape == (2, 3)
+    # No empty clusters: every palette entry is used by some pixel
+    assert set(np.unique(result.labels).tolist()) == set(range(len(result.palette)))
+
+def test_wu_error_decreases_with_more_colors():
+    rng = np.random.default_rng(2)
+    image = rng.integers(0, 256, size=(64, 64, 3)).astype(np.uint8)
+
+    errors = [get_quantizer("wu")(image, k).error for k in (2, 8, 32)]
+
+    assert errors[0] > errors[1] > errors[2]
+
+def test_compress_colors_unique_is_exact():
+    pixels = block_image().reshape(-1, 3)
+
+    compressed = compress_colors(pixels)
+
+    assert len(compressed.colors) == len(np.unique(pixels, axis=0))
+    assert compressed.weights.sum() == len(pixels)
+    np.testing.assert_array_equal(compressed.colors[compressed.inverse], pixels)
+
+def test_compress_colors_falls_back_to_histogram():
+    rng = np.random.default_rng(3)
+    pixels = rng.integers(0, 256, size=(5000, 3)).astype(np.uint8)
+
+    compressed = compress_colors(pixels, max_unique=100)
+
+    assert len(compressed.colors) <= 32 ** 3
+    assert compressed.weights.sum() == len(pixels)
+    # Every pixel maps to the mean color of its 5-bit cell
+    np.testing.assert_array_equal(compressed.colors[compressed.inverse].astype(int) >> 3, pixels >> 3)
+    np.testing.assert_array_equal(compressed.expand(np.arange(len(compressed.colors))), compressed.inverse)
+
+def test_kmeans_on_weighted_colors_matches_pixel_objective():
+    from sklearn.cluster import KMeans
+    image = block_image()
+
+    result = get_quantizer("kmeans")(image, 4)
+    reference = KMeans(n_clusters=4, random_state=42, n_init=10).fit(image.reshape(-1, 3).astype(float))
+
+    assert result.error == pytest.approx(reference.inertia_ / image.shape[0] / image.shape[1], rel=1e-3)
+
+def test_wu_palette_cells():
+    pixels = block_image().reshape(-1, 3)
+
+    palette, cells, tags = wu_palette(pixels, 4)
+
+    assert palette.shape == (4, 3)
+    assert cells.shape == (len(pixels),)
+    assert tags.shape == (32 ** 3,)
+
+def test_unknown_quantizer():
+    with pytest.raises(ValueError):
+        get_quantizer("neural")
+
+def make_thread_index(colors):
+    threads = [
+        Thread(thread_id=f"t{i}", brand="Test", color_code=str(i), color_name=f"Color {i}",
+               rgb=tuple(int(v) for v in rgb), lab=rgb_to_lab(tuple(int(v) for v in rgb)))
+        for i, rgb in enumerate(colors)
+    ]
+    return ThreadIndex.from_threads(threads)
+
+def test_thread_palette_picks_distinct_threads_directly():
+    # Two near-duplicate threads per block color plus unrelated ones
+    colors = np.concatenate([BLOCK_COLORS, BLOCK_COLORS + 12, [(128, 128, 128), (255, 0, 255)]])
+    index = make_thread_index(np.clip(colors, 0, 255))
+    image = block_image()
+
+    labels, thread_indices, error = quantize_to_thread_palette(image, 4, index)
+
+    assert labels.shape == image.shape[:2]
+    assert sorted(thread_indices.tolist()) == [0, 1, 2, 3]
+    assert len(set(thread_indices.tolist())) == len(thread_indices)
+    assert error < 3 * 6 ** 2
+
+def test_thread_palette_prefers_inventory_threads():
+    # 129 gray is closer to 120 (ΔE 3.5) than to 140 (ΔE 4.3, 3.4 with the inventory bonus)
+    colors = np.array([(120, 120, 120), (140, 140, 140)])
+    index = make_thread_index(colors)
+    image = np.full((8, 8, 3), 129, dtype=np.uint8)
+
+    _, without_inventory, _ = quantize_to_thread_palette(image, 1, index)
+    _, with_inventory, _ = quantize_to_thread_palette(image, 1, index, user_inventory={"t1"})
+
+    assert without_inventory.tolist() == [0]
+    assert with_inventory.tolist() == [1]
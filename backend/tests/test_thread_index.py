@@ -0,0 +1,123 @@
+"""
+Unit tests for the spatial thread index
+"""
+import numpy as np
+import pytest
+from color_engine.delta_e import (
+    rgb_to_lab,
+    rgb_to_lab_array,
+    find_closest_thread,
+    find_closest_threads,
+    Thread
+)
+from color_engine.thread_index import ThreadIndex, build_brand_indexes
+
+def make_threads(n: int = 120, brand: str = "DMC", seed: int = 0):
+    rng = np.random.default_rng(seed)
+    threads = []
+    for i, rgb in enumerate(rng.integers(0, 256, size=(n, 3))):
+        rgb = tuple(int(v) for v in rgb)
+        threads.append(Thread(f"{brand.lower()}_{i}", brand, str(i), f"Color {i}", rgb, rgb_to_lab(rgb)))
+    return threads
+
+def test_query_matches_brute_force():
+    """k nearest from the KD-tree should equal a full distance sort"""
+    threads = make_threads()
+    index = ThreadIndex.from_threads(threads)
+    rng = np.random.default_rng(1)
+    targets = rgb_to_lab_array(rng.integers(0, 256, size=(300, 3)))
+
+    distances, indices = index.query(targets, k=3)
+
+    full = np.linalg.norm(targets[:, None, :] - index.lab[None, :, :], axis=2)
+    expected = np.sort(full, axis=1)[:, :3]
+    assert distances.shape == (300, 3)
+    assert distances == pytest.approx(expected)
+    assert np.take_along_axis(full, indices, axis=1) == pytest.approx(expected)
+
+def test_query_clamps_k_to_catalog_size():
+    threads = make_threads(n=4)
+    distances, indices = ThreadIndex.from_threads(threads).query(np.zeros((2, 3)), k=10)
+    assert indices.shape == (2, 4)
+
+def test_batch_matches_single_lookup():
+    """Batched matching should return the same threads as per-color calls"""
+    threads = make_threads()
+    colors = [(180, 35, 50), (10, 200, 30), (250, 250, 240)]
+
+    batch = find_closest_threads(colors, threads)
+
+    for color, result in zip(colors, batch):
+        single = find_closest_thread(color, threads)
+        assert result["thread"].thread_id == single["thread"].thread_id
+        assert result["delta_e"] == pytest.approx(single["delta_e"])
+
+def test_batch_inventory_bonus():
+    """Inventory thread within the 20% bonus should win over a closer one"""
+    threads = [
+        Thread("dmc_a", "DMC", "A", "Gray A", (100, 100, 100), rgb_to_lab((100, 100, 100))),
+        Thread("dmc_b", "DMC", "B", "Gray B", (140, 140, 140), rgb_to_lab((140, 140, 140))),
+    ]
+
+    plain = find_closest_threads([(118, 118, 118)], threads)[0]
+    preferred = find_closest_threads([(118, 118, 118)], threads, user_inventory={"dmc_b"})[0]
+
+    assert plain["thread"].thread_id == "dmc_a"
+    assert preferred["thread"].thread_id == "dmc_b"
+    assert preferred["from_inventory"] is True
+
+def test_build_brand_indexes():
+    threads = make_threads(n=10, brand="DMC") + make_threads(n=5, brand="Anchor")
+    indexes = build_brand_indexes(threads)
+
+    assert set(indexes) == {"DMC", "Anchor"}
+    assert len(indexes["Anchor"]) == 5
+    result = find_closest_thread((0, 0, 0), threads, index=indexes["Anchor"])
+    assert result["thread"].brand == "Anchor"
+
+def test_query_with_ciede2000_metric():
+    """Non-Euclidean metrics go through the distance matrix and stay sorted"""
+    threads = make_threads(n=40)
+    index = ThreadIndex.from_threads(threads)
+    targets = rgb_to_lab_array(np.array([[20, 40, 200], [200, 30, 40]]))
+
+    distances, indices = index.query(targets, k=3, metric="ciede2000")
+
+    matrix = index.distance_matrix(targets, metric="ciede2000")
+    assert indices[:, 0].tolist() == np.argmin(matrix, axis=1).tolist()
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+@pytest.mark.parametrize("metric", ["cie76", "ciede2000"])
+def test_query_weighted_matches_brute_force(metric):
+    threads = make_threads(n=80)
+    index = ThreadIndex.from_threads(threads)
+    owned = {f"dmc_{i}" for i in range(0, 80, 7)} | {"anchor_1"}
+    weights = index.preference_weights(owned, 0.7)
+    targets = rgb_to_lab_array(np.random.default_rng(3).integers(0, 256, size=(200, 3)))
+
+    distances, indices = index.query_weighted(targets, weights, max_extra_delta_e=4.0, metric=metric)
+
+    matrix = index.distance_matrix(targets, metric=metric)
+    nearest = matrix.min(axis=1, keepdims=True)
+    scores = np.where(matrix <= nearest + 4.0, matrix * weights, matrix)
+    expected = np.argmin(scores, axis=1)
+    assert np.array_equal(indices, expected)
+    assert np.allclose(distances, matrix[np.arange(200), expected])
+    assert (weights < 1).sum() == 12
+
+def test_query_weighted_tolerance():
+    threads = [
+        Thread("dmc_a", "DMC", "A", "Gray A", (100, 100, 100), rgb_to_lab((100, 100, 100))),
+        Thread("dmc_b", "DMC", "B", "Gray B", (140, 140, 140), rgb_to_lab((140, 140, 140))),
+    ]
+    index = ThreadIndex.from_threads(threads)
+    weights = index.preference_weights({"dmc_b"}, 0.8)
+    target = rgb_to_lab_array(np.array([[118, 118, 118]]))
+
+    _, unlimited = index.query_weighted(target, weights)
+    _, limited = index.query_weighted(target, weights, max_extra_delta_e=1.0)
+
+    assert unlimited.tolist() == [1]
+    assert limited.tolist() == [0]
+    with pytest.raises(ValueError):
+        index.preference_weights({"dmc_b"}, 1.5)
@@ -0,0 +1,66 @@
+"""
+Unit tests for the RGB → thread lookup table
+"""
+import numpy as np
+from color_engine.delta_e import rgb_to_lab, rgb_to_lab_array, Thread
+from color_engine.thread_index import ThreadIndex
+from color_engine.thread_lut import ThreadLUT, get_brand_lut, quantize_to_threads
+
+def make_index(n: int = 60, seed: int = 0) -> ThreadIndex:
+    rng = np.random.default_rng(seed)
+    threads = []
+    for i, rgb in enumerate(rng.integers(0, 256, size=(n, 3))):
+        rgb = tuple(int(v) for v in rgb)
+        threads.append(Thread(f"dmc_{i}", "DMC", str(i), f"Color {i}", rgb, rgb_to_lab(rgb)))
+    return ThreadIndex.from_threads(threads)
+
+def test_lut_matches_exact_search():
+    """With refinement the LUT must agree with an exact index query"""
+    index = make_index()
+    lut = ThreadLUT.build(index, bits=4)
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, size=(40, 50, 3), dtype=np.uint8)
+
+    mapped = lut.map_image(img)
+
+    _, expected = index.query(rgb_to_lab_array(img), k=1)
+    assert mapped.shape == (40, 50)
+    assert np.array_equal(mapped, expected[..., 0])
+
+def test_lut_persisted_and_memory_mapped(tmp_path):
+    index = make_index(seed=2)
+
+    first = get_brand_lut("DMC", index, bits=3, lut_dir=tmp_path)
+    files = list(tmp_path.glob("dmc_3bit_*.npy"))
+    loaded = ThreadLUT.load(files[0], index)
+
+    assert len(files) == 1
+    assert isinstance(loaded.table, np.memmap)
+    assert np.array_equal(loaded.table, first.table)
+
+def test_quantize_to_threads_respects_max_colors():
+    index = make_index(seed=3)
+    lut = ThreadLUT.build(index, bits=4)
+    rng = np.random.default_rng(4)
+    img = rng.integers(0, 256, size=(30, 30, 3), dtype=np.uint8)
+
+    labels, threads = quantize_to_threads(img, lut, max_colors=5)
+
+    assert len(threads) == 5
+    assert labels.shape == (30, 30)
+    assert labels.max() < 5
+
+def test_quantize_to_threads_prefers_inventory():
+    index = make_index(seed=4)
+    lut = ThreadLUT.build(index, bits=4)
+    img = np.random.default_rng(5).integers(0, 256, size=(20, 20, 3), dtype=np.uint8)
+    owned = {f"dmc_{i}" for i in range(0, 60, 5)}
+
+    _, plain = quantize_to_threads(img, lut, 60)
+    labels, preferred = quantize_to_threads(img, lut, 60, user_inventory=owned, inventory_bonus=0.5)
+
+    weights = index.preference_weights(owned, 0.5)
+    _, expected = index.query_weighted(rgb_to_lab_array(img), weights)
+    assert np.array_equal(preferred[labels], expected)
+    owned_positions = {int(i) for i in np.flatnonzero(weights < 1)}
+    assert len(owned_positions & set(preferred.tolist())) > len(owned_positions & set(plain.tolist()))
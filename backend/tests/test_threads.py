@@ -0,0 +1,83 @@
+"""
+Unit tests for the pooled read-only thread lookups
+"""
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from database import threads
+from database.importer import BrandRows, connect, import_catalog
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "threads.db"
+    rows = BrandRows("DMC")
+    for thread_id, code, rgb in (("dmc_310", "310", (0, 0, 0)),
+                                 ("dmc_321", "321", (199, 44, 72)),
+                                 ("dmc_blanc", "BLANC", (252, 251, 248))):
+        rows.thread_ids.append(thread_id)
+        rows.color_codes.append(code)
+        rows.color_names.append(f"Color {code}")
+        rows.rgb.append(rgb)
+    conn = connect(path)
+    import_catalog(conn, {"DMC": rows})
+    conn.close()
+
+    monkeypatch.setattr(threads, "DB_PATH", path)
+    yield path
+    threads.close_pool()
+
+def test_lookups_use_pooled_readonly_connections(db_path):
+    assert threads.get_thread_count() == 3
+    assert threads.get_thread_by_id("dmc_321")["rgb"] == (199, 44, 72)
+    assert threads.get_thread_by_id("missing") is None
+    assert [t["color_code"] for t in threads.get_all_threads("DMC")] == ["310", "321", "BLANC"]
+
+    pool = threads.get_pool()
+    assert pool.db_path == db_path
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA mmap_size").fetchone()[0] == threads.READ_MMAP_SIZE
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM threads")
+    assert pool._created == 1
+
+def test_get_threads_by_ids_single_query(db_path):
+    found = threads.get_threads_by_ids(["dmc_blanc", "missing", "dmc_310", "dmc_310"])
+    assert set(found) == {"dmc_blanc", "dmc_310"}
+    assert found["dmc_310"]["hex_color"] == "#000000"
+    assert threads.get_threads_by_ids([]) == {}
+
+def test_pool_is_bounded_across_threads(db_path):
+    pool = threads.ConnectionPool(db_path, size=2)
+    results = []
+
+    def lookup():
+        for _ in range(20):
+            with pool.connection() as conn:
+                results.append(conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0])
+
+    workers = [threading.Thread(target=lookup) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert results == [3] * 120
+    assert pool._created <= 2
+    pool.close()
+    assert pool._created == 0
+
+def test_async_wrappers(db_path):
+    async def run():
+        return await asyncio.gather(
+            threads.get_threads_by_ids_async(["dmc_321"]),
+            threads.get_thread_by_id_async("dmc_310"),
+            threads.get_thread_count_async(),
+        )
+
+    by_ids, single, count = asyncio.run(run())
+    assert list(by_ids) == ["dmc_321"]
+    assert single["thread_id"] == "dmc_310"
+    assert count == 3
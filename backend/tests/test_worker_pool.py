@@ -0,0 +1,64 @@
+"""
+Unit tests for the conversion worker pool
+"""
+import asyncio
+import threading
+
+import pytest
+
+from worker_pool import ConversionPool, PoolSaturatedError
+
+def test_cancelled_job_keeps_its_slot_until_the_worker_finishes():
+    pool = ConversionPool(max_workers=0, max_queue=0)
+    started, finish = threading.Event(), threading.Event()
+
+    def blocking_job():
+        started.set()
+        finish.wait(5)
+
+    async def scenario():
+        task = asyncio.ensure_future(pool.run(blocking_job))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The worker is still busy: no new job may be admitted
+        assert pool.in_flight == 1
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(blocking_job)
+
+        finish.set()
+        for _ in range(100):
+            if pool.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.in_flight == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        finish.set()
+        pool.shutdown()
+
+def test_reserved_slot_is_used_by_run():
+    pool = ConversionPool(max_workers=0, max_queue=0)
+    slot = pool.reserve()
+    with pytest.raises(PoolSaturatedError):
+        pool.reserve()
+
+    try:
+        assert asyncio.run(pool.run(sum, [1, 2], slot=slot)) == 3
+        slot.close()
+        assert pool.in_flight == 0
+    finally:
+        pool.shutdown()
+
+def test_unused_slot_is_released_once():
+    pool = ConversionPool(max_workers=0, max_queue=1)
+    slot = pool.reserve()
+
+    slot.close()
+    slot.close()
+
+    assert pool.in_flight == 0
@@ -0,0 +1,210 @@
+"""
+Bounded process pool for CPU-bound conversions
+Keeps KMeans/matching off the event loop and rejects work when the queue is full
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+class PoolSaturatedError(Exception):
+    """Raised when the number of running + queued jobs reached the limit"""
+
+# Queue for progress events, set in every worker by the initializer
+_progress_queue = None
+
+# How long progress callbacks stay registered after their job finished
+PROGRESS_GRACE_SECONDS = 5.0
+
+class StageReporter:
+    """Picklable progress callback: forwards (token, stage) from a worker to the parent"""
+
+    def __init__(self, token: int):
+        self.token = token
+
+    def __call__(self, stage: str) -> None:
+        if _progress_queue is not None:
+            _progress_queue.put((self.token, stage))
+
+class PoolSlot:
+    """
+    A place in the pool reserved ahead of the job (see ConversionPool.reserve)
+
+    Given to the worker future when a job runs in it; otherwise close() gives it back.
+    """
+
+    def __init__(self, pool: "ConversionPool"):
+        self._pool = pool
+        self._submitted = False
+        self._released = False
+
+    def _release(self, *_: Any) -> None:
+        with self._pool._lock:
+            if not self._released:
+                self._released = True
+                self._pool._in_flight -= 1
+
+    def close(self) -> None:
+        """Releases the slot unless a job was submitted into it (then the worker releases it)"""
+        if not self._submitted:
+            self._release()
+
+def _init_worker(progress_queue=None) -> None:
+    """Worker process initializer: preload thread indexes (and sklearn via import)"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    import conversion
+    try:
+        conversion.preload()
+    except Exception as e:
+        # A missing database must not kill the pool - requests will report the error
+        print(f"⚠️  Worker preload failed: {e}")
+
+class ConversionPool:
+    """
+    Process pool with backpressure
+
+    Args:
+        max_workers: Number of worker processes (concurrency limit);
+                     0 runs jobs in a thread instead (local dev, tests)
+        max_queue: How many jobs may wait for a free worker before new ones are rejected
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._progress_queue = None
+        self._progress_listener: Optional[threading.Thread] = None
+        self._progress_callbacks: Dict[int, Callable[[str], None]] = {}
+        self._tokens = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        """Running + queued jobs"""
+        return self._in_flight
+
+    @property
+    def capacity(self) -> int:
+        return max(self.max_workers, 1) + self.max_queue
+
+    @property
+    def saturated(self) -> bool:
+        return self._in_flight >= self.capacity
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.max_workers > 0:
+                self._progress_queue = multiprocessing.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker,
+                    initargs=(self._progress_queue,)
+                )
+                self._progress_listener = threading.Thread(
+                    target=self._dispatch_progress, args=(self._progress_queue,), daemon=True
+                )
+                self._progress_listener.start()
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def _dispatch_progress(self, events) -> None:
+        """Listener thread: delivers worker progress events to their callbacks"""
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            token, stage = event
+            callback = self._progress_callbacks.get(token)
+            if callback is not None:
+                try:
+                    callback(stage)
+                except Exception as e:
+                    print(f"⚠️  Progress callback failed: {e}")
+
+    def start(self) -> None:
+        """Spawns the workers up front so the first request doesn't pay for preloading"""
+        executor = self._get_executor()
+        if isinstance(executor, ProcessPoolExecutor):
+            for _ in range(self.max_workers):
+                executor.submit(os.getpid)
+
+    def reserve(self) -> PoolSlot:
+        """
+        Takes a slot now for a job that is submitted later (async conversions
+        reserve at submit time, before the download)
+
+        Raises:
+            PoolSaturatedError: when running + queued jobs reached the capacity
+        """
+        with self._lock:
+            if self.saturated:
+                raise PoolSaturatedError(
+                    f"Conversion queue is full ({self._in_flight} jobs in progress)"
+                )
+            self._in_flight += 1
+        return PoolSlot(self)
+
+    async def run(self,
+                  fn: Callable[..., Any],
+                  *args: Any,
+                  progress: Optional[Callable[[str], None]] = None,
+                  slot: Optional[PoolSlot] = None) -> Any:
+        """
+        Runs fn(*args) in the pool and awaits the result
+
+        Args:
+            progress: Optional callback; fn then receives a picklable `progress=`
+                      reporter and each reported stage is delivered here
+                      (from a listener thread)
+            slot: Slot taken earlier with reserve(); without it one is taken now
+
+        Raises:
+            PoolSaturatedError: when running + queued jobs exceed the capacity
+        """
+        if slot is None:
+            slot = self.reserve()
+        elif slot._submitted:
+            raise ValueError("Pool slot was already used")
+
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        token = None
+        if progress is not None:
+            if isinstance(executor, ProcessPoolExecutor):
+                token = next(self._tokens)
+                self._progress_callbacks[token] = progress
+                fn = partial(fn, progress=StageReporter(token))
+            else:
+                # Thread mode: the callback can be called directly
+                fn = partial(fn, progress=progress)
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slot.close()
+            raise
+        # The slot is held until the worker is done - a cancelled await (client
+        # disconnect) does not stop a job that is already running
+        slot._submitted = True
+        future.add_done_callback(slot._release)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if token is not None:
+                # Events still in the queue are delivered during the grace period
+                loop.call_later(PROGRESS_GRACE_SECONDS, self._progress_callbacks.pop, token, None)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._progress_queue is not None:
+            self._progress_queue.put(None)
+            self._progress_queue = None
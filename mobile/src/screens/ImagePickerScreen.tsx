@@ -8,11 +8,12 @@ import {
   ScrollView,
   ActivityIndicator,
   Alert,
+  Platform,
 } from 'react-native';
 import * as ImagePicker from 'expo-image-picker';
 import { useNavigation } from '@react-navigation/native';
 import { NativeStackNavigationProp } from '@react-navigation/native-stack';
-import { savePattern, StoredPattern } from '../services/patternStorage';
+import { decodeGridData, savePattern, StoredPattern } from '../services/patternStorage';
 import { uploadImageToFirebase } from '../services/imageUpload';
 
 type RootStackParamList = {
@@ -91,32 +92,34 @@ export default function ImagePickerScreen() {
     setLoading(true);
 
     try {
-      // Upload image to Firebase Storage
-      let imageUrl: string;
-      try {
-        imageUrl = await uploadImageToFirebase(selectedImage);
-      } catch (uploadErr) {
+      // Firebase copy (kept with the saved pattern) is uploaded in parallel -
+      // the backend gets the image directly and does not download it again
+      const firebaseUpload = uploadImageToFirebase(selectedImage).catch((uploadErr) => {
         console.error('Upload error:', uploadErr);
-        // Fallback - use local URI if Firebase upload fails
-        imageUrl = selectedImage;
-        console.warn('Using local URI as fallback');
+        return undefined;
+      });
+
+      const formData = new FormData();
+      if (Platform.OS === 'web') {
+        const blob = await (await fetch(selectedImage)).blob();
+        formData.append('image', blob, 'image.jpg');
+      } else {
+        formData.append('image', { uri: selectedImage, name: 'image.jpg', type: 'image/jpeg' } as any);
       }
+      formData.append('options', JSON.stringify({
+        pattern_type: patternType,
+        thread_brand: threadBrand,
+        max_colors: maxColors,
+        aida_count: aidaCount,
+        enable_dithering: false,
+        use_inventory: false,
+        grid_encoding: 'rle',
+      }));
 
       const apiUrl = process.env.EXPO_PUBLIC_API_URL || 'http://localhost:8000';
-      const response = await fetch(`${apiUrl}/api/v1/convert`, {
+      const response = await fetch(`${apiUrl}/api/v1/convert/upload`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          image_url: imageUrl,
-          pattern_type: patternType,
-          thread_brand: threadBrand,
-          max_colors: maxColors,
-          aida_count: aidaCount,
-          enable_dithering: false,
-          use_inventory: false,
-        }),
+        body: formData,
       });
 
       if (!response.ok) {
@@ -126,6 +129,8 @@ export default function ImagePickerScreen() {
       }
 
       const data = await response.json();
+      const gridData = await decodeGridData(data.grid_data);
+      const imageUrl = await firebaseUpload;
 
       // Save pattern to local storage
       const storedPattern: StoredPattern = {
@@ -133,15 +138,15 @@ export default function ImagePickerScreen() {
         name: `Wzór ${new Date().toLocaleDateString('pl-PL')}`,
         created_at: new Date().toISOString(),
         updated_at: new Date().toISOString(),
-        grid_data: data.grid_data,
+        grid_data: gridData,
         color_palette: data.color_palette,
         dimensions: data.dimensions,
         estimated_time: data.estimated_time_minutes || 0,
         image_url: imageUrl,
         progress: {
-          completed_stitches: Array(data.grid_data?.height || 0)
+          completed_stitches: Array(gridData.height)
             .fill(null)
-            .map(() => Array(data.grid_data?.width || 0).fill(false)),
+            .map(() => Array(gridData.width).fill(false)),
           current_color_index: 0,
           last_worked: new Date().toISOString(),
         },
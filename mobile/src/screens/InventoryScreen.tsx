@@ -3,21 +3,23 @@ import { View, Text, StyleSheet, FlatList, TouchableOpacity, Alert, Linking } fr
 import ListSkeleton from '../components/ListSkeleton';
 import apiService, { Thread } from '../services/api';
 import { useNavigation } from '@react-navigation/native';
+import { useAuth } from '../services/authContext';
 
 export default function InventoryScreen() {
   const navigation = useNavigation();
+  const { user } = useAuth();
   const [inventory, setInventory] = useState<string[]>([]);
   const [threads, setThreads] = useState<Thread[]>([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     loadInventory();
-  }, []);
+  }, [user]);
 
   const loadInventory = async () => {
     setLoading(true);
     try {
-      const inv = await apiService.getUserInventory();
+      const inv = user ? await apiService.getUserInventory(await user.getIdToken()) : [];
       setInventory(inv);
       const allThreads = await apiService.getThreads('DMC'); // Można dodać wybór marki
       setThreads(allThreads);
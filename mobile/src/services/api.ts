@@ -38,6 +38,13 @@ export interface Thread {
   hexColor: string;
 }
 
+/**
+ * Firebase ID token of the signed-in user (user.getIdToken()) as a bearer header
+ */
+function authHeaders(idToken: string) {
+  return { Authorization: `Bearer ${idToken}` };
+}
+
 class ApiService {
   private baseUrl: string;
 
@@ -48,7 +55,7 @@ class ApiService {
   /**
    * Convert image to embroidery pattern
    */
-  async convertImage(request: ConversionRequest): Promise<Pattern> {
+  async convertImage(request: ConversionRequest, idToken?: string): Promise<Pattern> {
     // Transform camelCase to snake_case for backend
     const backendRequest = {
       image_url: request.imageUrl,
@@ -60,9 +67,11 @@ class ApiService {
       use_inventory: request.useInventory,
     };
     
+    // With useInventory the backend reads the inventory of the signed-in user
     const response = await axios.post(
       `${this.baseUrl}/api/v1/convert`,
-      backendRequest
+      backendRequest,
+      idToken ? { headers: authHeaders(idToken) } : undefined
     );
     
     // Transform snake_case response to camelCase
@@ -118,9 +127,22 @@ class ApiService {
   /**
    * Get user's thread inventory
    */
-  async getUserInventory(): Promise<string[]> {
+  async getUserInventory(idToken: string): Promise<string[]> {
     const response = await axios.get<{ threads: string[] }>(
-      `${this.baseUrl}/api/v1/user/inventory`
+      `${this.baseUrl}/api/v1/user/inventory`,
+      { headers: authHeaders(idToken) }
+    );
+    return response.data.threads;
+  }
+
+  /**
+   * Replace user's thread inventory
+   */
+  async updateUserInventory(idToken: string, threads: string[]): Promise<string[]> {
+    const response = await axios.put<{ threads: string[] }>(
+      `${this.baseUrl}/api/v1/user/inventory`,
+      { threads },
+      { headers: authHeaders(idToken) }
     );
     return response.data.threads;
   }
@@ -43,6 +43,23 @@ export interface StoredPattern {
   };
 }
 
+/**
+ * Compact grid encodings returned by the backend (see backend/grid_codec.py)
+ * json - nested number[][]; raw/rle/zlib - row-major uint8/uint16 LE buffer (base64)
+ */
+export type GridEncoding = 'json' | 'raw' | 'rle' | 'zlib';
+
+export interface PackedGridData {
+  type: string;
+  width: number;
+  height: number;
+  encoding?: GridEncoding;
+  dtype?: 'uint8' | 'uint16';
+  data?: string; // base64 payload (JSON responses)
+  byte_length?: number; // payload length (binary frames)
+  grid?: number[][];
+}
+
 export interface PatternListItem {
   pattern_id: string;
   name: string;
@@ -211,6 +228,138 @@ export function generateThumbnail(
   return '';
 }
 
+const BASE64_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/';
+const FRAME_MAGIC = 'MGRD';
+
+function base64ToBytes(base64: string): Uint8Array {
+  const clean = base64.replace(/[^A-Za-z0-9+/]/g, '');
+  const bytes = new Uint8Array(Math.floor((clean.length * 3) / 4));
+  let buffer = 0;
+  let bits = 0;
+  let offset = 0;
+  for (let i = 0; i < clean.length; i++) {
+    buffer = (buffer << 6) | BASE64_ALPHABET.indexOf(clean[i]);
+    bits += 6;
+    if (bits >= 8) {
+      bits -= 8;
+      bytes[offset++] = (buffer >> bits) & 0xff;
+    }
+  }
+  return bytes.subarray(0, offset);
+}
+
+function utf8ToString(bytes: Uint8Array): string {
+  if (typeof TextDecoder !== 'undefined') {
+    return new TextDecoder('utf-8').decode(bytes);
+  }
+  let encoded = '';
+  for (let i = 0; i < bytes.length; i++) {
+    encoded += '%' + bytes[i].toString(16).padStart(2, '0');
+  }
+  return decodeURIComponent(encoded);
+}
+
+async function inflate(bytes: Uint8Array): Promise<Uint8Array> {
+  // zlib needs DecompressionStream (web, recent engines); 'rle' works everywhere
+  if (typeof DecompressionStream === 'undefined') {
+    throw new Error('zlib grid encoding is not supported on this device, use "rle"');
+  }
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+async function decodeGridBytes(
+  payload: Uint8Array,
+  encoding: GridEncoding,
+  dtype: 'uint8' | 'uint16',
+  width: number,
+  height: number
+): Promise<number[][]> {
+  const valueSize = dtype === 'uint16' ? 2 : 1;
+  const cells = new Array<number>(width * height);
+  let bytes = payload;
+
+  if (encoding === 'zlib') {
+    bytes = await inflate(payload);
+  }
+
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const readValue = (offset: number) =>
+    valueSize === 2 ? view.getUint16(offset, true) : view.getUint8(offset);
+
+  if (encoding === 'rle') {
+    // Records: count (uint16 LE) + value (uint8/uint16 LE)
+    let cell = 0;
+    for (let offset = 0; offset < bytes.byteLength; offset += 2 + valueSize) {
+      const count = view.getUint16(offset, true);
+      const value = readValue(offset + 2);
+      for (let i = 0; i < count; i++) {
+        cells[cell++] = value;
+      }
+    }
+  } else if (encoding === 'raw' || encoding === 'zlib') {
+    for (let i = 0; i < cells.length; i++) {
+      cells[i] = readValue(i * valueSize);
+    }
+  } else {
+    throw new Error(`Unknown grid encoding: ${encoding}`);
+  }
+
+  const grid: number[][] = [];
+  for (let y = 0; y < height; y++) {
+    grid.push(cells.slice(y * width, (y + 1) * width));
+  }
+  return grid;
+}
+
+/**
+ * Decode grid_data from an API response into the stored number[][] form
+ * (pass-through for the plain JSON encoding)
+ */
+export async function decodeGridData(gridData: PackedGridData): Promise<StoredPattern['grid_data']> {
+  const { type, width, height } = gridData;
+  if (!gridData.encoding || gridData.encoding === 'json') {
+    return { type, width, height, grid: gridData.grid || [] };
+  }
+  const grid = await decodeGridBytes(
+    base64ToBytes(gridData.data || ''),
+    gridData.encoding,
+    gridData.dtype || 'uint8',
+    width,
+    height
+  );
+  return { type, width, height, grid };
+}
+
+/**
+ * Decode a binary pattern frame (Accept: application/octet-stream):
+ * "MGRD", uint32 LE header length, JSON header, grid payload
+ */
+export async function decodePatternFrame(
+  buffer: ArrayBuffer
+): Promise<Record<string, any> & { grid_data: StoredPattern['grid_data'] }> {
+  const bytes = new Uint8Array(buffer);
+  if (String.fromCharCode(...bytes.subarray(0, 4)) !== FRAME_MAGIC) {
+    throw new Error('Not a pattern grid frame');
+  }
+  const headerLength = new DataView(buffer).getUint32(4, true);
+  const header = JSON.parse(utf8ToString(bytes.subarray(8, 8 + headerLength)));
+  const meta: PackedGridData = header.grid_data;
+  const payloadStart = 8 + headerLength;
+  const payload = bytes.subarray(payloadStart, payloadStart + (meta.byte_length ?? bytes.length));
+  const grid = await decodeGridBytes(
+    payload,
+    meta.encoding || 'raw',
+    meta.dtype || 'uint8',
+    meta.width,
+    meta.height
+  );
+  return {
+    ...header,
+    grid_data: { type: meta.type, width: meta.width, height: meta.height, grid },
+  };
+}
+
 /**
  * Clear all patterns (for testing/reset)
  */
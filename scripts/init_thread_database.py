@@ -3,8 +3,6 @@
 Skrypt inicjalizacji bazy danych nici
 Wczytuje CSV files i tworzy lokalną bazę SQLite + wypełnia Firestore
 """
-import csv
-import sqlite3
 import argparse
 from pathlib import Path
 import sys
@@ -12,73 +10,9 @@ import sys
 # Dodaj backend do path
 sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
 
-from color_engine.delta_e import rgb_to_lab
-
-def create_local_database(db_path: str = "data/threads.db"):
-    """Tworzy lokalną bazę SQLite z nićmi"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Tabela threads
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS threads (
-            thread_id TEXT PRIMARY KEY,
-            brand TEXT NOT NULL,
-            color_code TEXT NOT NULL,
-            color_name TEXT NOT NULL,
-            r INTEGER NOT NULL,
-            g INTEGER NOT NULL,
-            b INTEGER NOT NULL,
-            l_star REAL NOT NULL,
-            a_star REAL NOT NULL,
-            b_star REAL NOT NULL,
-            hex_color TEXT NOT NULL,
-            UNIQUE(brand, color_code)
-        )
-    """)
-    
-    # Indeksy dla szybszego wyszukiwania
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_brand ON threads(brand)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_color_code ON threads(color_code)")
-    
-    conn.commit()
-    return conn
-
-def import_threads_from_csv(conn, csv_path: str, brand: str):
-    """Importuje nici z pliku CSV"""
-    cursor = conn.cursor()
-    imported = 0
-    
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for row in reader:
-            thread_id = row['thread_id']
-            color_code = row['color_code']
-            color_name = row['color_name']
-            r, g, b = int(row['r']), int(row['g']), int(row['b'])
-            
-            # Konwersja do LAB
-            l_star, a_star, b_star = rgb_to_lab((r, g, b))
-            
-            # Hex color
-            hex_color = f"#{r:02x}{g:02x}{b:02x}"
-            
-            try:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO threads 
-                    (thread_id, brand, color_code, color_name, r, g, b, 
-                     l_star, a_star, b_star, hex_color)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (thread_id, brand, color_code, color_name, r, g, b,
-                      l_star, a_star, b_star, hex_color))
-                imported += 1
-            except sqlite3.IntegrityError as e:
-                print(f"Warning: Duplicate thread {thread_id}: {e}")
-    
-    conn.commit()
-    print(f"✅ Imported {imported} threads from {csv_path} ({brand})")
-    return imported
+from database.importer import (CSV_DIR, build_artifacts, connect, find_csv_files,
+                               import_catalog, parse_csv_files)
+from database.threads import DB_PATH
 
 def export_to_firestore(conn):
     """
@@ -105,14 +39,29 @@ def main():
     )
     parser.add_argument(
         "--brands",
-        default="DMC",
-        help="Comma-separated list of brands (DMC,Anchor,Ariadna)"
+        default="",
+        help="Comma-separated list of brands (DMC,Anchor,Ariadna); default: every brand found"
+    )
+    parser.add_argument(
+        "--csv-dir",
+        default=str(CSV_DIR),
+        help="Directory with <brand>_colors.csv files"
     )
     parser.add_argument(
         "--db-path",
-        default="data/threads.db",
+        default=str(DB_PATH),
         help="Path to SQLite database"
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-import brands even if their checksum did not change"
+    )
+    parser.add_argument(
+        "--lut-metrics",
+        default="cie76",
+        help="Comma-separated Delta E metrics to prebuild thread LUTs for (empty: skip artifacts)"
+    )
     parser.add_argument(
         "--export-firestore",
         action="store_true",
@@ -121,35 +70,39 @@ def main():
     
     args = parser.parse_args()
     
-    # Utwórz katalog data jeśli nie istnieje
-    Path("data").mkdir(exist_ok=True)
+    # Wczytaj wszystkie CSV naraz
+    csv_files = find_csv_files(Path(args.csv_dir))
+    if not csv_files:
+        print(f"⚠️  No *_colors.csv files in {args.csv_dir}")
+        return
+    brands = [b.strip() for b in args.brands.split(",") if b.strip()]
+    brand_rows = parse_csv_files(csv_files, brands or None)
+    for brand in brands:
+        if brand.lower() not in {name.lower() for name in brand_rows}:
+            print(f"⚠️  Warning: no rows for {brand} in {args.csv_dir}, skipping")
     
-    # Utwórz bazę danych
-    print(f"📦 Creating database: {args.db_path}")
-    conn = create_local_database(args.db_path)
+    # Import w jednej transakcji
+    print(f"📦 Importing into: {args.db_path}")
+    conn = connect(Path(args.db_path))
+    report = import_catalog(conn, brand_rows, force=args.force)
     
-    # Importuj nici dla każdej marki
-    brands = [b.strip() for b in args.brands.split(",")]
-    total_imported = 0
-    
-    for brand in brands:
-        csv_path = f"data/threads/{brand.lower()}_colors.csv"
-        
-        if not Path(csv_path).exists():
-            print(f"⚠️  Warning: {csv_path} not found, skipping {brand}")
-            continue
-        
-        imported = import_threads_from_csv(conn, csv_path, brand)
-        total_imported += imported
+    for brand, count in report.imported.items():
+        removed = report.removed.get(brand, 0)
+        print(f"✅ Imported {count} threads ({brand})" + (f", removed {removed}" if removed else ""))
+    for brand in report.unchanged:
+        print(f"⏭️  {brand} unchanged, skipped")
     
     # Statystyki
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM threads")
-    total_threads = cursor.fetchone()[0]
-    
-    print(f"\n✨ Database initialized successfully!")
+    total_threads = conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+    print(f"\n✨ Database initialized in {report.seconds:.2f}s")
     print(f"   Total threads in database: {total_threads}")
     
+    # Artefakty pochodne: tabela odpowiedników, indeksy, LUT
+    lut_metrics = [m.strip() for m in args.lut_metrics.split(",") if m.strip()]
+    if lut_metrics:
+        timings = build_artifacts(Path(args.db_path), lut_metrics)
+        print(f"   Artifacts: catalog + equivalence {timings['catalog']:.2f}s, LUTs {timings['lut']:.2f}s")
+    
     # Opcjonalny eksport do Firestore
     if args.export_firestore:
         export_to_firestore(conn)